@@ -0,0 +1,60 @@
+"""
+Request coalescing benchmark against the local OpenRouter stub.
+
+Sends a burst of identical first-turn prompts, spread over --spread seconds,
+with single-flight on and off, and reports upstream calls and latencies.
+
+    python -m benchmarks.coalescing --burst 50 --stream
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+def main():
+    parser = argparse.ArgumentParser(description="Single-flight coalescing benchmark")
+    parser.add_argument("--burst", type=int, default=50)
+    parser.add_argument("--spread", type=float, default=0.5, help="Seconds over which the burst arrives")
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--stream", action="store_true", help="Use the streaming client path")
+    args = parser.parse_args()
+
+    os.environ["OPENROUTER_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+    os.environ.setdefault("OPENROUTER_API_KEY", "stub-key")
+
+    from benchmarks.stub_openrouter import create_stub_app, StubServer
+    from core import chat_service
+
+    async def one_chat(delay):
+        await asyncio.sleep(delay)
+        started = time.perf_counter()
+        if args.stream:
+            reply = "".join([delta async for delta in chat_service.stream_openrouter_response("what can you do")])
+        else:
+            reply = await chat_service.get_openrouter_response("what can you do")
+        return time.perf_counter() - started, reply
+
+    async def run():
+        rng = random.Random(1)
+        results = await asyncio.gather(*(one_chat(rng.uniform(0, args.spread)) for _ in range(args.burst)))
+        await chat_service.close_openrouter_client()
+        return sorted(latency for latency, _ in results), {reply for _, reply in results}
+
+    stub = create_stub_app(args.latency, args.tokens_per_second)
+    with StubServer(stub, port=args.port):
+        for enabled in (False, True):
+            chat_service.REQUEST_COALESCING_ENABLED = enabled
+            calls_before = stub.state.stats.total
+            latencies, replies = asyncio.run(run())
+            upstream = stub.state.stats.total - calls_before
+            print(
+                f"coalescing {'on ' if enabled else 'off'}  upstream calls {upstream:3d}  "
+                f"p50 {latencies[len(latencies) // 2]:.3f}s  max {latencies[-1]:.3f}s  "
+                f"distinct replies {len(replies)}"
+            )
+
+if __name__ == "__main__":
+    main()
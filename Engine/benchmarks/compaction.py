@@ -0,0 +1,119 @@
+"""
+Prompt size and per-turn latency of one very long conversation.
+
+Plays --turns sequential POST /chat turns into a single conversation against
+SQLite and the local OpenRouter stub, whose latency grows with the prompt
+(--prefill tokens per second), in three modes:
+
+  full        every earlier turn is sent upstream (unbounded context)
+  window      the newest turns that fit CONTEXT_TOKEN_BUDGET
+  compaction  the window plus a stored summary of the turns before it
+
+Each mode runs in its own interpreter so its settings apply at import time.
+
+    python -m benchmarks.compaction --turns 1000
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = ["full", "window", "compaction"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Long conversation benchmark")
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--message-words", type=int, default=40, help="Words per user message")
+    parser.add_argument("--latency", type=float, default=0.02, help="Stub seconds before the first token")
+    parser.add_argument("--prefill", type=float, default=200000, help="Stub prompt tokens processed per second")
+    parser.add_argument("--buckets", type=int, default=5, help="Turn ranges reported")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--stub-port", type=int, default=8769)
+    parser.add_argument("--mode", choices=MODES, help="Run a single mode in this interpreter")
+    args = parser.parse_args()
+
+    if args.mode is None:
+        for mode in MODES:
+            subprocess.run([sys.executable, "-m", "benchmarks.compaction", *sys.argv[1:], "--mode", mode], check=True)
+        return
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["OPENROUTER_BASE_URL"] = f"http://127.0.0.1:{args.stub_port}/v1"
+    os.environ.setdefault("OPENROUTER_API_KEY", "stub-key")
+    os.environ.setdefault("JWT_SECRET", "benchmark-secret")
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    if args.mode == "full":
+        os.environ["CONTEXT_TOKEN_BUDGET"] = str(10 ** 9)
+        os.environ["CONTEXT_MAX_MESSAGES"] = str(10 ** 9)
+    os.environ["COMPACTION_ENABLED"] = "true" if args.mode == "compaction" else "false"
+
+    import httpx
+    import sqlalchemy
+    from benchmarks.stub_openrouter import create_stub_app, StubServer
+    from core import chat_service, compaction, database
+    from core.context import count_tokens, wait_for_encoding
+    from main import app
+
+    sync_engine = sqlalchemy.create_engine(f"sqlite:///{db_path}")
+    database.Base.metadata.create_all(sync_engine)
+    sync_engine.dispose()
+
+    # Record the size of every chat prompt as it is built
+    prompt_tokens = []
+    build_messages = chat_service.build_messages
+
+    def recording_build_messages(user_message, history=None):
+        messages = build_messages(user_message, history)
+        prompt_tokens.append(sum(count_tokens(m["content"]) for m in messages))
+        return messages
+
+    chat_service.build_messages = recording_build_messages
+    wait_for_encoding()
+
+    filler = " ".join(["lorem", "ipsum", "dolor", "sit", "amet"] * (args.message_words // 5 + 1)).split()[:args.message_words]
+
+    async def run():
+        latencies = []
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=120) as client:
+            await client.post("/signup", json={"username": "bench", "email": "bench@example.com", "password": "benchmark"})
+            login = await client.post("/login", json={"email": "bench@example.com", "password": "benchmark"})
+            client.headers["Authorization"] = f"Bearer {login.json()['access_token']}"
+            conversation_id = None
+            for turn in range(args.turns):
+                started = time.perf_counter()
+                response = await client.post("/chat", json={
+                    "message": f"Turn {turn}: " + " ".join(filler),
+                    "conversation_id": conversation_id,
+                })
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+                conversation_id = response.json()["conversation_id"]
+        return latencies
+
+    stub = create_stub_app(args.latency, tokens_per_second=10000, prompt_tokens_per_second=args.prefill)
+    started = time.perf_counter()
+    with StubServer(stub, port=args.stub_port), StubServer(app, port=args.port):
+        latencies = asyncio.run(run())
+        stats = compaction._compactor.stats() if compaction._compactor else None
+    wall = time.perf_counter() - started
+
+    print(f"\nmode: {args.mode}, turns: {args.turns}, wall {wall:.1f}s, upstream calls {stub.state.stats.total}")
+    if stats is not None:
+        print(f"compaction runs {stats['runs']}, messages folded {stats['folded']}, errors {stats['errors']}")
+    print(f"{'turns':>11} | {'prompt tokens':>13} {'max':>7} | {'p50 ms':>8} {'p95 ms':>8}")
+    size = max(1, args.turns // args.buckets)
+    for start in range(0, args.turns, size):
+        tokens = prompt_tokens[start:start + size]
+        timings = sorted(latencies[start:start + size])
+        print(
+            f"{start + 1:>5}-{min(start + size, args.turns):<5} | {sum(tokens) / len(tokens):>13.0f} {max(tokens):>7} | "
+            f"{timings[len(timings) // 2] * 1000:>8.1f} {timings[int(len(timings) * 0.95) - 1] * 1000:>8.1f}"
+        )
+
+if __name__ == "__main__":
+    main()
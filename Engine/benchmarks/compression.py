@@ -0,0 +1,164 @@
+"""
+Storage size and read/write latency of compressed message content.
+
+Generates assistant-style replies (markdown, recurring phrasing, --words
+words each) alternating with short user prompts, and stores the same
+--messages messages, in conversations of --per-conversation, in a
+throwaway SQLite database with the full-text triggers in place, once per
+codec:
+
+  plain      compression off, as before core.compression
+  zlib       MESSAGE_COMPRESSION_MIN_BYTES and level as configured
+  zlib+dict  the same with a dictionary trained on --train held-out replies
+
+and reports the database file size, the bytes held in messages.content,
+the time to insert every message through the ORM, to read every
+conversation back and to run full-text searches.
+
+    python -m benchmarks.compression --messages 50000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+OPENERS = [
+    "Sure! Here's a quick overview of {topic}.",
+    "Great question. Let me break down {topic} step by step.",
+    "I'd be happy to help with {topic}.",
+    "Here is an explanation of {topic}, with an example.",
+]
+SECTIONS = [
+    "## Key points\n\n",
+    "### Example\n\n```python\ndef {word}(value):\n    return value\n```\n\n",
+    "- **{word}**: this is important because it affects how the {word} behaves.\n",
+    "- Keep in mind that the {word} depends on your specific use case.\n",
+    "In other words, the {word} and the {word} work together to produce the result.\n\n",
+]
+CLOSERS = [
+    "Let me know if you have any other questions!",
+    "I hope this helps! Feel free to ask if anything is unclear.",
+    "If you'd like, I can go into more detail on any of these points.",
+]
+
+def make_reply(vocabulary, words: int) -> str:
+    parts = [random.choice(OPENERS).format(topic=" ".join(random.choices(vocabulary, k=2))), "\n\n"]
+    length = 0
+    while length < words:
+        if random.random() < 0.4:
+            parts.append(random.choice(SECTIONS).format(word=random.choice(vocabulary)))
+        sentence = random.choices(vocabulary, k=random.randint(8, 16))
+        parts.append(" ".join(sentence).capitalize() + ". ")
+        length += len(sentence)
+    parts.append("\n\n" + random.choice(CLOSERS))
+    return "".join(parts)
+
+def main():
+    parser = argparse.ArgumentParser(description="Message compression benchmark")
+    parser.add_argument("--messages", type=int, default=50_000)
+    parser.add_argument("--per-conversation", type=int, default=50, help="Messages per conversation")
+    parser.add_argument("--words", type=int, default=250, help="Words per assistant reply")
+    parser.add_argument("--train", type=int, default=2000, help="Replies the dictionary is trained on")
+    parser.add_argument("--searches", type=int, default=200)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ.setdefault("JWT_SECRET", "bench")
+
+    random.seed(7)
+    vocabulary = [f"word{rank}" for rank in range(3000)]
+    replies = [make_reply(vocabulary, args.words) for _ in range(min(args.messages // 2 + 1, 5000))]
+    training = [make_reply(vocabulary, args.words) for _ in range(args.train)]
+    # Message texts, cycled; user prompts stay short, replies are what compression is for
+    texts = [
+        " ".join(random.choices(vocabulary, k=12)) + "?" if m % 2 == 0 else replies[(m // 2) % len(replies)]
+        for m in range(args.messages)
+    ]
+    raw_bytes = sum(len(text.encode()) for text in texts)
+
+    import core.compression as compression
+    from config.config import MESSAGE_COMPRESSION_LEVEL, MESSAGE_COMPRESSION_MIN_BYTES
+    from core.compression import MessageCodec, train_dictionary
+
+    started = time.perf_counter()
+    dictionary = train_dictionary(training)
+    print(f"trained a {len(dictionary)} byte dictionary on {len(training)} replies in {time.perf_counter() - started:.1f}s")
+    codecs = {
+        "plain": MessageCodec(enabled=False),
+        "zlib": MessageCodec(True, MESSAGE_COMPRESSION_MIN_BYTES, MESSAGE_COMPRESSION_LEVEL),
+        "zlib+dict": MessageCodec(True, MESSAGE_COMPRESSION_MIN_BYTES, MESSAGE_COMPRESSION_LEVEL, [dictionary]),
+    }
+
+    print(f"{args.messages} messages, {raw_bytes / 2 ** 20:.1f}MB of text")
+    print(f"{'codec':>10} | {'file MB':>8} | {'content MB':>10} | {'insert s':>8} | {'read s':>7} | {'search ms':>9}")
+    for label, codec in codecs.items():
+        compression._codec = codec
+        run(label, os.path.join(workdir, f"{label.replace('+', '-')}.db"), texts, vocabulary, args)
+
+def run(label: str, db_path: str, texts, vocabulary, args):
+    # Each database gets its own engine; the settings are read when it is built
+    import core.database as database
+    database.DATABASE_URL = f"sqlite+aiosqlite:///{db_path}"
+    from sqlalchemy import func, insert, select, type_coerce, Text
+    from core.database import Base, AsyncSessionLocal, dispose_engine, get_engine
+    from core.ids import new_id
+    from core.search import create_search_schema, search_messages
+    from models.models import Conversation, Message, User
+
+    user_id = new_id()
+    base = datetime(2024, 1, 1)
+    conversation_ids = [new_id() for _ in range(0, args.messages, args.per_conversation)]
+
+    async def write():
+        async with get_engine().begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(create_search_schema)
+        async with AsyncSessionLocal() as session:
+            await session.execute(insert(User), [{"id": user_id, "username": "bench", "email": "bench@example.com", "hashed_password": "x"}])
+            await session.execute(insert(Conversation), [
+                {"id": conversation_id, "user_id": user_id, "title": "bench", "created_at": base, "updated_at": base}
+                for conversation_id in conversation_ids
+            ])
+            await session.commit()
+            started = time.perf_counter()
+            for number, conversation_id in enumerate(conversation_ids):
+                first = number * args.per_conversation
+                await session.execute(insert(Message), [
+                    {"id": new_id(), "conversation_id": conversation_id, "role": "user" if m % 2 == 0 else "assistant",
+                     "content": texts[m], "created_at": base + timedelta(seconds=m)}
+                    for m in range(first, min(first + args.per_conversation, args.messages))
+                ])
+                await session.commit()
+            return time.perf_counter() - started
+
+    async def read():
+        async with AsyncSessionLocal() as session:
+            content_bytes = (await session.execute(select(func.sum(func.length(type_coerce(Message.content, Text)))))).scalar()
+            started = time.perf_counter()
+            for conversation_id in conversation_ids:
+                rows = (await session.execute(
+                    select(Message.role, Message.content).where(Message.conversation_id == conversation_id)
+                    .order_by(Message.created_at)
+                )).all()
+                assert rows
+            return content_bytes, time.perf_counter() - started
+
+    async def search():
+        async with AsyncSessionLocal() as session:
+            started = time.perf_counter()
+            for _ in range(args.searches):
+                await search_messages(session, user_id, random.sample(vocabulary, 2), 20, 0)
+            return (time.perf_counter() - started) / args.searches * 1000
+
+    insert_seconds = asyncio.run(write())
+    content_bytes, read_seconds = asyncio.run(read())
+    search_ms = asyncio.run(search())
+    asyncio.run(dispose_engine())
+    file_bytes = os.path.getsize(db_path)
+    print(f"{label:>10} | {file_bytes / 2 ** 20:>8.1f} | {content_bytes / 2 ** 20:>10.1f} | {insert_seconds:>8.2f} | {read_seconds:>7.2f} | {search_ms:>9.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Concurrent request throughput of the API against SQLite and the local OpenRouter stub.
+
+Boots main.app under uvicorn, seeds a user with conversations, then drives
+concurrent GET /conversations and POST /chat traffic. --db-latency adds a
+sleep to every SQL statement to stand in for the network round-trip to MySQL.
+The sleep runs inside the SQLite driver, so it blocks whatever thread would
+be blocked waiting on a real database.
+
+    python -m benchmarks.concurrent_requests --concurrency 50 --db-latency 0.005
+    python -m benchmarks.concurrent_requests --write-behind
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent API throughput")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--db-latency", type=float, default=0.005, help="Seconds added to every SQL statement")
+    parser.add_argument("--upstream-latency", type=float, default=0.2)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--stub-port", type=int, default=8765)
+    parser.add_argument("--write-behind", action="store_true", help="Persist chat messages through the write-behind queue")
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["OPENROUTER_BASE_URL"] = f"http://127.0.0.1:{args.stub_port}/v1"
+    os.environ.setdefault("OPENROUTER_API_KEY", "stub-key")
+    os.environ.setdefault("JWT_SECRET", "benchmark-secret")
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")
+    # Measures serving throughput for one seeded user, so per-user limits would dominate
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    os.environ["MESSAGE_WRITE_BEHIND"] = "true" if args.write_behind else "false"
+
+    import httpx
+    import sqlalchemy
+    from sqlalchemy import event
+    from benchmarks.stub_openrouter import create_stub_app, StubServer
+    from core import database
+    from main import app
+
+    # Create the schema up front with a plain engine
+    sync_engine = sqlalchemy.create_engine(f"sqlite:///{db_path}")
+    database.Base.metadata.create_all(sync_engine)
+    sync_engine.dispose()
+
+    if args.db_latency:
+        def add_latency(dbapi_connection, connection_record):
+            # sqlite3 calls the trace callback on the thread executing the statement
+            callback = lambda statement: time.sleep(args.db_latency)
+            raw = getattr(dbapi_connection, "_connection", dbapi_connection)
+            if hasattr(dbapi_connection, "await_"):
+                dbapi_connection.await_(raw.set_trace_callback(callback))
+            else:
+                raw.set_trace_callback(callback)
+
+        engine = database.get_engine().sync_engine
+        event.listen(engine, "connect", add_latency)
+
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    async def drive(client, method, path, **kwargs):
+        semaphore = asyncio.Semaphore(args.concurrency)
+        latencies = []
+
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.request(method, path, **kwargs)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(args.requests)))
+        wall = time.perf_counter() - started
+        latencies.sort()
+        return args.requests / wall, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)]
+
+    async def run():
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+            await client.post("/signup", json={"username": "bench", "email": "bench@example.com", "password": "benchmark"})
+            login = await client.post("/login", json={"email": "bench@example.com", "password": "benchmark"})
+            client.headers["Authorization"] = f"Bearer {login.json()['access_token']}"
+            for i in range(20):
+                await client.post("/chat", json={"message": f"seed conversation {i}"})
+
+            results = {}
+            results["GET /conversations"] = await drive(client, "GET", "/conversations")
+            results["POST /chat"] = await drive(client, "POST", "/chat", json={"message": "hello from the benchmark"})
+            return results
+
+    stub = create_stub_app(args.upstream_latency, tokens_per_second=1000)
+    with StubServer(stub, port=args.stub_port), StubServer(app, port=args.port):
+        results = asyncio.run(run())
+
+    print(
+        f"concurrency: {args.concurrency}, requests: {args.requests}, db latency: {args.db_latency * 1000:.1f}ms, "
+        f"write-behind: {'on' if args.write_behind else 'off'}"
+    )
+    print(f"{'endpoint':<20} | {'req/s':>8} | {'p50 ms':>8} | {'p95 ms':>8}")
+    for name, (rps, p50, p95) in results.items():
+        print(f"{name:<20} | {rps:>8.1f} | {p50 * 1000:>8.1f} | {p95 * 1000:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Query count and latency of GET /conversations as the conversation count grows.
+
+Seeds a throwaway SQLite database and compares the old per-conversation
+last-message lookup with the single-query projection now used by the route.
+
+    python -m benchmarks.conversation_list --sizes 10 100 500 --messages 20
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+def main():
+    parser = argparse.ArgumentParser(description="GET /conversations benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--messages", type=int, default=20, help="Messages per conversation")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+    from sqlalchemy import event, select
+    from core.database import Base, get_engine, AsyncSessionLocal
+    from models.models import User, Conversation, Message
+    from routes.conversation_routes import get_conversations
+
+    engine = get_engine()
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *a, **kw: statements.append(1))
+
+    async def legacy_get_conversations(user_id, db):
+        # The pre-projection implementation: one Message query per conversation
+        conversations = (await db.execute(select(Conversation).where(
+            Conversation.user_id == user_id
+        ).order_by(Conversation.updated_at.desc()))).scalars().all()
+        result = []
+        for conv in conversations:
+            last_message = (await db.execute(select(Message).where(
+                Message.conversation_id == conv.id
+            ).order_by(Message.created_at.desc()).limit(1))).scalars().first()
+            result.append((conv.id, last_message.content[:50] if last_message else None))
+        return result
+
+    async def measure(fn, user_id):
+        timings = []
+        for _ in range(args.repeat):
+            async with AsyncSessionLocal() as db:
+                statements.clear()
+                started = time.perf_counter()
+                await fn(user_id, db)
+                timings.append(time.perf_counter() - started)
+                queries = len(statements)
+        return queries, min(timings) * 1000
+
+    async def run():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        print(f"{'conversations':>13} | {'legacy queries':>14} {'legacy ms':>10} | {'queries':>7} {'ms':>8}")
+        for size in args.sizes:
+            await run_size(size)
+
+    async def run_size(size):
+        db = AsyncSessionLocal()
+        user_id = str(size).zfill(10)
+        db.add(User(id=user_id, username=f"bench{size}", email=f"bench{size}@example.com", hashed_password="x"))
+        base = datetime.utcnow()
+        for c in range(size):
+            conv_id = str(uuid.uuid4())
+            db.add(Conversation(id=conv_id, user_id=user_id, title=f"Conversation {c}"))
+            for m in range(args.messages):
+                db.add(Message(
+                    id=str(uuid.uuid4()),
+                    conversation_id=conv_id,
+                    role="user" if m % 2 == 0 else "assistant",
+                    content=f"Message {m} of conversation {c} " * 5,
+                    created_at=base + timedelta(seconds=m)
+                ))
+        await db.commit()
+        await db.close()
+
+        legacy_queries, legacy_ms = await measure(legacy_get_conversations, user_id)
+        queries, ms = await measure(
+            lambda uid, session: get_conversations(limit=size, cursor=None, current_user_id=uid, db=session), user_id
+        )
+        print(f"{size:>13} | {legacy_queries:>14} {legacy_ms:>10.2f} | {queries:>7} {ms:>8.2f}")
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Time to delete, archive and restore one large conversation.
+
+Seeds a throwaway SQLite database, with the full-text triggers in place,
+with one conversation of --messages messages per path and times:
+
+  orm-cascade  every Message loaded and deleted one by one, as the ORM
+               "all, delete-orphan" cascade did before core.deletion
+  delete       core.deletion.delete_conversations, set-based deletes
+  archive      core.archive.archive_conversation, then the blob size
+  restore      core.archive.restore_conversation of that archive
+
+    python -m benchmarks.delete --messages 50000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+def main():
+    parser = argparse.ArgumentParser(description="Conversation delete and archive benchmark")
+    parser.add_argument("--messages", type=int, default=50_000)
+    parser.add_argument("--words", type=int, default=40, help="Words per message")
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("JWT_SECRET", "bench")
+
+    from sqlalchemy import func, select
+    from core.archive import archive_conversation, restore_conversation
+    from core.database import Base, AsyncSessionLocal, dispose_engine, get_engine
+    from core.deletion import delete_conversations
+    from core.ids import id_bytes, new_id
+    from core.compression import register_sqlite_functions
+    from core.search import create_search_schema
+    from models.models import Conversation, ConversationArchive, Message
+
+    async def create_schema():
+        async with get_engine().begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(create_search_schema)
+
+    asyncio.run(create_schema())
+
+    # Raw inserts bypass CompactId, so ids are written as their 16 bytes
+    random.seed(7)
+    vocabulary = [f"word{rank}" for rank in range(5000)]
+    user_id = new_id()
+    db = sqlite3.connect(db_path)
+    # The full-text triggers call message_text()
+    register_sqlite_functions(db)
+    db.execute(
+        "INSERT INTO users (id, username, email, hashed_password) VALUES (?, 'bench', 'bench@example.com', 'x')",
+        (id_bytes(user_id),)
+    )
+    base = datetime(2024, 1, 1)
+    paths = ["orm-cascade", "delete", "archive"]
+    conversation_ids = {}
+    raw_bytes = 0
+    for path in paths:
+        conversation_id = new_id()
+        conversation_ids[path] = conversation_id
+        db.execute(
+            "INSERT INTO conversations (id, user_id, title, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (id_bytes(conversation_id), id_bytes(user_id), path, base, base)
+        )
+        rows = [
+            (id_bytes(new_id()), id_bytes(conversation_id), "user" if m % 2 == 0 else "assistant",
+             " ".join(random.choices(vocabulary, k=args.words)), base + timedelta(seconds=m))
+            for m in range(args.messages)
+        ]
+        raw_bytes = sum(len(row[3]) for row in rows)
+        db.executemany("INSERT INTO messages (id, conversation_id, role, content, created_at) VALUES (?, ?, ?, ?, ?)", rows)
+    db.commit()
+    db.close()
+
+    async def orm_cascade():
+        async with AsyncSessionLocal() as session:
+            conversation = await session.get(Conversation, conversation_ids["orm-cascade"])
+            messages = (await session.execute(
+                select(Message).where(Message.conversation_id == conversation.id)
+            )).scalars().all()
+            for message in messages:
+                await session.delete(message)
+            await session.delete(conversation)
+            await session.commit()
+
+    async def delete():
+        async with AsyncSessionLocal() as session:
+            assert await delete_conversations(session, user_id, [conversation_ids["delete"]]) == 1
+
+    async def archive():
+        async with AsyncSessionLocal() as session:
+            assert await archive_conversation(session, conversation_ids["archive"], user_id)
+            return (await session.execute(select(func.length(ConversationArchive.content)))).scalar()
+
+    async def restore():
+        async with AsyncSessionLocal() as session:
+            assert await restore_conversation(session, user_id, conversation_ids["archive"])
+            return (await session.execute(
+                select(func.count()).select_from(Message).where(Message.conversation_id == conversation_ids["archive"])
+            )).scalar()
+
+    def timed(label, run):
+        started = time.perf_counter()
+        result = asyncio.run(run())
+        print(f"{label:>12}: {time.perf_counter() - started:6.2f}s")
+        return result
+
+    print(f"one conversation of {args.messages} messages, {raw_bytes / 2 ** 20:.1f}MB of text")
+    timed("orm-cascade", orm_cascade)
+    timed("delete", delete)
+    size = timed("archive", archive)
+    print(f"{'':>12}  archive blob {size / 2 ** 20:.1f}MB")
+    restored = timed("restore", restore)
+    assert restored == args.messages, restored
+    asyncio.run(dispose_engine())
+
+if __name__ == "__main__":
+    main()
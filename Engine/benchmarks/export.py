@@ -0,0 +1,141 @@
+"""
+Peak memory and throughput of exporting and importing one large account.
+
+Seeds a throwaway SQLite database with one user holding --messages messages
+in conversations of --per-conversation, then measures with tracemalloc:
+
+  orm-load   every conversation and message loaded through the ORM and
+             serialized at once, as a naive export would
+  export     core.export.export_user, streamed through server-side cursors
+  gzip       the same stream through gzip_chunks
+  import     the NDJSON export fed back through core.export.import_user
+
+Peak memory of the streamed paths should stay flat as --messages grows.
+
+    python -m benchmarks.export --messages 1000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and import benchmark")
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--per-conversation", type=int, default=50, help="Messages per conversation")
+    parser.add_argument("--words", type=int, default=40, help="Words per message")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("JWT_SECRET", "bench")
+
+    from sqlalchemy import select
+    from core.database import Base, AsyncSessionLocal, dispose_engine, get_engine
+    from core.export import export_user, gzip_chunks, import_user, record_line
+    from core.ids import id_bytes, new_id
+    from core.compression import register_sqlite_functions
+    from core.search import create_search_schema
+    from models.models import Conversation, Message
+
+    async def create_schema():
+        async with get_engine().begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(create_search_schema)
+
+    asyncio.run(create_schema())
+
+    # Raw inserts bypass CompactId, so ids are written as their 16 bytes
+    random.seed(7)
+    vocabulary = [f"word{rank}" for rank in range(5000)]
+    user_id = new_id()
+    importer_id = new_id()
+    db = sqlite3.connect(db_path)
+    # The full-text triggers call message_text()
+    register_sqlite_functions(db)
+    db.executemany(
+        "INSERT INTO users (id, username, email, hashed_password) VALUES (?, ?, ?, 'x')",
+        [(id_bytes(user_id), "exporter", "exporter@example.com"), (id_bytes(importer_id), "importer", "importer@example.com")]
+    )
+    base = datetime(2024, 1, 1)
+    started = time.perf_counter()
+    for start in range(0, args.messages, args.per_conversation):
+        conv_id = id_bytes(new_id())
+        db.execute(
+            "INSERT INTO conversations (id, user_id, title, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (conv_id, id_bytes(user_id), " ".join(random.choices(vocabulary, k=4)), base, base)
+        )
+        db.executemany(
+            "INSERT INTO messages (id, conversation_id, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+            [
+                (id_bytes(new_id()), conv_id, "user" if m % 2 == 0 else "assistant",
+                 " ".join(random.choices(vocabulary, k=args.words)), base + timedelta(seconds=start + m))
+                for m in range(min(args.per_conversation, args.messages - start))
+            ]
+        )
+    db.commit()
+    db.close()
+    print(f"seeded {args.messages} messages in {time.perf_counter() - started:.1f}s")
+
+    async def orm_load():
+        async with AsyncSessionLocal() as session:
+            conversations = (await session.execute(select(Conversation).where(Conversation.user_id == user_id))).scalars().all()
+            messages = (await session.execute(
+                select(Message).join(Conversation).where(Conversation.user_id == user_id)
+            )).scalars().all()
+            size = 0
+            for conversation in conversations:
+                size += len(record_line({"type": "conversation", "id": conversation.id, "title": conversation.title,
+                                         "created_at": conversation.created_at, "updated_at": conversation.updated_at}))
+            for message in messages:
+                size += len(record_line({"type": "message", "id": message.id, "conversation_id": message.conversation_id,
+                                         "role": message.role, "content": message.content, "created_at": message.created_at}))
+            return size
+
+    export_path = os.path.join(workdir, "export.ndjson")
+
+    async def stream_to_file(gzip: bool):
+        chunks = export_user(user_id)
+        if gzip:
+            chunks = gzip_chunks(chunks)
+        size = 0
+        with open(export_path + (".gz" if gzip else ""), "wb") as output:
+            async for chunk in chunks:
+                output.write(chunk)
+                size += len(chunk)
+        return size
+
+    async def import_file():
+        async def chunks():
+            with open(export_path, "rb") as source:
+                while chunk := source.read(64 * 1024):
+                    yield chunk
+        async with AsyncSessionLocal() as session:
+            counts = await import_user(session, importer_id, chunks())
+        return os.path.getsize(export_path), counts["messages"]
+
+    def measure(label, run):
+        tracemalloc.start()
+        started = time.perf_counter()
+        result = asyncio.run(run())
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        size = result[0] if isinstance(result, tuple) else result
+        print(f"{label:>9} | {peak / 2 ** 20:>9.1f} | {elapsed:>7.1f} | {args.messages / elapsed:>10.0f} | {size / 2 ** 20:>8.1f}")
+
+    print(f"{'path':>9} | {'peak MB':>9} | {'secs':>7} | {'msgs/s':>10} | {'out MB':>8}")
+    measure("orm-load", orm_load)
+    measure("export", lambda: stream_to_file(False))
+    measure("gzip", lambda: stream_to_file(True))
+    measure("import", import_file)
+    asyncio.run(dispose_engine())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Concurrency load test for core.chat_service against the local OpenRouter stub.
+
+Fires N simultaneous completions and reports the wall time next to the time
+they would take if each one blocked the event loop in turn.
+
+    python -m benchmarks.load_chat --concurrency 50 --latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import time
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent chat completion load test")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--stream", action="store_true", help="Use the streaming client path")
+    args = parser.parse_args()
+
+    # Point the chat service at the stub before it builds its client
+    os.environ["OPENROUTER_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+    os.environ.setdefault("OPENROUTER_API_KEY", "stub-key")
+
+    from benchmarks.stub_openrouter import create_stub_app, StubServer
+    from core import chat_service
+
+    async def one_chat():
+        started = time.perf_counter()
+        if args.stream:
+            async for _ in chat_service.stream_openrouter_response("hello from the load test"):
+                pass
+        else:
+            await chat_service.get_openrouter_response("hello from the load test")
+        return time.perf_counter() - started
+
+    async def run():
+        # Warm the connection pool so the run measures steady state
+        await one_chat()
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(one_chat() for _ in range(args.concurrency)))
+        wall = time.perf_counter() - started
+        await chat_service.close_openrouter_client()
+        return wall, sorted(latencies)
+
+    stub = create_stub_app(args.latency, args.tokens_per_second)
+    with StubServer(stub, port=args.port):
+        wall, latencies = asyncio.run(run())
+
+    serial = sum(latencies)
+    print(f"requests:            {args.concurrency}")
+    print(f"wall time:           {wall:.2f}s")
+    print(f"serialized estimate: {serial:.2f}s")
+    print(f"p50 latency:         {latencies[len(latencies) // 2]:.3f}s")
+    print(f"max latency:         {latencies[-1]:.3f}s")
+    print(f"max upstream overlap: {stub.state.stats.max_in_flight}")
+
+if __name__ == "__main__":
+    main()
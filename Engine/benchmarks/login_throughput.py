@@ -0,0 +1,52 @@
+"""
+Password verification throughput of core.auth across bcrypt pool sizes.
+
+Simulates a login peak: many login handlers verify passwords at once and
+the bcrypt pool decides how many hashes run in parallel.
+
+    python -m benchmarks.login_throughput --logins 64 --rounds 10
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+def main():
+    parser = argparse.ArgumentParser(description="Login verification throughput")
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=10, help="bcrypt cost")
+    parser.add_argument("--workers", type=int, nargs="+", default=None, help="bcrypt pool sizes to compare")
+    args = parser.parse_args()
+
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    from core import auth
+    from core.cache import TTLCache
+
+    cores = os.cpu_count() or 1
+    sizes = args.workers or sorted({1, max(1, cores // 2), cores, cores * 2})
+    hashed = auth.pwd_context.hash("correct horse battery staple")
+
+    async def run(cache_ttl: int):
+        auth._login_cache = TTLCache(auth.LOGIN_CACHE_SIZE, cache_ttl)
+        if cache_ttl:
+            # Repeat logins within the TTL, e.g. a user signing in on a second device
+            await auth.verify_password("correct horse battery staple", hashed)
+        started = time.perf_counter()
+        results = await asyncio.gather(*(
+            auth.verify_password("correct horse battery staple", hashed) for _ in range(args.logins)
+        ))
+        elapsed = time.perf_counter() - started
+        assert all(results)
+        return args.logins / elapsed
+
+    print(f"cores: {cores}, bcrypt cost: {args.rounds}, logins: {args.logins}")
+    print(f"{'pool size':>9} | {'logins/s':>9} | {'cached logins/s':>15}")
+    for size in sizes:
+        auth._hash_executor.shutdown()
+        auth._hash_executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="bcrypt")
+        print(f"{size:>9} | {asyncio.run(run(0)):>9.1f} | {asyncio.run(run(300)):>15.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Upstream resilience scenarios against the local OpenRouter stub.
+
+Runs the chat service against a primary and a fallback model with injected
+faults and reports how many requests got a real completion, how many
+upstream calls each model received and the latency distribution:
+
+  flaky    primary fails --failure-rate of requests with 503
+  outage   primary fails every request with 503
+  slow     primary answers --slow-by seconds late (hedging on vs off)
+
+    python -m benchmarks.resilience --requests 100
+"""
+import argparse
+import asyncio
+import os
+import time
+
+PRIMARY = "stub/primary"
+SECONDARY = "stub/secondary"
+
+def main():
+    parser = argparse.ArgumentParser(description="Retry, circuit breaker, failover and hedging scenarios")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--tokens-per-second", type=float, default=2000.0)
+    parser.add_argument("--failure-rate", type=float, default=0.3)
+    parser.add_argument("--slow-by", type=float, default=1.5)
+    parser.add_argument("--hedge-after", type=float, default=0.3)
+    parser.add_argument("--port", type=int, default=8768)
+    args = parser.parse_args()
+
+    os.environ["OPENROUTER_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+    os.environ.setdefault("OPENROUTER_API_KEY", "stub-key")
+    os.environ["OPENROUTER_MODEL"] = PRIMARY
+    os.environ["OPENROUTER_FALLBACK_MODELS"] = SECONDARY
+    os.environ["REQUEST_COALESCING_ENABLED"] = "false"
+    os.environ["UPSTREAM_BACKOFF_BASE"] = "0.05"
+
+    from benchmarks.stub_openrouter import create_stub_app, StubServer, STUB_REPLY
+    from core import chat_service, upstream
+
+    stub = create_stub_app(args.latency, args.tokens_per_second)
+
+    async def run():
+        gate = asyncio.Semaphore(args.concurrency)
+
+        async def one(i):
+            async with gate:
+                started = time.perf_counter()
+                reply = await chat_service.get_openrouter_response(f"resilience request {i}")
+                return reply == STUB_REPLY, time.perf_counter() - started
+
+        results = await asyncio.gather(*(one(i) for i in range(args.requests)))
+        await chat_service.close_openrouter_client()
+        return results
+
+    def scenario(label, failures=None, model_latency=None, retries=2, fallback=True, hedge_after=0.0):
+        stub.state.failures = failures or {}
+        stub.state.model_latency = model_latency or {}
+        stub.state.stats.by_model.clear()
+        upstream.breakers.clear()
+        upstream.UPSTREAM_MAX_RETRIES = retries
+        upstream.OPENROUTER_FALLBACK_MODELS = [SECONDARY] if fallback else []
+        upstream.UPSTREAM_HEDGE_AFTER = hedge_after
+
+        started = time.perf_counter()
+        results = asyncio.run(run())
+        wall = time.perf_counter() - started
+        latencies = sorted(latency for _, latency in results)
+        ok = sum(1 for success, _ in results if success)
+        calls = stub.state.stats.by_model
+        print(
+            f"{label:34} ok {ok:4d}/{len(results)}  primary calls {calls.get(PRIMARY, 0):4d}  "
+            f"fallback calls {calls.get(SECONDARY, 0):4d}  p50 {latencies[len(latencies) // 2]:.3f}s  "
+            f"p99 {latencies[int(len(latencies) * 0.99) - 1]:.3f}s  wall {wall:.2f}s"
+        )
+
+    flaky = {PRIMARY: (503, args.failure_rate)}
+    down = {PRIMARY: (503, 1.0)}
+    slow = {PRIMARY: args.slow_by}
+    with StubServer(stub, port=args.port):
+        scenario("flaky, no retries, no fallback", flaky, retries=0, fallback=False)
+        scenario("flaky, retries", flaky, fallback=False)
+        scenario("outage, retries, no fallback", down, fallback=False)
+        scenario("outage, retries + breaker + fallback", down)
+        scenario("slow primary, no hedging", model_latency=slow)
+        scenario(f"slow primary, hedge after {args.hedge_after}s", model_latency=slow, hedge_after=args.hedge_after)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Response cache benchmark against the local OpenRouter stub.
+
+Replays a prompt mix where a share of requests are repeated first-turn
+prompts, with the cache off, on the in-process LRU, and on the Redis
+backend (a real server with --redis-url, otherwise an in-process stand-in).
+Reports wall time, upstream calls and cache hit ratio.
+
+    python -m benchmarks.response_cache --requests 400 --repeat-share 0.6
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+COMMON_PROMPTS = ["hello", "what can you do", "How do I reset my password?", "help", "What is TSF Chat?"]
+
+class LocalRedis:
+    """
+    In-process stand-in for a Redis server, with the get/set(ex=) subset the cache uses
+    """
+    def __init__(self):
+        self._data = {}
+
+    async def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value.encode()
+
+    async def set(self, key, value, ex=None):
+        self._data[key] = (time.monotonic() + (ex or float("inf")), value)
+
+    async def aclose(self):
+        self._data.clear()
+
+def build_prompts(count: int, repeat_share: float, seed: int) -> list:
+    rng = random.Random(seed)
+    prompts = []
+    for i in range(count):
+        if rng.random() < repeat_share:
+            # Same question, different spacing and case
+            prompt = rng.choice(COMMON_PROMPTS)
+            prompts.append(prompt.upper() if rng.random() < 0.2 else "  " + prompt)
+        else:
+            prompts.append(f"unique question number {i}")
+    return prompts
+
+def main():
+    parser = argparse.ArgumentParser(description="Response cache benchmark")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--repeat-share", type=float, default=0.6)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--redis-url", default=None, help="Use a real Redis server instead of the stand-in")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    os.environ["OPENROUTER_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+    os.environ.setdefault("OPENROUTER_API_KEY", "stub-key")
+
+    from benchmarks.stub_openrouter import create_stub_app, StubServer
+    from core import chat_service
+    from core.response_cache import ResponseCache, MemoryBackend, RedisBackend, set_response_cache
+
+    prompts = build_prompts(args.requests, args.repeat_share, args.seed)
+
+    async def run(cache):
+        set_response_cache(cache)
+        gate = asyncio.Semaphore(args.concurrency)
+
+        async def one(prompt):
+            async with gate:
+                await chat_service.get_openrouter_response(prompt)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(p) for p in prompts))
+        wall = time.perf_counter() - started
+        if cache is not None:
+            await cache.close()
+        set_response_cache(None)
+        await chat_service.close_openrouter_client()
+        return wall
+
+    stub = create_stub_app(args.latency, args.tokens_per_second)
+    if args.redis_url:
+        redis_backend = lambda: RedisBackend.from_url(args.redis_url)
+        redis_label = "redis"
+    else:
+        redis_backend = lambda: RedisBackend(LocalRedis())
+        redis_label = "redis (stand-in)"
+
+    with StubServer(stub, port=args.port):
+        for label, make_cache in (
+            ("off", lambda: None),
+            ("memory", lambda: ResponseCache(MemoryBackend(), with_history=False)),
+            (redis_label, lambda: ResponseCache(redis_backend(), with_history=False)),
+        ):
+            cache = make_cache()
+            calls_before = stub.state.stats.total
+            wall = asyncio.run(run(cache))
+            upstream = stub.state.stats.total - calls_before
+            line = f"{label:18} wall {wall:6.2f}s  upstream calls {upstream:4d}  req/s {args.requests / wall:7.1f}"
+            if cache is not None:
+                line += f"  hit ratio {cache.stats()['hit_ratio']:.2f}"
+            print(line)
+
+if __name__ == "__main__":
+    main()
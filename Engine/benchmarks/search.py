@@ -0,0 +1,162 @@
+"""
+Indexing rate and query latency of GET /search on SQLite FTS5.
+
+Seeds a throwaway SQLite database with --messages messages spread over
+--users users, written with plain executemany batches so the full-text
+triggers index every row as chat would. Words are drawn from a Zipf-like
+vocabulary, so "common" terms match a large share of a user's messages and
+"rare" ones only a handful. Each query is timed for a typical user and for
+one heavy user, through the route's search function and against the LIKE
+scan it replaces.
+
+The most common words cost the most: BM25 ranking counts every message in
+the table containing the term, not just the user's.
+
+    python -m benchmarks.search --messages 1000000 --users 1000
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text search benchmark")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--per-conversation", type=int, default=20, help="Messages per conversation")
+    parser.add_argument("--words", type=int, default=20, help="Words per message")
+    parser.add_argument("--heavy-user", type=int, default=100_000, help="Messages of the one heavy user")
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+    from sqlalchemy import and_, func, select
+    from core.database import Base, get_engine, AsyncSessionLocal
+    from core.compression import register_sqlite_functions
+    from core.search import create_search_schema, search_messages
+    from models.models import Conversation, Message
+
+    random.seed(7)
+    # Fixed-width words, so no word is a substring of another and LIKE finds the same messages
+    vocabulary = [f"w{rank:05d}" for rank in range(args.vocabulary)]
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(args.vocabulary)))
+
+    def words(k):
+        return " ".join(random.choices(vocabulary, cum_weights=cum_weights, k=k))
+
+    async def create_schema():
+        async with get_engine().begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(create_search_schema)
+
+    asyncio.run(create_schema())
+
+    # Raw inserts bypass CompactId, so ids are written as their 16 bytes
+    users = [str(uuid.uuid4()) for _ in range(args.users)]
+    db = sqlite3.connect(db_path)
+    # The full-text triggers call message_text()
+    register_sqlite_functions(db)
+    db.executemany(
+        "INSERT INTO users (id, username, email, hashed_password) VALUES (?, ?, ?, 'x')",
+        [(uuid.UUID(user_id).bytes, f"bench{i}", f"bench{i}@example.com") for i, user_id in enumerate(users)]
+    )
+    db.commit()
+
+    # One conversation per user per round, generated up front so only the inserts are timed
+    base = datetime.utcnow()
+    rounds = []
+
+    def generate(user_ids, count):
+        generated = 0
+        while generated < count:
+            conversations = []
+            messages = []
+            for user_id in user_ids:
+                if generated >= count:
+                    break
+                conv_id = uuid.uuid4().bytes
+                conversations.append((conv_id, uuid.UUID(user_id).bytes, words(4), base, base))
+                for m in range(min(args.per_conversation, count - generated)):
+                    role = "user" if m % 2 == 0 else "assistant"
+                    created_at = base + timedelta(seconds=len(rounds) + generated)
+                    messages.append((uuid.uuid4().bytes, conv_id, role, words(args.words), created_at))
+                    generated += 1
+            rounds.append((conversations, messages))
+
+    heavy_user, users = users[0], users[1:]
+    generate(users, args.messages - args.heavy_user)
+    generate([heavy_user], args.heavy_user)
+
+    written = 0
+    started = time.perf_counter()
+    for conversations, messages in rounds:
+        db.executemany(
+            "INSERT INTO conversations (id, user_id, title, created_at, updated_at) VALUES (?, ?, ?, ?, ?)", conversations
+        )
+        db.executemany(
+            "INSERT INTO messages (id, conversation_id, role, content, created_at) VALUES (?, ?, ?, ?, ?)", messages
+        )
+        db.commit()
+        written += len(messages)
+    elapsed = time.perf_counter() - started
+    db.close()
+    print(f"indexed {written} messages in {elapsed:.1f}s ({written / elapsed:,.0f} messages/s, triggers on)")
+    print(f"database size {os.path.getsize(db_path) / 2 ** 20:,.0f} MiB")
+
+    queries = {
+        "common": [vocabulary[0]],
+        "frequent": [vocabulary[10]],
+        "mid": [vocabulary[300]],
+        "rare": [vocabulary[15000]],
+        "two terms": [vocabulary[3], vocabulary[50]],
+    }
+
+    async def like_scan(db, user_id, terms):
+        # The unindexed fallback: scan every message of the user
+        query = select(Message.id, Message.content).join(
+            Conversation, Conversation.id == Message.conversation_id
+        ).where(
+            Conversation.user_id == user_id,
+            and_(*(func.lower(Message.content).contains(term) for term in terms))
+        ).order_by(Message.created_at.desc()).limit(args.limit)
+        return (await db.execute(query)).all()
+
+    def percentiles(timings):
+        timings = sorted(timings)
+        return timings[len(timings) // 2] * 1000, timings[int(len(timings) * 0.95) - 1] * 1000
+
+    async def measure(fn, user_id, terms):
+        timings = []
+        async with AsyncSessionLocal() as db:
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                rows = await fn(db, user_id, terms)
+                timings.append(time.perf_counter() - started)
+        return len(rows), percentiles(timings)
+
+    async def run():
+        fts = lambda db, user_id, terms: search_messages(db, user_id, terms, args.limit, 0)
+        typical = (args.messages - args.heavy_user) // len(users)
+        for label, user_id in ((f"typical user, {typical} messages", users[0]),
+                               (f"heavy user, {args.heavy_user} messages", heavy_user)):
+            print(f"\n{label}")
+            print(f"{'query':>10} | {'fts rows':>8} {'p50 ms':>8} {'p95 ms':>8} | {'like rows':>9} {'p50 ms':>8} {'p95 ms':>8}")
+            for name, terms in queries.items():
+                rows, (p50, p95) = await measure(fts, user_id, terms)
+                like_rows, (like_p50, like_p95) = await measure(like_scan, user_id, terms)
+                print(f"{name:>10} | {rows:>8} {p50:>8.2f} {p95:>8.2f} | {like_rows:>9} {like_p50:>8.2f} {like_p95:>8.2f}")
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+CPU time per request of the conversation read endpoints on large threads.
+
+Seeds a throwaway SQLite database with one conversation per --sizes entry
+and times, with process CPU time rather than wall time:
+
+  endpoint     GET /conversations/{id}?limit=N through the app, N being the
+               whole thread, so every message is loaded and serialized
+  orm+pydantic the thread loaded as Message entities and validated through
+               ConversationOut with from_attributes, then json.dumps
+  rows+orjson  the thread loaded as column tuples, built into plain dicts
+               and serialized with orjson, as the read endpoints now do
+
+    python -m benchmarks.serialization --sizes 1000,10000
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+def main():
+    parser = argparse.ArgumentParser(description="Read endpoint serialization benchmark")
+    parser.add_argument("--sizes", default="1000,10000", help="Messages per conversation, comma separated")
+    parser.add_argument("--words", type=int, default=40, help="Words per message")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("JWT_SECRET", "bench")
+    # Let one page hold a whole thread
+    os.environ["MAX_PAGE_SIZE"] = str(max(sizes))
+    os.environ["METRICS_ENABLED"] = "false"
+
+    import asyncio
+    import orjson
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.testclient import TestClient
+    from sqlalchemy import select
+    from core.auth import create_access_token
+    from core.database import Base, AsyncSessionLocal, get_engine
+    from core.ids import id_bytes, new_id
+    from core.compression import register_sqlite_functions
+    from core.search import create_search_schema
+    from models.models import Conversation, Message
+    from schemas.schemas import ConversationOut
+    from main import app
+
+    async def create_schema():
+        async with get_engine().begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(create_search_schema)
+
+    asyncio.run(create_schema())
+
+    # Raw inserts bypass CompactId, so ids are written as their 16 bytes
+    random.seed(7)
+    vocabulary = [f"word{rank}" for rank in range(5000)]
+    user_id = new_id()
+    db = sqlite3.connect(db_path)
+    # The full-text triggers call message_text()
+    register_sqlite_functions(db)
+    db.execute(
+        "INSERT INTO users (id, username, email, hashed_password) VALUES (?, 'bench', 'bench@example.com', 'x')",
+        (id_bytes(user_id),)
+    )
+    base = datetime(2024, 1, 1)
+    conversation_ids = {}
+    for size in sizes:
+        conversation_id = new_id()
+        conversation_ids[size] = conversation_id
+        db.execute(
+            "INSERT INTO conversations (id, user_id, title, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (id_bytes(conversation_id), id_bytes(user_id), f"{size} messages", base, base)
+        )
+        db.executemany(
+            "INSERT INTO messages (id, conversation_id, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+            [
+                (id_bytes(new_id()), id_bytes(conversation_id), "user" if m % 2 == 0 else "assistant",
+                 " ".join(random.choices(vocabulary, k=args.words)), base + timedelta(seconds=m, microseconds=m))
+                for m in range(size)
+            ]
+        )
+    db.commit()
+    db.close()
+
+    async def orm_pydantic(conversation_id: str) -> bytes:
+        async with AsyncSessionLocal() as session:
+            conversation = await session.get(Conversation, conversation_id)
+            messages = (await session.execute(
+                select(Message).where(Message.conversation_id == conversation_id)
+                .order_by(Message.created_at.desc(), Message.id.desc())
+            )).scalars().all()
+            out = ConversationOut(
+                id=conversation.id, title=conversation.title, created_at=conversation.created_at,
+                updated_at=conversation.updated_at, messages=messages[::-1]
+            )
+            return json.dumps(jsonable_encoder(out)).encode()
+
+    async def rows_orjson(conversation_id: str) -> bytes:
+        async with AsyncSessionLocal() as session:
+            conversation = (await session.execute(
+                select(Conversation.id, Conversation.title, Conversation.created_at, Conversation.updated_at)
+                .where(Conversation.id == conversation_id)
+            )).one()
+            rows = (await session.execute(
+                select(Message.id, Message.role, Message.content, Message.created_at)
+                .where(Message.conversation_id == conversation_id)
+                .order_by(Message.created_at.desc(), Message.id.desc())
+            )).all()
+            return orjson.dumps({
+                "id": conversation.id, "title": conversation.title, "created_at": conversation.created_at,
+                "updated_at": conversation.updated_at,
+                "messages": [
+                    {"id": message_id, "role": role, "content": content, "created_at": created_at}
+                    for message_id, role, content, created_at in reversed(rows)
+                ],
+                "next_cursor": None,
+            })
+
+    def cpu_ms(run, repeat: int) -> float:
+        run()  # Warm up caches and compiled statements
+        started = time.process_time()
+        for _ in range(repeat):
+            run()
+        return (time.process_time() - started) / repeat * 1000
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': user_id})}"}
+    print(f"{'messages':>9} | {'endpoint ms':>11} | {'orm+pydantic ms':>15} | {'rows+orjson ms':>14} | {'body KB':>8}")
+    with TestClient(app) as client:
+        for size in sizes:
+            conversation_id = conversation_ids[size]
+            url = f"/conversations/{conversation_id}"
+
+            def request():
+                response = client.get(url, params={"limit": size}, headers=headers)
+                assert response.status_code == 200, response.text
+                return response
+
+            repeat = max(1, args.repeat * 1000 // size)
+            body = request().content
+            assert len(orjson.loads(body)["messages"]) == size
+            endpoint = cpu_ms(request, repeat)
+            orm = cpu_ms(lambda: asyncio.run(orm_pydantic(conversation_id)), repeat)
+            rows = cpu_ms(lambda: asyncio.run(rows_orjson(conversation_id)), repeat)
+            print(f"{size:>9} | {endpoint:>11.1f} | {orm:>15.1f} | {rows:>14.1f} | {len(body) / 1024:>8.0f}")
+
+if __name__ == "__main__":
+    main()
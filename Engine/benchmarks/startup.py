@@ -0,0 +1,78 @@
+"""
+Cold-start cost of the serverless entry point: import time plus first request.
+
+Each run starts a fresh interpreter, imports the app and serves one
+authenticated request in-process, the way a new Vercel/Lambda instance
+would. The SQLite schema is created beforehand with manage.py init-db.
+
+    python -m benchmarks.startup --runs 5 --budget-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Executed in a fresh interpreter per run
+PROBE = r"""
+import asyncio, json, time
+started = time.perf_counter()
+import {module} as entry
+imported = time.perf_counter()
+
+import httpx
+from core.auth import create_access_token
+
+async def first_request():
+    transport = httpx.ASGITransport(app=entry.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+        token = create_access_token({{"sub": "0000000001"}})
+        response = await client.get("/conversations", headers={{"Authorization": f"Bearer {{token}}"}})
+        response.raise_for_status()
+
+before_request = time.perf_counter()
+asyncio.run(first_request())
+finished = time.perf_counter()
+print(json.dumps({{"import_ms": (imported - started) * 1000, "first_request_ms": (finished - before_request) * 1000}}))
+"""
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--module", default="api.index", help="Entry module exposing app")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if median import + first request exceeds this")
+    args = parser.parse_args()
+
+    engine_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'startup.db')}"
+    env.setdefault("JWT_SECRET", "startup-benchmark")
+    env.setdefault("OPENROUTER_API_KEY", "stub-key")
+    env["PYTHONPATH"] = engine_dir
+
+    subprocess.run([sys.executable, "manage.py", "init-db"], cwd=engine_dir, env=env, check=True, capture_output=True)
+
+    results = []
+    for _ in range(args.runs):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=args.module)],
+            cwd=engine_dir, env=env, check=True, capture_output=True, text=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    import_ms = statistics.median(r["import_ms"] for r in results)
+    request_ms = statistics.median(r["first_request_ms"] for r in results)
+    total_ms = import_ms + request_ms
+    print(f"entry module:       {args.module}")
+    print(f"import (median):    {import_ms:.1f}ms")
+    print(f"first request:      {request_ms:.1f}ms")
+    print(f"cold start total:   {total_ms:.1f}ms")
+
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"cold start exceeds budget of {args.budget_ms:.0f}ms")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Local stand-in for the OpenRouter chat completions API.
+
+Serves an OpenAI-compatible /v1/chat/completions endpoint with configurable
+latency and token rate so benchmarks never touch the real upstream.
+Per-model failures and extra latency can be injected to exercise retries,
+circuit breaking, failover and hedging.
+
+    python -m benchmarks.stub_openrouter --port 8765 --latency 0.5
+"""
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+import uvicorn
+
+STUB_REPLY = "This is a canned reply from the local OpenRouter stub used for benchmarking the chat service."
+
+class StubStats:
+    """In-flight and total request counters shared with the benchmark driver"""
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.total = 0
+        self.by_model = {}
+        self.failed = 0
+
+    def enter(self, model: str = None):
+        self.in_flight += 1
+        self.total += 1
+        if model is not None:
+            self.by_model[model] = self.by_model.get(model, 0) + 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def exit(self):
+        self.in_flight -= 1
+
+def create_stub_app(latency: float = 0.5, tokens_per_second: float = 50.0, reply: str = STUB_REPLY,
+                    failures: dict = None, model_latency: dict = None, prompt_tokens_per_second: float = 0) -> FastAPI:
+    """
+    Build the stub app.
+    latency is the time to first token, tokens_per_second paces streamed words.
+    prompt_tokens_per_second, when set, adds prompt processing time to the
+    latency at roughly four characters per token.
+    failures maps a model to (status code, failure probability), model_latency
+    maps a model to extra seconds before its first token; both can be changed
+    on app.state while the stub runs.
+    """
+    app = FastAPI()
+    app.state.stats = StubStats()
+    app.state.latency = latency
+    app.state.tokens_per_second = tokens_per_second
+    app.state.reply = reply
+    app.state.failures = dict(failures or {})
+    app.state.model_latency = dict(model_latency or {})
+    app.state.prompt_tokens_per_second = prompt_tokens_per_second
+
+    def chunk(completion_id: str, model: str, content: str = None, finish_reason: str = None) -> str:
+        delta = {"content": content} if content is not None else {}
+        body = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(body)}\n\n"
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        model = payload.get("model", "stub/model")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        words = app.state.reply.split(" ")
+        stats = app.state.stats
+        stats.enter(model)
+        latency = app.state.latency + app.state.model_latency.get(model, 0)
+        if app.state.prompt_tokens_per_second:
+            prompt_chars = sum(len(m.get("content") or "") for m in payload.get("messages", []))
+            latency += prompt_chars / 4 / app.state.prompt_tokens_per_second
+
+        status, failure_rate = app.state.failures.get(model, (None, 0))
+        if status is not None and random.random() < failure_rate:
+            stats.failed += 1
+            stats.exit()
+            return JSONResponse(
+                {"error": {"message": f"Injected failure for {model}", "code": status}},
+                status_code=status
+            )
+
+        if payload.get("stream"):
+            async def events():
+                try:
+                    await asyncio.sleep(latency)
+                    for i, word in enumerate(words):
+                        if i:
+                            await asyncio.sleep(1 / app.state.tokens_per_second)
+                        yield chunk(completion_id, model, word if i == 0 else " " + word)
+                    yield chunk(completion_id, model, finish_reason="stop")
+                    yield "data: [DONE]\n\n"
+                finally:
+                    stats.exit()
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        try:
+            await asyncio.sleep(latency + len(words) / app.state.tokens_per_second)
+        finally:
+            stats.exit()
+        return JSONResponse({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": app.state.reply},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 10, "completion_tokens": len(words), "total_tokens": 10 + len(words)},
+        })
+
+    return app
+
+class StubServer:
+    """Run an ASGI app (the stub or the API itself) on a background thread"""
+    def __init__(self, app: FastAPI, host: str = "127.0.0.1", port: int = 8765):
+        self.app = app
+        self.url = f"http://{host}:{port}/v1"
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local OpenRouter stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    args = parser.parse_args()
+    uvicorn.run(create_stub_app(args.latency, args.tokens_per_second), host=args.host, port=args.port)
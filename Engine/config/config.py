@@ -7,9 +7,135 @@ JWT_SECRET_KEY = os.getenv("JWT_SECRET")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 JWT_EXPIRE_MINUTES = int(os.getenv("JWT_EXPIRE_MINUTES", 30))
 
+# Password hashing
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))  # Existing hashes are upgraded on login
+BCRYPT_MAX_WORKERS = int(os.getenv("BCRYPT_MAX_WORKERS", os.cpu_count() or 1))  # Concurrent hashes per worker
+LOGIN_CACHE_TTL = int(os.getenv("LOGIN_CACHE_TTL", 300))  # Seconds; 0 disables the verification cache
+LOGIN_CACHE_SIZE = int(os.getenv("LOGIN_CACHE_SIZE", 10000))
+
+# Authenticated request caches
+TOKEN_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", 300))  # Seconds, never past the token's exp
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", 60))  # Seconds; 0 disables the user-existence cache
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+
 # OpenRouter Configuration
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
 OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "openai/gpt-4o")
+OPENROUTER_FALLBACK_MODELS = [m.strip() for m in os.getenv("OPENROUTER_FALLBACK_MODELS", "").split(",") if m.strip()]  # Tried in order after OPENROUTER_MODEL
 SITE_URL = os.getenv("SITE_URL", "")  # Optional: Your site URL
-SITE_NAME = os.getenv("SITE_NAME", "TSF Chat")  # Optional: Your site name
\ No newline at end of file
+SITE_NAME = os.getenv("SITE_NAME", "TSF Chat")  # Optional: Your site name
+
+# OpenRouter connection pool and concurrency limits
+OPENROUTER_MAX_CONNECTIONS = int(os.getenv("OPENROUTER_MAX_CONNECTIONS", 100))
+OPENROUTER_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENROUTER_MAX_KEEPALIVE_CONNECTIONS", 20))
+OPENROUTER_KEEPALIVE_EXPIRY = float(os.getenv("OPENROUTER_KEEPALIVE_EXPIRY", 30))
+OPENROUTER_TIMEOUT = float(os.getenv("OPENROUTER_TIMEOUT", 60))  # Per-request timeout in seconds
+OPENROUTER_CONNECT_TIMEOUT = float(os.getenv("OPENROUTER_CONNECT_TIMEOUT", 10))
+OPENROUTER_MAX_CONCURRENCY = int(os.getenv("OPENROUTER_MAX_CONCURRENCY", 32))  # In-flight completions per worker
+REQUEST_COALESCING_ENABLED = os.getenv("REQUEST_COALESCING_ENABLED", "true").lower() in ("1", "true", "yes")  # Share identical in-flight completions
+
+# Upstream retries, circuit breaker and hedging
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", 2))  # Retries per model for transient errors
+UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", 0.25))  # Seconds, doubled per retry with full jitter
+UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", 4))
+UPSTREAM_BREAKER_WINDOW = float(os.getenv("UPSTREAM_BREAKER_WINDOW", 30))  # Seconds of outcomes a model's circuit looks at
+UPSTREAM_BREAKER_MIN_CALLS = int(os.getenv("UPSTREAM_BREAKER_MIN_CALLS", 20))  # Calls in the window before it can open
+UPSTREAM_BREAKER_FAILURE_RATIO = float(os.getenv("UPSTREAM_BREAKER_FAILURE_RATIO", 0.5))  # Share of failures that opens it
+UPSTREAM_BREAKER_RESET = float(os.getenv("UPSTREAM_BREAKER_RESET", 30))  # Seconds before a trial request is let through
+UPSTREAM_HEDGE_AFTER = float(os.getenv("UPSTREAM_HEDGE_AFTER", 0))  # Seconds before racing the next model; 0 disables
+
+# Completion cache for repeated prompts (opt-in)
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")  # "memory" or "redis"
+RESPONSE_CACHE_REDIS_URL = os.getenv("RESPONSE_CACHE_REDIS_URL", "redis://localhost:6379/0")
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 3600))  # Seconds
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 10000))  # Entries per worker, memory backend only
+RESPONSE_CACHE_WITH_HISTORY = os.getenv("RESPONSE_CACHE_WITH_HISTORY", "false").lower() in ("1", "true", "yes")  # Otherwise first turns only
+
+# Token-bucket rate limits, checked before a completion is requested (opt-in); 0 disables a limit
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "false").lower() in ("1", "true", "yes")
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # "memory" (per worker) or "redis" (shared)
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_MODE = os.getenv("RATE_LIMIT_MODE", "reject")  # "reject" with 429, or "queue" up to RATE_LIMIT_MAX_WAIT
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", 10))  # Seconds a queued request may wait
+RATE_LIMIT_USER_REQUESTS_PER_MINUTE = float(os.getenv("RATE_LIMIT_USER_REQUESTS_PER_MINUTE", 20))
+RATE_LIMIT_USER_REQUEST_BURST = float(os.getenv("RATE_LIMIT_USER_REQUEST_BURST", 10))
+RATE_LIMIT_USER_TOKENS_PER_MINUTE = float(os.getenv("RATE_LIMIT_USER_TOKENS_PER_MINUTE", 40000))
+RATE_LIMIT_USER_TOKEN_BURST = float(os.getenv("RATE_LIMIT_USER_TOKEN_BURST", 20000))
+RATE_LIMIT_GLOBAL_REQUESTS_PER_MINUTE = float(os.getenv("RATE_LIMIT_GLOBAL_REQUESTS_PER_MINUTE", 600))
+RATE_LIMIT_GLOBAL_REQUEST_BURST = float(os.getenv("RATE_LIMIT_GLOBAL_REQUEST_BURST", 100))
+RATE_LIMIT_GLOBAL_TOKENS_PER_MINUTE = float(os.getenv("RATE_LIMIT_GLOBAL_TOKENS_PER_MINUTE", 1000000))
+RATE_LIMIT_GLOBAL_TOKEN_BURST = float(os.getenv("RATE_LIMIT_GLOBAL_TOKEN_BURST", 200000))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))  # User buckets kept per worker, memory backend only
+
+# Canned local replies to trivial prompts such as "hi" or "thanks", checked before the upstream (opt-in)
+LOCAL_RESPONDER_ENABLED = os.getenv("LOCAL_RESPONDER_ENABLED", "false").lower() in ("1", "true", "yes")
+LOCAL_RESPONDER_RULES = os.getenv("LOCAL_RESPONDER_RULES", "")  # JSON rules file; built-in greetings when unset
+LOCAL_RESPONDER_RELOAD_INTERVAL = float(os.getenv("LOCAL_RESPONDER_RELOAD_INTERVAL", 5))  # Seconds between checks for a changed rules file
+LOCAL_RESPONDER_MAX_CHARS = int(os.getenv("LOCAL_RESPONDER_MAX_CHARS", 200))  # Longer messages always go upstream
+
+# Conversation history sent upstream
+CHAT_MESSAGE_MAX_CHARS = int(os.getenv("CHAT_MESSAGE_MAX_CHARS", 16000))  # Longest user message; MySQL's TEXT holds 65,535 bytes, up to 4 per character
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))  # Prompt tokens incl. the new message
+CONTEXT_MAX_MESSAGES = int(os.getenv("CONTEXT_MAX_MESSAGES", 200))  # Rows loaded when rebuilding a context
+CONTEXT_CACHE_SIZE = int(os.getenv("CONTEXT_CACHE_SIZE", 1000))  # Conversations cached per worker
+
+# Background compaction of older turns into a stored summary (opt-in; an extra completion per run, needs a long-lived worker)
+COMPACTION_ENABLED = os.getenv("COMPACTION_ENABLED", "false").lower() in ("1", "true", "yes")
+COMPACTION_TRIGGER_MESSAGES = int(os.getenv("COMPACTION_TRIGGER_MESSAGES", 40))  # Unsummarized messages that start a run
+COMPACTION_TRIGGER_TOKENS = int(os.getenv("COMPACTION_TRIGGER_TOKENS", 2000))  # Unsummarized tokens that start a run
+COMPACTION_KEEP_MESSAGES = int(os.getenv("COMPACTION_KEEP_MESSAGES", 10))  # Newest messages always kept verbatim
+COMPACTION_KEEP_TOKENS = int(os.getenv("COMPACTION_KEEP_TOKENS", 1000))  # ...as long as they fit in this many tokens
+COMPACTION_INPUT_TOKENS = int(os.getenv("COMPACTION_INPUT_TOKENS", 8000))  # Message tokens folded in per summarization call
+COMPACTION_SUMMARY_TOKENS = int(os.getenv("COMPACTION_SUMMARY_TOKENS", 400))  # Summary length limit
+COMPACTION_DRAIN_TIMEOUT = float(os.getenv("COMPACTION_DRAIN_TIMEOUT", 30))  # Seconds allowed to finish runs on shutdown
+
+# Keyset pagination for conversation lists and message histories
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", 50))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 200))
+
+# Write-behind persistence of chat messages (opt-in; needs a long-lived worker, not serverless)
+MESSAGE_WRITE_BEHIND = os.getenv("MESSAGE_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", 200))  # Queued writes flushed in one transaction
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", 0.05))  # Seconds a write may wait for a batch
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", 10000))  # Queued writes before new ones wait
+WRITE_BEHIND_DRAIN_TIMEOUT = float(os.getenv("WRITE_BEHIND_DRAIN_TIMEOUT", 30))  # Seconds allowed to flush on shutdown
+
+# Streamed NDJSON export and import of a user's conversations
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))  # Rows per fetch from the server-side cursor
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 1000))  # Rows inserted per transaction
+IMPORT_MAX_LINE_BYTES = int(os.getenv("IMPORT_MAX_LINE_BYTES", 1048576))  # Longest NDJSON line accepted
+
+# Conversation deletion and archival into compressed blobs
+BULK_DELETE_MAX_IDS = int(os.getenv("BULK_DELETE_MAX_IDS", 100))  # Conversations per bulk delete request
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 0))  # Default age for manage.py archive-conversations; 0 requires --older-than
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 100))  # Stale conversations looked up per query
+
+# Compression of stored message content (SQLite; MySQL keeps plain text for its FULLTEXT index)
+MESSAGE_COMPRESSION_ENABLED = os.getenv("MESSAGE_COMPRESSION_ENABLED", "false").lower() in ("1", "true", "yes")
+MESSAGE_COMPRESSION_MIN_BYTES = int(os.getenv("MESSAGE_COMPRESSION_MIN_BYTES", 512))  # Shorter messages are stored as plain text
+MESSAGE_COMPRESSION_LEVEL = int(os.getenv("MESSAGE_COMPRESSION_LEVEL", 6))  # zlib level, 1 (fastest) to 9 (smallest)
+MESSAGE_COMPRESSION_DICTIONARIES = os.getenv("MESSAGE_COMPRESSION_DICTIONARIES", "")  # Comma-separated dictionary files; new rows use the first, all stay readable
+MESSAGE_COMPRESSION_BATCH_SIZE = int(os.getenv("MESSAGE_COMPRESSION_BATCH_SIZE", 1000))  # Rows per transaction in manage.py compress-messages
+
+# WebSocket chat channel (needs a long-lived worker, not serverless)
+WS_MAX_CONNECTIONS = int(os.getenv("WS_MAX_CONNECTIONS", 1000))  # Open sockets per worker; more are closed with 1013
+WS_AUTH_TIMEOUT = float(os.getenv("WS_AUTH_TIMEOUT", 10))  # Seconds to send the auth frame after connecting
+WS_HEARTBEAT_INTERVAL = float(os.getenv("WS_HEARTBEAT_INTERVAL", 20))  # Seconds between server pings
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", 60))  # Seconds without any frame, pongs included, before closing
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", 10))  # Seconds one frame may wait on a slow reader before closing
+WS_MAX_PENDING = int(os.getenv("WS_MAX_PENDING", 4))  # Messages queued behind the streaming reply; more are refused
+
+# Database connection pool
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 2))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 300))  # Seconds before a connection is replaced
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))  # Seconds to wait for a free connection
+
+# Metrics and structured logging
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")  # /metrics requires "Authorization: Bearer <token>"; without one it answers 404
+METRICS_PUBLIC = os.getenv("METRICS_PUBLIC", "false").lower() in ("1", "true", "yes")  # Serve /metrics without a token, e.g. behind a private network
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 0.01))  # Share of per-request info events logged; warnings always are
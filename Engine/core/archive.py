@@ -0,0 +1,134 @@
+from datetime import datetime
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from config.config import ARCHIVE_BATCH_SIZE, EXPORT_BATCH_SIZE, IMPORT_BATCH_SIZE
+from core.context import forget_conversation
+from core.database import AsyncSessionLocal
+from core.deletion import delete_rows
+from core.export import CHUNK_SIZE, inflate, record_line
+from core.write_behind import wait_for_writes
+from models.models import Conversation, ConversationArchive, Message
+from typing import Optional
+import anyio
+import json
+import logging
+import zlib
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_COMPRESSION_LEVEL = 6
+
+async def archive_conversation(db: AsyncSession, conversation_id: str, user_id: Optional[str] = None) -> bool:
+    """
+    Move a conversation into conversation_archives: its messages are
+    compressed into one blob of export lines and the live rows are deleted,
+    all in one transaction. With a user_id, only that user's conversation is
+    archived. Returns False if there was no such conversation.
+    """
+    await wait_for_writes(conversation_id)
+    query = select(
+        Conversation.id, Conversation.user_id, Conversation.title, Conversation.created_at, Conversation.updated_at
+    ).where(Conversation.id == conversation_id)
+    if user_id is not None:
+        query = query.where(Conversation.user_id == user_id)
+    conversation = (await db.execute(query)).first()
+    if conversation is None:
+        return False
+
+    compressor = zlib.compressobj(ARCHIVE_COMPRESSION_LEVEL)
+    parts = []
+    buffer = bytearray()
+    count = 0
+    messages = await db.stream(
+        select(Message.id, Message.role, Message.content, Message.created_at)
+        .where(Message.conversation_id == conversation_id)
+        .order_by(Message.created_at, Message.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    async for message_id, role, content, created_at in messages:
+        buffer += record_line({
+            "type": "message", "id": message_id, "conversation_id": conversation_id,
+            "role": role, "content": content, "created_at": created_at,
+        })
+        count += 1
+        if len(buffer) >= CHUNK_SIZE:
+            # Compressed on a worker thread so long threads do not hold up the event loop
+            parts.append(await anyio.to_thread.run_sync(compressor.compress, bytes(buffer)))
+            buffer.clear()
+    parts.append(compressor.compress(bytes(buffer)))
+    parts.append(compressor.flush())
+
+    db.add(ConversationArchive(
+        conversation_id=conversation.id,
+        user_id=conversation.user_id,
+        title=conversation.title,
+        created_at=conversation.created_at,
+        updated_at=conversation.updated_at,
+        archived_at=datetime.utcnow(),
+        message_count=count,
+        content=b"".join(parts),
+    ))
+    await delete_rows(db, [conversation_id])
+    await db.commit()
+    forget_conversation(conversation_id)
+    return True
+
+async def restore_conversation(db: AsyncSession, user_id: str, conversation_id: str) -> bool:
+    """
+    Move an archived conversation of the user back into the live tables,
+    with its original ids, in one transaction. Returns False if the user has
+    no such archive.
+    """
+    archive = (await db.execute(select(ConversationArchive).where(
+        ConversationArchive.conversation_id == conversation_id,
+        ConversationArchive.user_id == user_id
+    ))).scalars().first()
+    if archive is None:
+        return False
+
+    await db.execute(insert(Conversation), [{
+        "id": archive.conversation_id, "user_id": archive.user_id, "title": archive.title,
+        "created_at": archive.created_at, "updated_at": archive.updated_at,
+    }])
+    decompressor = zlib.decompressobj()
+    pending = b""
+    batch = []
+    content = archive.content
+    for start in range(0, len(content), CHUNK_SIZE):
+        for data in inflate(decompressor, content[start:start + CHUNK_SIZE]):
+            *lines, pending = (pending + data).split(b"\n")
+            for line in lines:
+                record = json.loads(line)
+                batch.append({
+                    "id": record["id"], "conversation_id": archive.conversation_id, "role": record["role"],
+                    "content": record["content"], "created_at": datetime.fromisoformat(record["created_at"]),
+                })
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                await db.execute(insert(Message), batch)
+                batch = []
+    if batch:
+        await db.execute(insert(Message), batch)
+    await db.execute(delete(ConversationArchive).where(ConversationArchive.conversation_id == conversation_id))
+    await db.commit()
+    return True
+
+async def archive_stale(older_than: datetime) -> int:
+    """
+    Archive every conversation last updated before older_than, one
+    transaction per conversation, so an interrupted run keeps its progress
+    and can simply be started again. Returns the number archived.
+    """
+    archived = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            conversation_ids = (await db.execute(
+                select(Conversation.id).where(Conversation.updated_at < older_than)
+                .order_by(Conversation.updated_at, Conversation.id)
+                .limit(ARCHIVE_BATCH_SIZE)
+            )).scalars().all()
+            if not conversation_ids:
+                return archived
+            for conversation_id in conversation_ids:
+                if await archive_conversation(db, conversation_id):
+                    archived += 1
+            logger.info(f"Archived {archived} conversations so far")
@@ -1,18 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from fastapi import HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
 from passlib.context import CryptContext
-from config.config import JWT_SECRET_KEY, JWT_ALGORITHM, JWT_EXPIRE_MINUTES
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from config.config import (
+    JWT_SECRET_KEY, JWT_ALGORITHM, JWT_EXPIRE_MINUTES,
+    BCRYPT_ROUNDS, BCRYPT_MAX_WORKERS, LOGIN_CACHE_TTL, LOGIN_CACHE_SIZE,
+    TOKEN_CACHE_TTL, TOKEN_CACHE_SIZE, USER_CACHE_TTL, USER_CACHE_SIZE,
+)
+from core.cache import TTLCache
+from core.ids import normalize_id
+from core.metrics import register_collector
+from models.models import User
+from typing import Optional
+import asyncio
+import hashlib
+import hmac
+import os
+import time
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes with a different cost than BCRYPT_ROUNDS are reported by password_needs_rehash
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 security = HTTPBearer()
 
-def hash_password(password: str):
-    return pwd_context.hash(password)
+# bcrypt releases the GIL, so a dedicated pool spreads hashing across cores
+# while capping how much CPU login peaks can take from other requests
+_hash_executor = ThreadPoolExecutor(max_workers=BCRYPT_MAX_WORKERS, thread_name_prefix="bcrypt")
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# Recently verified (password, hash) pairs, keyed by a keyed digest so that
+# no password material is kept in memory
+_login_cache_key = os.urandom(32)
+_login_cache = TTLCache(LOGIN_CACHE_SIZE, LOGIN_CACHE_TTL)
+
+# token digest -> user_id for tokens whose signature and expiry were checked
+_token_cache = TTLCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+
+# user_id -> True for users known to exist; only hits are cached
+_user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+register_collector("login_cache", _login_cache.stats)
+register_collector("token_cache", _token_cache.stats)
+register_collector("user_cache", _user_cache.stats)
+
+def _login_cache_digest(plain_password: str, hashed_password: str) -> bytes:
+    message = hashed_password.encode() + b"\0" + plain_password.encode()
+    return hmac.new(_login_cache_key, message, hashlib.sha256).digest()
+
+async def hash_password(password: str):
+    return await asyncio.wrap_future(_hash_executor.submit(pwd_context.hash, password))
+
+async def verify_password(plain_password, hashed_password):
+    """
+    Verify a password on the bcrypt pool.
+    Successful verifications are cached for LOGIN_CACHE_TTL seconds.
+    """
+    digest = _login_cache_digest(plain_password, hashed_password)
+    if _login_cache.get(digest):
+        return True
+    
+    verified = await asyncio.wrap_future(
+        _hash_executor.submit(pwd_context.verify, plain_password, hashed_password)
+    )
+    
+    if verified:
+        _login_cache.set(digest, True)
+    return verified
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Check whether a stored hash was made with a different bcrypt cost"""
+    return pwd_context.needs_update(hashed_password)
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -23,13 +82,61 @@ def create_access_token(data: dict):
 
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """
-    Verify JWT token and return user_id
+    Verify JWT token and return user_id.
+    Verified tokens are cached by digest until their exp or TOKEN_CACHE_TTL.
+    """
+    return decode_token(credentials.credentials)
+
+def decode_token(token: str) -> str:
+    """
+    Verify a bearer token outside of a request dependency, e.g. sent over a
+    WebSocket, and return its user_id
     """
+    digest = hashlib.sha256(token.encode()).digest()
+    user_id = _token_cache.get(digest)
+    if user_id is not None:
+        return user_id
+    
     try:
-        payload = jwt.decode(credentials.credentials, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        user_id: str = payload.get("sub")
+        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+        # Tokens issued before the id migration carry the old 10-digit user id
+        user_id = normalize_id(str(payload["sub"])) if payload.get("sub") is not None else None
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+        
+        expires_at = payload.get("exp")
+        _token_cache.set(digest, user_id, expires_at - time.time() if expires_at else None)
         return user_id
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+
+def token_expiry(token: str) -> Optional[float]:
+    """
+    The exp of a token that decode_token has accepted, as a Unix timestamp
+    """
+    expires_at = jwt.get_unverified_claims(token).get("exp")
+    return float(expires_at) if expires_at is not None else None
+
+async def user_exists(db: AsyncSession, user_id: str) -> bool:
+    """
+    Check that a user exists, consulting the short-lived user cache first
+    """
+    if _user_cache.get(user_id):
+        return True
+    
+    exists = (await db.execute(select(User.id).where(User.id == user_id))).first() is not None
+    if exists:
+        _user_cache.set(user_id, True)
+    return exists
+
+def invalidate_user(user_id: str):
+    """
+    Drop cached state for a user, e.g. after the account is deleted
+    """
+    _user_cache.pop(user_id)
+    _token_cache.discard_values(user_id)
+
+@event.listens_for(User, "after_delete")
+def _invalidate_deleted_user(mapper, connection, target):
+    # ORM deletes only; bulk query.delete() calls must use invalidate_user directly
+    invalidate_user(target.id)
@@ -1,13 +1,56 @@
-from openai import OpenAI
-from config.config import OPENROUTER_API_KEY, OPENROUTER_BASE_URL, OPENROUTER_MODEL, SITE_URL, SITE_NAME
+from config.config import (
+    OPENROUTER_API_KEY, OPENROUTER_BASE_URL, OPENROUTER_MODEL, SITE_URL, SITE_NAME,
+    OPENROUTER_MAX_CONNECTIONS, OPENROUTER_MAX_KEEPALIVE_CONNECTIONS, OPENROUTER_KEEPALIVE_EXPIRY,
+    OPENROUTER_TIMEOUT, OPENROUTER_CONNECT_TIMEOUT, REQUEST_COALESCING_ENABLED,
+)
+from core.local_responder import get_local_responder
+from core.metrics import llm_tokens, register_collector
+from core.response_cache import get_response_cache, make_key
+from core.single_flight import SingleFlight, StreamSingleFlight
+from core.upstream import CircuitOpenError, create_completion, status_of, stream_completion
+from typing import AsyncIterator, List, Optional
 import logging
 import time
 
-# Configure OpenRouter client
-client = OpenAI(
-    base_url=OPENROUTER_BASE_URL,
-    api_key=OPENROUTER_API_KEY,
-)
+# Built on first use; importing openai alone takes about a second on a cold start
+client = None
+http_client = None
+
+def get_client():
+    """
+    Get the OpenRouter client, creating it and its shared keep-alive
+    connection pool on first use
+    """
+    global client, http_client
+    if client is None:
+        import httpx
+        from openai import AsyncOpenAI
+
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=OPENROUTER_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENROUTER_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=OPENROUTER_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(OPENROUTER_TIMEOUT, connect=OPENROUTER_CONNECT_TIMEOUT),
+        )
+        client = AsyncOpenAI(
+            base_url=OPENROUTER_BASE_URL,
+            api_key=OPENROUTER_API_KEY,
+            http_client=http_client,
+            max_retries=0,  # Retries, backoff and failover are handled in core.upstream
+        )
+    return client
+
+# Sampling settings, also part of the response cache key
+COMPLETION_MAX_TOKENS = 1000  # Limit response length
+COMPLETION_TEMPERATURE = 0.7
+
+# Concurrent identical requests (same prompt, history and sampling settings) share one upstream call
+completion_flights = SingleFlight()
+stream_flights = StreamSingleFlight()
+register_collector("completion_flights", completion_flights.stats)
+register_collector("stream_flights", stream_flights.stats)
 
 # Fallback responses for when API is unavailable
 FALLBACK_RESPONSES = [
@@ -17,87 +60,204 @@ FALLBACK_RESPONSES = [
     "I'm temporarily unable to process your request due to usage limits. Please try again shortly.",
 ]
 
-# Mock responses for testing when API quota is exceeded
-MOCK_RESPONSES = {
-    "hello": "Hello! How can I help you today?",
-    "hi": "Hi there! What can I do for you?",
-    "how are you": "I'm doing well, thank you for asking! How are you?",
-    "what is your name": "I'm TSF Chat, your AI assistant. Nice to meet you!",
-    "help": "I'm here to help! You can ask me questions about various topics, and I'll do my best to assist you.",
-    "what can you do": "I can help with answering questions, providing information, having conversations, and more. What would you like to know?",
-    "test": "This is a test response! The chat system is working correctly.",
-    "thanks": "You're welcome! Is there anything else I can help you with?",
-    "bye": "Goodbye! Have a great day!",
-    "default": "I understand you're asking about '{query}'. Due to current API limitations, I can only provide basic responses right now. Please try again tomorrow for more detailed assistance, or contact support for increased access."
-}
+# Reply to messages no canned rule matches when the API quota is exceeded
+MOCK_DEFAULT_RESPONSE = "I understand you're asking about '{query}'. Due to current API limitations, I can only provide basic responses right now. Please try again tomorrow for more detailed assistance, or contact support for increased access."
 
 def get_mock_response(user_message: str) -> str:
     """
     Get a mock response based on the user's message
     """
-    import random
-    
-    message_lower = user_message.lower().strip()
-    
-    # Check for exact matches first
-    for key, response in MOCK_RESPONSES.items():
-        if key == "default":
-            continue
-        if key in message_lower:
-            return response
+    # Canned replies first, matched on whole words by the local responder
+    response = get_local_responder().fallback(user_message)
+    if response is not None:
+        return response
     
     # For longer messages, provide a contextual response
     if len(user_message.split()) > 5:
         return f"Thank you for your detailed message about '{user_message[:50]}...'. Due to current API limitations, I can only provide basic responses. Please try again tomorrow for a more comprehensive answer."
     
     # Default response with the user's query
-    return MOCK_RESPONSES["default"].format(query=user_message[:100])
+    return MOCK_DEFAULT_RESPONSE.format(query=user_message[:100])
+
+def get_extra_headers() -> dict:
+    """
+    Build the optional OpenRouter attribution headers
+    """
+    extra_headers = {}
+    if SITE_URL:
+        extra_headers["HTTP-Referer"] = SITE_URL
+    if SITE_NAME:
+        extra_headers["X-Title"] = SITE_NAME
+    return extra_headers
+
+def get_error_response(error: Exception, user_message: str) -> str:
+    """
+    Map an OpenRouter API error to a user-friendly response
+    """
+    error_str = str(error).lower()
+    status = status_of(error)
+    logging.error(f"OpenRouter API error: {str(error)}")
+    
+    # Handle specific error types with user-friendly messages
+    if status == 429 or "429" in error_str or "quota" in error_str or "rate limit" in error_str:
+        # When quota is exceeded, use mock responses to continue testing
+        return get_mock_response(user_message)
+    elif status == 400 or "400" in error_str or "invalid" in error_str:
+        return "I couldn't understand your request properly. Please try rephrasing your question."
+    elif isinstance(error, CircuitOpenError) or status in (502, 503, 504) or "503" in error_str or "unavailable" in error_str:
+        return "My AI service is temporarily unavailable. Please try again in a few minutes."
+    elif status == 408 or "timeout" in error_str or "timed out" in error_str:
+        return "The response took too long to generate. Please try with a shorter or simpler question."
+    else:
+        # Use mock response for unknown errors too
+        return get_mock_response(user_message)
+
+def build_messages(user_message: str, history: Optional[List[dict]] = None) -> list:
+    """
+    Build the prompt from the prior turns of the conversation and the new user message
+    """
+    messages = list(history) if history else []
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+def _record_tokens(messages: list, response: str, usage=None):
+    """
+    Count the tokens of a completion, from the reported usage when the
+    upstream sends it and estimated at about four characters a token otherwise
+    """
+    if usage is not None and usage.prompt_tokens is not None:
+        llm_tokens.inc(usage.prompt_tokens, direction="prompt", source="usage")
+        llm_tokens.inc(usage.completion_tokens or 0, direction="completion", source="usage")
+        return
+    prompt_chars = sum(len(message["content"]) for message in messages)
+    llm_tokens.inc(prompt_chars // 4, direction="prompt", source="estimate")
+    llm_tokens.inc(len(response) // 4, direction="completion", source="estimate")
 
-async def get_openrouter_response(user_message: str) -> str:
+async def _lookup_cache(user_message: str, history: Optional[List[dict]]):
+    """
+    Get the response cache, the request's cache key and any cached response
+    """
+    cache = get_response_cache()
+    if cache is None:
+        return None, None, None
+    cache_key = cache.key_for(user_message, history, OPENROUTER_MODEL, COMPLETION_TEMPERATURE, COMPLETION_MAX_TOKENS)
+    if cache_key is None:
+        return cache, None, None
+    return cache, cache_key, await cache.get(cache_key)
+
+def _flight_key(user_message: str, history: Optional[List[dict]], cache_key: Optional[str]) -> str:
+    return cache_key or make_key(user_message, history, OPENROUTER_MODEL, COMPLETION_TEMPERATURE, COMPLETION_MAX_TOKENS)
+
+async def get_openrouter_response(user_message: str, history: Optional[List[dict]] = None) -> str:
     """
     Get response from OpenRouter API using OpenAI client for the given user message
+    and the prior turns of its conversation
     """
+    cache, cache_key, cached = await _lookup_cache(user_message, history)
+    if cached is not None:
+        return cached
+
+    if not REQUEST_COALESCING_ENABLED:
+        return await _fetch_completion(user_message, history, cache, cache_key)
+    return await completion_flights.do(
+        _flight_key(user_message, history, cache_key),
+        lambda: _fetch_completion(user_message, history, cache, cache_key)
+    )
+
+async def _fetch_completion(user_message: str, history: Optional[List[dict]], cache, cache_key: Optional[str]) -> str:
     try:
         # Prepare extra headers if site info is available
-        extra_headers = {}
-        if SITE_URL:
-            extra_headers["HTTP-Referer"] = SITE_URL
-        if SITE_NAME:
-            extra_headers["X-Title"] = SITE_NAME
+        extra_headers = get_extra_headers()
         
-        # Create chat completion
-        completion = client.chat.completions.create(
+        # Create chat completion, retrying and failing over across models
+        messages = build_messages(user_message, history)
+        completion = await create_completion(
+            get_client(),
             extra_headers=extra_headers if extra_headers else None,
-            model=OPENROUTER_MODEL,
-            messages=[
-                {
-                    "role": "user",
-                    "content": user_message
-                }
-            ],
-            max_tokens=1000,  # Limit response length
-            temperature=0.7,
+            messages=messages,
+            max_tokens=COMPLETION_MAX_TOKENS,
+            temperature=COMPLETION_TEMPERATURE,
         )
         
         if completion.choices and completion.choices[0].message:
-            return completion.choices[0].message.content.strip()
+            response = completion.choices[0].message.content.strip()
+            _record_tokens(messages, response, getattr(completion, "usage", None))
+            # Only real completions are cached, never fallback or error text
+            if cache_key is not None and response:
+                await cache.set(cache_key, response)
+            return response
         else:
             return "I'm sorry, I couldn't generate a proper response. Please try rephrasing your question."
     
     except Exception as e:
-        error_str = str(e).lower()
-        logging.error(f"OpenRouter API error: {str(e)}")
-        
-        # Handle specific error types with user-friendly messages
-        if "429" in error_str or "quota" in error_str or "rate limit" in error_str:
-            # When quota is exceeded, use mock responses to continue testing
-            return get_mock_response(user_message)
-        elif "400" in error_str or "invalid" in error_str:
-            return "I couldn't understand your request properly. Please try rephrasing your question."
-        elif "503" in error_str or "unavailable" in error_str:
-            return "My AI service is temporarily unavailable. Please try again in a few minutes."
-        elif "timeout" in error_str:
-            return "The response took too long to generate. Please try with a shorter or simpler question."
-        else:
-            # Use mock response for unknown errors too
-            return get_mock_response(user_message)
+        return get_error_response(e, user_message)
+
+async def stream_openrouter_response(user_message: str, history: Optional[List[dict]] = None) -> AsyncIterator[str]:
+    """
+    Stream response deltas from OpenRouter API as they arrive.
+    Errors raised before the first delta are turned into a single fallback chunk.
+    A cached response is sent as one chunk; a request identical to one already
+    streaming joins it and receives the deltas produced so far first.
+    """
+    cache, cache_key, cached = await _lookup_cache(user_message, history)
+    if cached is not None:
+        yield cached
+        return
+
+    if not REQUEST_COALESCING_ENABLED:
+        chunks = _stream_completion(user_message, history, cache, cache_key)
+    else:
+        chunks = stream_flights.subscribe(
+            _flight_key(user_message, history, cache_key),
+            lambda: _stream_completion(user_message, history, cache, cache_key)
+        )
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        await chunks.aclose()
+
+async def _stream_completion(user_message: str, history: Optional[List[dict]], cache, cache_key: Optional[str]) -> AsyncIterator[str]:
+    received = False
+    parts = []
+    try:
+        extra_headers = get_extra_headers()
+        messages = build_messages(user_message, history)
+        deltas = stream_completion(
+            get_client(),
+            extra_headers=extra_headers if extra_headers else None,
+            messages=messages,
+            max_tokens=COMPLETION_MAX_TOKENS,
+            temperature=COMPLETION_TEMPERATURE,
+        )
+        try:
+            async for delta in deltas:
+                received = True
+                parts.append(delta)
+                yield delta
+        finally:
+            # Release the pooled connection even if the consumer went away
+            await deltas.aclose()
+            # Streams carry no usage, so their tokens are estimated, interrupted ones included
+            if received:
+                _record_tokens(messages, "".join(parts))
+    except Exception as e:
+        if received:
+            raise
+        yield get_error_response(e, user_message)
+        return
+
+    # Reached only when the stream completed; interrupted replies are not cached
+    response = "".join(parts).strip()
+    if cache_key is not None and response:
+        await cache.set(cache_key, response)
+
+async def close_openrouter_client():
+    """
+    Close the shared upstream connection pool, if it was ever opened
+    """
+    global client, http_client
+    if http_client is not None:
+        await http_client.aclose()
+    client = None
+    http_client = None
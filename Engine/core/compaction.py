@@ -0,0 +1,233 @@
+from datetime import datetime
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from config.config import (
+    COMPACTION_ENABLED, COMPACTION_TRIGGER_MESSAGES, COMPACTION_TRIGGER_TOKENS,
+    COMPACTION_KEEP_MESSAGES, COMPACTION_KEEP_TOKENS, COMPACTION_INPUT_TOKENS,
+    COMPACTION_SUMMARY_TOKENS, COMPACTION_DRAIN_TIMEOUT, CONTEXT_MAX_MESSAGES,
+)
+from core.context import count_tokens, forget_conversation, get_cached_context
+from core.database import AsyncSessionLocal
+from core.metrics import register_collector
+from core.write_behind import wait_for_writes
+from models.models import Conversation, ConversationSummary, Message
+from typing import List, Optional
+import asyncio
+import logging
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a conversation between a user and an AI assistant. "
+    "Merge the new messages into the existing summary. Keep facts, names, numbers, decisions, "
+    "the user's goals and preferences and any open questions; drop greetings and filler. "
+    "Reply with the updated summary only, as compact third-person prose."
+)
+
+def build_summary_prompt(previous: Optional[str], messages: List[tuple]) -> list:
+    """
+    Build the summarization prompt from the current summary and (role, content) messages, oldest first
+    """
+    transcript = "\n\n".join(f"{role.capitalize()}: {content}" for role, content in messages)
+    existing = previous if previous else "(none yet)"
+    return [
+        {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+        {"role": "user", "content": f"Existing summary:\n{existing}\n\nNew messages:\n{transcript}"},
+    ]
+
+async def summarize_messages(previous: Optional[str], messages: List[tuple]) -> str:
+    """
+    Fold messages into the previous summary with one completion.
+    Raises on upstream errors; unlike chat, a fallback text must never be stored.
+    """
+    from core.chat_service import get_client, get_extra_headers
+    from core.upstream import create_completion
+
+    extra_headers = get_extra_headers()
+    completion = await create_completion(
+        get_client(),
+        extra_headers=extra_headers if extra_headers else None,
+        messages=build_summary_prompt(previous, messages),
+        max_tokens=COMPACTION_SUMMARY_TOKENS,
+        temperature=0.2,
+    )
+    content = completion.choices[0].message.content if completion.choices and completion.choices[0].message else None
+    if not content or not content.strip():
+        raise ValueError("Empty summary")
+    return content.strip()
+
+class Compactor:
+    """
+    Rolls the older turns of long conversations into their stored summary.
+    Each run is a background task making one summarization call, at most one
+    run per conversation at a time in a worker; runs in different workers are
+    reconciled when the summary is written.
+    """
+    def __init__(self, summarize=summarize_messages, session_factory=AsyncSessionLocal):
+        self.summarize = summarize
+        self.session_factory = session_factory
+        self._tasks = {}  # conversation_id -> running task
+        self.runs = 0
+        self.folded = 0
+        self.conflicts = 0
+        self.errors = 0
+
+    def schedule(self, conversation_id: str):
+        """
+        Start a run for conversation_id unless one is already running
+        """
+        if conversation_id in self._tasks:
+            return
+        task = asyncio.ensure_future(self._run(conversation_id))
+        self._tasks[conversation_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(conversation_id, None))
+
+    async def _run(self, conversation_id: str):
+        try:
+            await self.compact(conversation_id)
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"Compaction of conversation {conversation_id} failed: {str(e)}")
+
+    async def compact(self, conversation_id: str) -> int:
+        """
+        Fold the oldest unsummarized messages, short of the newest ones kept
+        verbatim, into the summary. Returns the number of messages folded.
+        """
+        # Queued write-behind messages must be stored before they can be folded
+        await wait_for_writes(conversation_id)
+
+        # Read, summarize and write in separate steps so no connection is held during the completion
+        async with self.session_factory() as db:
+            summary = (await db.execute(
+                select(ConversationSummary).where(ConversationSummary.conversation_id == conversation_id)
+            )).scalars().first()
+            after = Message.conversation_id == conversation_id
+            if summary is not None:
+                after = and_(after, or_(
+                    Message.created_at > summary.through_created_at,
+                    and_(Message.created_at == summary.through_created_at, Message.id > summary.through_message_id)
+                ))
+            columns = (Message.id, Message.role, Message.content, Message.created_at)
+            newest = (await db.execute(
+                select(*columns).where(after).order_by(Message.created_at.desc(), Message.id.desc()).limit(COMPACTION_KEEP_MESSAGES)
+            )).all()
+            oldest = (await db.execute(
+                select(*columns).where(after).order_by(Message.created_at, Message.id).limit(CONTEXT_MAX_MESSAGES)
+            )).all()
+
+        # Keep the newest messages that fit in COMPACTION_KEEP_TOKENS
+        kept = set()
+        kept_tokens = 0
+        for row in newest:
+            kept_tokens += count_tokens(row.content)
+            if kept_tokens > COMPACTION_KEEP_TOKENS:
+                break
+            kept.add(row.id)
+
+        # Fold the oldest of the rest, up to COMPACTION_INPUT_TOKENS per run
+        fold = []
+        fold_tokens = 0
+        for row in oldest:
+            if row.id in kept:
+                break
+            fold_tokens += count_tokens(row.content)
+            if fold and fold_tokens > COMPACTION_INPUT_TOKENS:
+                break
+            fold.append(row)
+        if not fold:
+            return 0
+
+        self.runs += 1
+        previous = summary.content if summary is not None else None
+        content = await self.summarize(previous, [(row.role, row.content) for row in fold])
+
+        last = fold[-1]
+        values = {
+            "content": content,
+            "through_created_at": last.created_at,
+            "through_message_id": last.id,
+            "message_count": (summary.message_count if summary is not None else 0) + len(fold),
+            "updated_at": datetime.utcnow(),
+        }
+        async with self.session_factory() as db:
+            try:
+                if summary is None:
+                    if await db.get(Conversation, conversation_id) is None:
+                        return 0  # Deleted while it was being summarized
+                    db.add(ConversationSummary(conversation_id=conversation_id, **values))
+                    written = True
+                else:
+                    # Only replace the summary this run started from
+                    result = await db.execute(
+                        update(ConversationSummary).where(
+                            ConversationSummary.conversation_id == conversation_id,
+                            ConversationSummary.through_message_id == summary.through_message_id
+                        ).values(**values)
+                    )
+                    written = result.rowcount == 1
+                await db.commit()
+            except IntegrityError:
+                await db.rollback()
+                written = False
+        if not written:
+            # Another worker compacted this conversation first
+            self.conflicts += 1
+            return 0
+
+        self.folded += len(fold)
+        # Rebuilt from the new summary on the next turn
+        forget_conversation(conversation_id)
+        return len(fold)
+
+    async def close(self, timeout: float = COMPACTION_DRAIN_TIMEOUT):
+        """
+        Let running compactions finish, cancelling them after timeout
+        """
+        tasks = list(self._tasks.values())
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "running": len(self._tasks), "runs": self.runs, "folded": self.folded,
+            "conflicts": self.conflicts, "errors": self.errors,
+        }
+
+# Built on first use when COMPACTION_ENABLED is on
+_compactor = None
+
+def get_compactor() -> Optional[Compactor]:
+    """
+    Get the compactor, or None when compaction is disabled
+    """
+    global _compactor
+    if _compactor is None and COMPACTION_ENABLED:
+        _compactor = Compactor()
+    return _compactor
+
+def maybe_compact(conversation_id: str):
+    """
+    Start a compaction run once a conversation's unsummarized messages
+    pass either trigger threshold. Call after a turn is recorded.
+    """
+    compactor = get_compactor()
+    if compactor is None:
+        return
+    context = get_cached_context(conversation_id)
+    if context is None:
+        return
+    if context.unsummarized >= COMPACTION_TRIGGER_MESSAGES or context.unsummarized_tokens >= COMPACTION_TRIGGER_TOKENS:
+        compactor.schedule(conversation_id)
+
+async def close_compactor():
+    """
+    Finish running compactions, if a compactor was created
+    """
+    global _compactor
+    if _compactor is not None:
+        await _compactor.close()
+    _compactor = None
+
+register_collector("compaction", lambda: _compactor.stats() if _compactor is not None else None)
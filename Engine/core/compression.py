@@ -0,0 +1,192 @@
+from collections import Counter
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.types import Text, TypeDecorator
+from config.config import (
+    MESSAGE_COMPRESSION_ENABLED, MESSAGE_COMPRESSION_MIN_BYTES, MESSAGE_COMPRESSION_LEVEL,
+    MESSAGE_COMPRESSION_DICTIONARIES,
+)
+from core.metrics import register_collector
+from typing import Iterable, List, Optional, Union
+import re
+import zlib
+
+# Stored values are either plain text or a zlib stream in a BLOB; SQLite
+# keeps a BLOB as is in a TEXT column, so the storage class tells them apart
+# and rows written before compression, or below the threshold, need no
+# marker. A stream compressed with a preset dictionary names it in its
+# header (FDICT flag and the dictionary's Adler-32), so rows compressed with
+# a retired dictionary stay readable as long as its file is still listed.
+FDICT = 0x20
+
+class MessageCodec:
+    """
+    Compress message content of at least min_bytes, with an optional preset
+    dictionary, and read back any stored form
+    """
+    def __init__(self, enabled: bool = True, min_bytes: int = 512, level: int = 6, dictionaries: Optional[List[bytes]] = None):
+        self.enabled = enabled
+        self.min_bytes = min_bytes
+        self.level = level
+        dictionaries = dictionaries or []
+        # New rows use the first dictionary; every listed one can be read
+        self.dictionary = dictionaries[0] if dictionaries else None
+        self.dictionaries = {zlib.adler32(d): d for d in dictionaries}
+        self.stats = {"compressed": 0, "plain": 0, "bytes_in": 0, "bytes_out": 0, "decompressed": 0}
+
+    def encode(self, text: str) -> Union[str, bytes]:
+        """
+        The value to store for text: a zlib stream if compression is on, the
+        text is long enough and the stream is smaller, else the text itself
+        """
+        if not self.enabled:
+            return text
+        data = text.encode()
+        if len(data) < self.min_bytes:
+            self.stats["plain"] += 1
+            return text
+        if self.dictionary is not None:
+            compressor = zlib.compressobj(self.level, zdict=self.dictionary)
+        else:
+            compressor = zlib.compressobj(self.level)
+        packed = compressor.compress(data) + compressor.flush()
+        if len(packed) >= len(data):
+            self.stats["plain"] += 1
+            return text
+        self.stats["compressed"] += 1
+        self.stats["bytes_in"] += len(data)
+        self.stats["bytes_out"] += len(packed)
+        return packed
+
+    def decode(self, value: Union[str, bytes, None]) -> Optional[str]:
+        """
+        The text of a stored value
+        """
+        if value is None or isinstance(value, str):
+            return value
+        value = bytes(value)
+        if value[1] & FDICT:
+            dictionary_id = int.from_bytes(value[2:6], "big")
+            dictionary = self.dictionaries.get(dictionary_id)
+            if dictionary is None:
+                raise LookupError(
+                    f"Message compressed with dictionary {dictionary_id:08x}, which is not in MESSAGE_COMPRESSION_DICTIONARIES"
+                )
+            decompressor = zlib.decompressobj(zdict=dictionary)
+        else:
+            decompressor = zlib.decompressobj()
+        self.stats["decompressed"] += 1
+        return (decompressor.decompress(value) + decompressor.flush()).decode()
+
+_codec = None
+
+def get_codec() -> MessageCodec:
+    """
+    The codec configured by the MESSAGE_COMPRESSION_* settings, built on
+    first use so the dictionary files are read once
+    """
+    global _codec
+    if _codec is None:
+        dictionaries = []
+        for path in filter(None, (p.strip() for p in MESSAGE_COMPRESSION_DICTIONARIES.split(","))):
+            with open(path, "rb") as source:
+                dictionaries.append(source.read())
+        _codec = MessageCodec(
+            MESSAGE_COMPRESSION_ENABLED, MESSAGE_COMPRESSION_MIN_BYTES, MESSAGE_COMPRESSION_LEVEL, dictionaries
+        )
+    return _codec
+
+def _codec_stats() -> Optional[dict]:
+    if _codec is None:
+        return None
+    stats = dict(_codec.stats)
+    stats["ratio"] = round(stats["bytes_out"] / stats["bytes_in"], 3) if stats["bytes_in"] else 0.0
+    return stats
+
+register_collector("message_compression", _codec_stats)
+
+class CompressedText(TypeDecorator):
+    """
+    Text that is stored compressed on SQLite and handled as str in Python,
+    so queries, routes and schemas see plain text. Other databases store it
+    as is: MySQL's FULLTEXT index has to read the column itself, so there
+    the table is compressed by InnoDB instead.
+    """
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name != "sqlite":
+            return value
+        return get_codec().encode(value)
+
+    def process_result_value(self, value, dialect):
+        return get_codec().decode(value)
+
+class message_text(FunctionElement):
+    """
+    The plain text of a CompressedText column inside SQL, e.g. to cut a
+    preview with substr. Plain on databases that do not compress.
+    """
+    type = Text()
+    name = "message_text"
+    inherit_cache = True
+
+@compiles(message_text)
+def _compile_message_text(element, compiler, **kw):
+    return compiler.process(element.clauses, **kw)
+
+@compiles(message_text, "sqlite")
+def _compile_sqlite_message_text(element, compiler, **kw):
+    return f"message_text({compiler.process(element.clauses, **kw)})"
+
+def _sqlite_message_text(value):
+    return get_codec().decode(value)
+
+def register_sqlite_functions(dbapi_connection, connection_record=None):
+    """
+    Make message_text() callable on a SQLite connection. The full-text
+    triggers call it, so every connection that writes messages needs it,
+    including plain sqlite3 ones. Fits the engine's "connect" event.
+    """
+    dbapi_connection.create_function("message_text", 1, _sqlite_message_text, deterministic=True)
+
+_words = re.compile(r"\S+\s*")
+
+def train_dictionary(samples: Iterable[str], size: int = 32 * 1024, max_words: int = 6) -> bytes:
+    """
+    Build a preset dictionary from sample messages: the word sequences that
+    recur across the most samples, weighted by length, packed up to size
+    bytes. zlib reaches back at most 32KB, and codes nearer matches more
+    cheaply, so the most valuable strings go last.
+    """
+    counts = Counter()
+    for number, sample in enumerate(samples, 1):
+        words = _words.findall(sample)
+        seen = set()
+        for n in range(2, max_words + 1):
+            for start in range(len(words) - n + 1):
+                seen.add("".join(words[start:start + n]))
+        counts.update(seen)
+        if number % 200 == 0:
+            # Keep memory bounded; a sequence seen once so far rarely ends up chosen
+            for sequence in [s for s, c in counts.items() if c == 1]:
+                del counts[sequence]
+
+    # Bytes saved if every further sample references the sequence once
+    scored = sorted(
+        ((count - 1) * len(sequence.encode()), sequence) for sequence, count in counts.items() if count > 1
+    )
+    chosen = []
+    joined = ""
+    total = 0
+    for score, sequence in reversed(scored):
+        if total >= size:
+            break
+        # Inside a sequence already chosen, it adds nothing
+        if sequence in joined:
+            continue
+        chosen.append(sequence)
+        joined += "\0" + sequence
+        total += len(sequence.encode())
+    return "".join(reversed(chosen)).encode()[-size:]
@@ -0,0 +1,75 @@
+from sqlalchemy import Text, select, type_coerce, update
+from config.config import MESSAGE_COMPRESSION_BATCH_SIZE
+from core.compression import get_codec
+from core.database import AsyncSessionLocal, get_engine
+from core.search import create_search_schema
+from models.models import Message
+from typing import List
+import logging
+
+logger = logging.getLogger(__name__)
+
+# The stored value as is, compressed or not, bypassing CompressedText
+_stored_content = type_coerce(Message.content, Text)
+
+async def compress_messages(batch_size: int = MESSAGE_COMPRESSION_BATCH_SIZE) -> dict:
+    """
+    Rewrite every message whose stored form differs from what the current
+    MESSAGE_COMPRESSION_* settings would store: long plain rows are
+    compressed, rows compressed with an older dictionary are recompressed,
+    and with compression off everything is written back as plain text.
+    One transaction per batch, walking the primary key, so an interrupted
+    run keeps its progress and can simply be started again.
+
+    On MySQL the FULLTEXT index needs the column in plain text, so the
+    table is rebuilt with InnoDB page compression instead.
+    """
+    engine = get_engine()
+    if engine.dialect.name == "mysql":
+        logger.info("Rebuilding messages with ROW_FORMAT=COMPRESSED; the table is locked for writes meanwhile")
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql("ALTER TABLE messages ROW_FORMAT=COMPRESSED")
+        return {"scanned": 0, "rewritten": 0}
+
+    # The full-text triggers must read through message_text() before any row is compressed
+    async with engine.begin() as conn:
+        await conn.run_sync(create_search_schema)
+
+    codec = get_codec()
+    scanned = rewritten = 0
+    last = None
+    async with AsyncSessionLocal() as db:
+        while True:
+            query = select(Message.id, _stored_content).order_by(Message.id).limit(batch_size)
+            if last is not None:
+                query = query.where(Message.id > last)
+            rows = (await db.execute(query)).all()
+            if not rows:
+                return {"scanned": scanned, "rewritten": rewritten}
+
+            changed = []
+            for message_id, stored in rows:
+                content = codec.decode(stored)
+                if codec.encode(content) != stored:
+                    # Encoded again by CompressedText on the way in
+                    changed.append({"id": message_id, "content": content})
+            if changed:
+                await db.execute(update(Message), changed)
+            await db.commit()
+
+            scanned += len(rows)
+            rewritten += len(changed)
+            last = rows[-1][0]
+            logger.info(f"Scanned {scanned} messages, rewrote {rewritten}")
+
+async def sample_messages(limit: int, min_bytes: int) -> List[str]:
+    """
+    The newest assistant messages of at least min_bytes, up to limit of
+    them, to train a compression dictionary on
+    """
+    async with AsyncSessionLocal() as db:
+        contents = (await db.execute(
+            select(Message.content).where(Message.role == "assistant")
+            .order_by(Message.created_at.desc()).limit(limit * 4)
+        )).scalars()
+        return [content for content in contents if len(content.encode()) >= min_bytes][:limit]
@@ -0,0 +1,222 @@
+from collections import OrderedDict, deque
+from datetime import timedelta
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from config.config import CONTEXT_TOKEN_BUDGET, CONTEXT_MAX_MESSAGES, CONTEXT_CACHE_SIZE
+from core.metrics import register_collector
+from models.models import Conversation, ConversationSummary, Message
+from typing import Optional
+import logging
+import threading
+
+# Tokens the chat format adds around every message
+MESSAGE_TOKEN_OVERHEAD = 4
+
+# Introduces a stored summary of older turns at the top of the prompt
+SUMMARY_PREFIX = "Summary of the earlier part of this conversation:\n"
+
+_encoding = None
+_encoding_thread = None
+_encoding_lock = threading.Lock()
+
+def _load_encoding():
+    global _encoding
+    try:
+        import tiktoken
+        _encoding = tiktoken.get_encoding("o200k_base")
+    except Exception as e:  # tiktoken missing or its BPE file unavailable
+        logging.warning(f"tiktoken unavailable, using approximate token counts: {str(e)}")
+
+def start_loading_encoding():
+    """
+    Load the tokenizer in a background thread. Unless TIKTOKEN_CACHE_DIR
+    already holds it, that downloads and parses a BPE file of several MB,
+    which must not hold up the event loop; until it is ready, token counts
+    are estimated.
+    """
+    global _encoding_thread
+    with _encoding_lock:
+        if _encoding_thread is None:
+            _encoding_thread = threading.Thread(target=_load_encoding, name="tiktoken-load", daemon=True)
+            _encoding_thread.start()
+
+def wait_for_encoding(timeout: Optional[float] = None):
+    """Block until the tokenizer is loaded or given up on; for scripts that want exact counts"""
+    start_loading_encoding()
+    _encoding_thread.join(timeout)
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of a message body, including per-message overhead
+    """
+    encoding = _encoding
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=())) + MESSAGE_TOKEN_OVERHEAD
+    if _encoding_thread is None:
+        start_loading_encoding()
+    # Roughly four characters per token for English text
+    return len(text) // 4 + 1 + MESSAGE_TOKEN_OVERHEAD
+
+def _version(updated_at) -> object:
+    # MySQL DATETIME rounds away microseconds, so compare at second precision
+    if updated_at is None:
+        return None
+    return (updated_at + timedelta(microseconds=500000)).replace(microsecond=0)
+
+class ConversationContext:
+    """
+    Sliding window of the most recent messages of a conversation, after the
+    stored summary of its older turns if it has one.
+    Each message is tokenized once; the running total is trimmed from the oldest end.
+    """
+    def __init__(self, budget: int = CONTEXT_TOKEN_BUDGET):
+        self.budget = budget
+        self.messages = deque()  # (role, content, tokens), oldest first
+        self.total_tokens = 0
+        self.version = None
+        self.summary = None  # (prompt text, tokens)
+        self.summary_through = None  # Newest message id folded into the summary
+        # Messages after the summary, including those trimmed from the window;
+        # the token count is a lower bound once the window has overflowed
+        self.unsummarized = 0
+        self.unsummarized_tokens = 0
+
+    def set_summary(self, content: str, through_message_id: str):
+        text = SUMMARY_PREFIX + content
+        self.summary = (text, count_tokens(text))
+        self.summary_through = through_message_id
+
+    def append(self, role: str, content: str, tokens: int = None):
+        if tokens is None:
+            tokens = count_tokens(content)
+        self.messages.append((role, content, tokens))
+        self.total_tokens += tokens
+        self.unsummarized += 1
+        self.unsummarized_tokens += tokens
+        self.trim(self.budget)
+
+    def prepend(self, role: str, content: str, tokens: int) -> bool:
+        """Add an older message if it still fits in the budget"""
+        if self.total_tokens + tokens > self.budget:
+            return False
+        self.messages.appendleft((role, content, tokens))
+        self.total_tokens += tokens
+        return True
+
+    def trim(self, budget: int):
+        while self.messages and self.total_tokens > budget:
+            _, _, tokens = self.messages.popleft()
+            self.total_tokens -= tokens
+
+    def to_prompt(self, reserved_tokens: int = 0) -> list:
+        """
+        Return the summary and the newest messages that fit next to
+        reserved_tokens, in chronological order and in chat completion format
+        """
+        remaining = self.budget - reserved_tokens
+        summary = []
+        if self.summary is not None and self.summary[1] <= remaining:
+            remaining -= self.summary[1]
+            summary = [{"role": "system", "content": self.summary[0]}]
+        selected = []
+        for role, content, tokens in reversed(self.messages):
+            if tokens > remaining:
+                break
+            remaining -= tokens
+            selected.append({"role": role, "content": content})
+        selected.reverse()
+        return summary + selected
+
+# LRU of conversation_id -> ConversationContext
+_contexts = OrderedDict()
+_lock = threading.Lock()
+_counts = {"hits": 0, "misses": 0}
+
+async def _load_context(db: AsyncSession, conversation_id: str) -> ConversationContext:
+    """
+    Build a context from the stored summary and the newest messages after it,
+    stopping at the token budget
+    """
+    context = ConversationContext()
+    query = select(Message.role, Message.content).where(Message.conversation_id == conversation_id)
+    summary = (await db.execute(
+        select(
+            ConversationSummary.content, ConversationSummary.through_created_at, ConversationSummary.through_message_id
+        ).where(ConversationSummary.conversation_id == conversation_id)
+    )).first()
+    if summary is not None:
+        content, through_created_at, through_message_id = summary
+        context.set_summary(content, through_message_id)
+        query = query.where(or_(
+            Message.created_at > through_created_at,
+            and_(Message.created_at == through_created_at, Message.id > through_message_id)
+        ))
+
+    rows = (await db.execute(
+        query.order_by(Message.created_at.desc(), Message.id.desc()).limit(CONTEXT_MAX_MESSAGES)
+    )).all()
+    context.unsummarized = len(rows)
+    for role, content in rows:
+        tokens = count_tokens(content)
+        context.unsummarized_tokens += tokens
+        if not context.prepend(role, content, tokens):
+            break
+    return context
+
+async def get_conversation_context(db: AsyncSession, conversation: Conversation) -> ConversationContext:
+    """
+    Get the cached context for a conversation, reloading it when another
+    worker has written to the conversation since it was cached
+    """
+    version = _version(conversation.updated_at)
+    with _lock:
+        context = _contexts.get(conversation.id)
+        if context is not None and context.version == version:
+            _contexts.move_to_end(conversation.id)
+            _counts["hits"] += 1
+            return context
+        _counts["misses"] += 1
+
+    context = await _load_context(db, conversation.id)
+    context.version = version
+    with _lock:
+        _contexts[conversation.id] = context
+        _contexts.move_to_end(conversation.id)
+        while len(_contexts) > CONTEXT_CACHE_SIZE:
+            _contexts.popitem(last=False)
+    return context
+
+async def get_prompt_history(db: AsyncSession, conversation: Conversation, user_message: str) -> list:
+    """
+    Get the prior turns of a conversation that fit the token budget next to user_message
+    """
+    context = await get_conversation_context(db, conversation)
+    return context.to_prompt(count_tokens(user_message))
+
+def record_turn(conversation_id: str, user_message: str, ai_response: str, updated_at):
+    """
+    Append a completed turn to the cached context, if one is cached
+    """
+    with _lock:
+        context = _contexts.get(conversation_id)
+        if context is None:
+            return
+        context.append("user", user_message)
+        context.append("assistant", ai_response)
+        context.version = _version(updated_at)
+
+def get_cached_context(conversation_id: str) -> Optional[ConversationContext]:
+    """
+    Get the cached context of a conversation without loading it
+    """
+    with _lock:
+        return _contexts.get(conversation_id)
+
+def forget_conversation(conversation_id: str):
+    """
+    Drop the cached context of a deleted or compacted conversation
+    """
+    with _lock:
+        _contexts.pop(conversation_id, None)
+
+register_collector("context_cache", lambda: {**_counts, "size": len(_contexts)})
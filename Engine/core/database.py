@@ -1,7 +1,13 @@
-from sqlalchemy import create_engine, event, text
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from config.config import DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE, DB_POOL_TIMEOUT, METRICS_ENABLED
+from core.compression import register_sqlite_functions
+from core.metrics import db_pool_wait, instrument_engine, register_collector
 import os
+import ssl
+import time
 from dotenv import load_dotenv
 import logging
 
@@ -13,41 +19,120 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-# Use pymysql instead of mysqlclient
-if DATABASE_URL and DATABASE_URL.startswith('mysql://'):
-    DATABASE_URL = DATABASE_URL.replace('mysql://', 'mysql+pymysql://')
-
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=300,
-    pool_size=5,
-    max_overflow=2,
-    connect_args={
-        "ssl": {
-            "ssl_verify_identity": False,
-            "ssl_verify_cert": False
-        }
-    }
-)
-
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Use the asyncio drivers: aiomysql for MySQL, aiosqlite for local SQLite
+if DATABASE_URL and DATABASE_URL.startswith(('mysql://', 'mysql+pymysql://')):
+    DATABASE_URL = 'mysql+aiomysql://' + DATABASE_URL.split('://', 1)[1]
+elif DATABASE_URL and DATABASE_URL.startswith('sqlite://'):
+    DATABASE_URL = 'sqlite+aiosqlite://' + DATABASE_URL.split('://', 1)[1]
+
+_engine = None
+_session_factory = None
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that records how long each checkout waits for a connection
+    """
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_wait.observe(time.perf_counter() - started)
+
+def get_engine():
+    """
+    Build the engine on first use, so importing the app opens no
+    connections and loads no database driver
+    """
+    global _engine
+    if _engine is not None:
+        return _engine
+
+    if DATABASE_URL and DATABASE_URL.startswith('sqlite'):
+        # Local runs and benchmarks; wait on SQLite's database-level write lock instead of failing
+        _engine = create_async_engine(DATABASE_URL, connect_args={"timeout": 30})
+        # The full-text triggers decompress message content through message_text()
+        event.listen(_engine.sync_engine, "connect", register_sqlite_functions)
+    else:
+        # TLS without certificate or hostname verification, as with the previous pymysql setup
+        ssl_context = ssl.create_default_context()
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+
+        _engine = create_async_engine(
+            DATABASE_URL,
+            pool_pre_ping=True,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            poolclass=TimedQueuePool if METRICS_ENABLED else AsyncAdaptedQueuePool,
+            connect_args={"ssl": ssl_context}
+        )
+    if METRICS_ENABLED:
+        instrument_engine(_engine.sync_engine)
+    return _engine
+
+def _pool_stats() -> dict:
+    pool = _engine.pool if _engine is not None else None
+    if not isinstance(pool, AsyncAdaptedQueuePool):
+        return None
+    return {"size": pool.size(), "checked_out": pool.checkedout(), "overflow": max(pool.overflow(), 0)}
+
+register_collector("db_pool", _pool_stats)
+
+def AsyncSessionLocal() -> AsyncSession:
+    """
+    Open a new session.
+    expire_on_commit=False keeps loaded attributes usable after commit
+    without an implicit (and, under asyncio, illegal) lazy refresh.
+    """
+    global _session_factory
+    if _session_factory is None:
+        _session_factory = async_sessionmaker(get_engine(), autoflush=False, expire_on_commit=False)
+    return _session_factory()
+
+async def dispose_engine():
+    """
+    Close pooled connections, if the engine was ever built
+    """
+    global _engine, _session_factory
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = None
+        _session_factory = None
+
 Base = declarative_base()
 
-def init_db():
+async def init_db():
+    """
+    Create missing tables and indexes and check the connection.
+    Run once per deployment through `python manage.py init-db`,
+    not on application startup.
+    """
+    engine = get_engine()
     try:
         # Create all tables
-        Base.metadata.create_all(bind=engine)
+        async with engine.begin() as conn:
+            # Tables from before binary ids must be converted, not extended
+            from core.id_migration import needs_id_migration
+            if await conn.run_sync(needs_id_migration):
+                raise RuntimeError("Ids are still stored as strings; run `python manage.py migrate-ids` first")
+            await conn.run_sync(Base.metadata.create_all)
+            # create_all skips existing tables, so add indexes introduced since they were created
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    await conn.run_sync(index.create, checkfirst=True)
+            # Full-text search tables, kept in step with messages by triggers (SQLite only)
+            from core.search import create_search_schema
+            await conn.run_sync(create_search_schema)
         logger.info("Database tables created successfully")
-        
+
         # Test connection
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
             logger.info("Database connection test successful")
-            
+
     except Exception as e:
         logger.error(f"Database initialization error: {str(e)}")
         raise
-
-# Call init_db when the application starts
-init_db()
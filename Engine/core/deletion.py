@@ -0,0 +1,56 @@
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.context import forget_conversation
+from core.write_behind import wait_for_writes
+from models.models import Conversation, ConversationArchive, ConversationSummary, Message
+from typing import List
+
+async def delete_rows(db: AsyncSession, conversation_ids: List[str]):
+    """
+    Delete conversations with their messages and summaries, one set-based
+    statement per table, without loading any rows. The child deletes are
+    explicit because SQLite does not enforce foreign keys and databases
+    created before they cascaded do not either. Does not commit.
+    """
+    if not conversation_ids:
+        return
+    await db.execute(
+        delete(Message).where(Message.conversation_id.in_(conversation_ids)).execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        delete(ConversationSummary).where(ConversationSummary.conversation_id.in_(conversation_ids))
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        delete(Conversation).where(Conversation.id.in_(conversation_ids)).execution_options(synchronize_session=False)
+    )
+
+async def delete_conversations(db: AsyncSession, user_id: str, conversation_ids: List[str]) -> int:
+    """
+    Delete those of the conversations, live or archived, that belong to the
+    user, in one transaction. Ids of other users' conversations and unknown
+    ids are skipped. Returns the number deleted.
+    """
+    conversation_ids = list(dict.fromkeys(conversation_ids))
+    if not conversation_ids:
+        return 0
+    # Queued write-behind inserts must land first, or they would outlive the delete
+    await wait_for_writes(conversation_ids[0] if len(conversation_ids) == 1 else None)
+
+    live = (await db.execute(select(Conversation.id).where(
+        Conversation.user_id == user_id,
+        Conversation.id.in_(conversation_ids)
+    ))).scalars().all()
+    archived = (await db.execute(select(ConversationArchive.conversation_id).where(
+        ConversationArchive.user_id == user_id,
+        ConversationArchive.conversation_id.in_(conversation_ids)
+    ))).scalars().all()
+
+    await delete_rows(db, live)
+    if archived:
+        await db.execute(delete(ConversationArchive).where(ConversationArchive.conversation_id.in_(archived)))
+    await db.commit()
+
+    for conversation_id in live:
+        forget_conversation(conversation_id)
+    return len(live) + len(archived)
@@ -0,0 +1,21 @@
+from config.config import LOG_SAMPLE_RATE
+from typing import Optional
+import json
+import logging
+import random
+
+logger = logging.getLogger("tsf.events")
+
+def log_event(event: str, level: int = logging.INFO, sample_rate: Optional[float] = None, **fields):
+    """
+    Log an event as one JSON line.
+    Info-level events are sampled at LOG_SAMPLE_RATE so per-request logging
+    stays cheap under load; warnings and errors are always logged.
+    """
+    if level < logging.WARNING:
+        rate = LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return
+    if not logger.isEnabledFor(level):
+        return
+    logger.log(level, json.dumps({"event": event, **fields}, default=str))
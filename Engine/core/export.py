@@ -0,0 +1,281 @@
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from config.config import EXPORT_BATCH_SIZE, IMPORT_BATCH_SIZE, IMPORT_MAX_LINE_BYTES
+from core.database import AsyncSessionLocal
+from core.deletion import delete_rows
+from core.ids import new_id, normalize_id
+from core.write_behind import wait_for_writes
+from models.models import Conversation, ConversationArchive, Message
+from typing import AsyncIterator, List, Optional
+import anyio
+import json
+import zlib
+
+# One JSON object per line: an "export" header, then each conversation
+# followed by its messages, oldest first
+EXPORT_VERSION = 1
+ROLES = ("user", "assistant")
+TITLE_LENGTH = 200
+
+# Output is sent in chunks of about this many bytes
+CHUNK_SIZE = 64 * 1024
+GZIP_MAGIC = b"\x1f\x8b"
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def record_line(record: dict) -> bytes:
+    """
+    Encode one record as an NDJSON line
+    """
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=_encode).encode() + b"\n"
+
+async def export_user(user_id: str) -> AsyncIterator[bytes]:
+    """
+    Stream every conversation and message of a user as NDJSON chunks.
+    Conversations and messages are read through server-side cursors on two
+    connections, so memory stays flat however large the account is.
+    Archived conversations follow the live ones.
+    """
+    await wait_for_writes()
+    buffer = bytearray(record_line({"type": "export", "version": EXPORT_VERSION, "user_id": user_id, "exported_at": datetime.utcnow()}))
+
+    async with AsyncSessionLocal() as conversations_db, AsyncSessionLocal() as messages_db:
+        conversations = await conversations_db.stream(
+            select(Conversation.id, Conversation.title, Conversation.created_at, Conversation.updated_at)
+            .where(Conversation.user_id == user_id)
+            .order_by(Conversation.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        async for conversation_id, title, created_at, updated_at in conversations:
+            buffer += record_line({
+                "type": "conversation", "id": conversation_id, "title": title,
+                "created_at": created_at, "updated_at": updated_at,
+            })
+            # Served in order by the (conversation_id, created_at) index, no sort
+            messages = await messages_db.stream(
+                select(Message.id, Message.role, Message.content, Message.created_at)
+                .where(Message.conversation_id == conversation_id)
+                .order_by(Message.created_at, Message.id)
+                .execution_options(yield_per=EXPORT_BATCH_SIZE)
+            )
+            async for message_id, role, content, message_created_at in messages:
+                buffer += record_line({
+                    "type": "message", "id": message_id, "conversation_id": conversation_id,
+                    "role": role, "content": content, "created_at": message_created_at,
+                })
+                if len(buffer) >= CHUNK_SIZE:
+                    yield bytes(buffer)
+                    buffer.clear()
+            if len(buffer) >= CHUNK_SIZE:
+                yield bytes(buffer)
+                buffer.clear()
+
+        # Archives already hold their messages as export lines; each blob is
+        # loaded on its own and inflated in bounded steps
+        archives = await conversations_db.stream(
+            select(ConversationArchive.conversation_id, ConversationArchive.title,
+                   ConversationArchive.created_at, ConversationArchive.updated_at)
+            .where(ConversationArchive.user_id == user_id)
+            .order_by(ConversationArchive.conversation_id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        async for conversation_id, title, created_at, updated_at in archives:
+            buffer += record_line({
+                "type": "conversation", "id": conversation_id, "title": title,
+                "created_at": created_at, "updated_at": updated_at,
+            })
+            content = (await messages_db.execute(
+                select(ConversationArchive.content).where(ConversationArchive.conversation_id == conversation_id)
+            )).scalar_one_or_none()
+            for data in inflate(zlib.decompressobj(), content or b""):
+                buffer += data
+                if len(buffer) >= CHUNK_SIZE:
+                    yield bytes(buffer)
+                    buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Gzip a stream of chunks; compression runs on a worker thread so it does
+    not hold up the event loop
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        data = await anyio.to_thread.run_sync(compressor.compress, chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def inflate(decompressor, data: bytes):
+    # Bounded output per step, so a small compressed body cannot expand all at once
+    while data:
+        out = decompressor.decompress(data, CHUNK_SIZE)
+        if out:
+            yield out
+        data = decompressor.unconsumed_tail
+
+async def _decompressed(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Pass chunks through, gunzipping them when the stream starts with the gzip magic bytes
+    """
+    iterator = chunks.__aiter__()
+    head = b""
+    async for chunk in iterator:
+        head += chunk
+        if len(head) >= len(GZIP_MAGIC):
+            break
+    if not head.startswith(GZIP_MAGIC):
+        if head:
+            yield head
+        async for chunk in iterator:
+            yield chunk
+        return
+
+    decompressor = zlib.decompressobj(31)
+    try:
+        for data in inflate(decompressor, head):
+            yield data
+        async for chunk in iterator:
+            for data in inflate(decompressor, chunk):
+                yield data
+    except zlib.error:
+        raise HTTPException(status_code=400, detail="Invalid gzip data")
+    if not decompressor.eof:
+        raise HTTPException(status_code=400, detail="Truncated gzip data")
+
+async def _records(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple]:
+    """
+    Parse NDJSON chunks into (line number, object) pairs, skipping blank lines
+    """
+    number = 0
+    pending = b""
+    async for chunk in _decompressed(chunks):
+        *lines, pending = (pending + chunk).split(b"\n")
+        if len(pending) > IMPORT_MAX_LINE_BYTES:
+            raise _invalid(number + len(lines) + 1, "line too long")
+        for line in lines:
+            number += 1
+            if line.strip():
+                yield number, _parse(number, line)
+    if pending.strip():
+        yield number + 1, _parse(number + 1, pending)
+
+def _parse(number: int, line: bytes) -> dict:
+    if len(line) > IMPORT_MAX_LINE_BYTES:
+        raise _invalid(number, "line too long")
+    try:
+        record = json.loads(line)
+    except ValueError:
+        raise _invalid(number, "not valid JSON")
+    if not isinstance(record, dict):
+        raise _invalid(number, "expected a JSON object")
+    return record
+
+def _invalid(number: int, reason: str) -> HTTPException:
+    return HTTPException(status_code=400, detail=f"Import line {number}: {reason}")
+
+def _timestamp(number: int, value, default: Optional[datetime] = None) -> datetime:
+    if value is None and default is not None:
+        return default
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise _invalid(number, f"invalid timestamp {value!r}")
+
+def _text(number: int, record: dict, field: str) -> str:
+    value = record.get(field)
+    if not isinstance(value, str):
+        raise _invalid(number, f"{field} must be a string")
+    return value
+
+def _source_id(number: int, record: dict, field: str) -> str:
+    """
+    An id in the file, in canonical form, to match messages to their conversation
+    """
+    value = normalize_id(_text(number, record, field))
+    if value is None:
+        raise _invalid(number, f"{field} must be a UUID")
+    return value
+
+async def _flush(db: AsyncSession, conversations: List[dict], messages: List[dict]):
+    if conversations:
+        await db.execute(insert(Conversation), conversations)
+    if messages:
+        await db.execute(insert(Message), messages)
+    await db.commit()
+    conversations.clear()
+    messages.clear()
+
+async def _discard(db: AsyncSession, conversation_ids: List[str]):
+    """
+    Delete conversations written by an import that then failed
+    """
+    for start in range(0, len(conversation_ids), IMPORT_BATCH_SIZE):
+        batch = conversation_ids[start:start + IMPORT_BATCH_SIZE]
+        await delete_rows(db, batch)
+        await db.commit()
+
+async def import_user(db: AsyncSession, user_id: str, chunks: AsyncIterator[bytes]) -> dict:
+    """
+    Import NDJSON in the export format, plain or gzipped, into a user's account.
+    Every conversation and message gets a new id, so an export can be imported
+    next to the conversations it came from. Rows are inserted in batches of
+    IMPORT_BATCH_SIZE, each in its own short transaction; if the import fails
+    part way, the conversations it already wrote are deleted again.
+    """
+    await wait_for_writes()
+    new_ids = {}  # conversation id in the file -> id in this database
+    conversations, messages = [], []
+    counts = {"conversations": 0, "messages": 0}
+    try:
+        async for number, record in _records(chunks):
+            kind = record.get("type")
+            if kind == "export":
+                if record.get("version") != EXPORT_VERSION:
+                    raise _invalid(number, f"unsupported export version {record.get('version')!r}")
+                continue
+            if kind == "conversation":
+                source_id = _source_id(number, record, "id")
+                if source_id in new_ids:
+                    raise _invalid(number, "duplicate conversation id")
+                created_at = _timestamp(number, record.get("created_at"), datetime.utcnow())
+                new_ids[source_id] = new_id()
+                conversations.append({
+                    "id": new_ids[source_id], "user_id": user_id,
+                    "title": _text(number, record, "title")[:TITLE_LENGTH],
+                    "created_at": created_at,
+                    "updated_at": _timestamp(number, record.get("updated_at"), created_at),
+                })
+                counts["conversations"] += 1
+            elif kind == "message":
+                conversation_id = new_ids.get(_source_id(number, record, "conversation_id"))
+                if conversation_id is None:
+                    raise _invalid(number, "message before its conversation")
+                role = record.get("role")
+                if role not in ROLES:
+                    raise _invalid(number, f"role must be one of {', '.join(ROLES)}")
+                messages.append({
+                    "id": new_id(), "conversation_id": conversation_id, "role": role,
+                    "content": _text(number, record, "content"),
+                    "created_at": _timestamp(number, record.get("created_at"), datetime.utcnow()),
+                })
+                counts["messages"] += 1
+            else:
+                raise _invalid(number, f"unknown record type {kind!r}")
+
+            if len(conversations) + len(messages) >= IMPORT_BATCH_SIZE:
+                await _flush(db, conversations, messages)
+        await _flush(db, conversations, messages)
+    except BaseException:
+        # Shielded so a cancelled request still cleans up after itself
+        with anyio.CancelScope(shield=True):
+            await db.rollback()
+            await _discard(db, list(new_ids.values()))
+        raise
+    return counts
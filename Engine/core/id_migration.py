@@ -0,0 +1,110 @@
+from sqlalchemy import MetaData, Table, insert, inspect, select
+from core.database import Base, get_engine
+from core.ids import id_bytes
+from core.search import create_search_schema, drop_search_schema
+import logging
+import models.models  # Registers the tables on Base.metadata
+
+logger = logging.getLogger(__name__)
+
+# Parents before children, so rows are copied in foreign key order
+TABLES = ["users", "conversations", "messages", "conversation_summaries"]
+ID_COLUMNS = {
+    "users": ["id"],
+    "conversations": ["id", "user_id"],
+    "messages": ["id", "conversation_id"],
+    "conversation_summaries": ["conversation_id", "through_message_id"],
+}
+BATCH_SIZE = 5000
+
+def needs_id_migration(connection) -> bool:
+    """
+    Whether the tables still store ids as strings. Takes a sync connection.
+    """
+    inspector = inspect(connection)
+    if not inspector.has_table("users"):
+        return False
+    column = next(c for c in inspector.get_columns("users") if c["name"] == "id")
+    return column["type"].python_type is not bytes
+
+def _convert(table: str, row: dict) -> dict:
+    for column in ID_COLUMNS[table]:
+        value = row.get(column)
+        if value is None:
+            continue
+        raw = id_bytes(str(value))
+        if raw is None:
+            raise ValueError(f"{table}.{column} holds {value!r}, which is neither a UUID nor a legacy user id")
+        row[column] = raw
+    return row
+
+def _copy(connection, legacy: Table, table: Table) -> int:
+    columns = [column for column in legacy.columns if column.name in table.columns]
+    key = next(iter(legacy.primary_key.columns))
+    copied = 0
+    last = None
+    while True:
+        query = select(*columns).order_by(key).limit(BATCH_SIZE)
+        if last is not None:
+            query = query.where(key > last)
+        rows = connection.execute(query).mappings().all()
+        if not rows:
+            return copied
+        connection.execute(insert(table), [_convert(table.name, dict(row)) for row in rows])
+        copied += len(rows)
+        last = rows[-1][key.name]
+
+def migrate_ids_sync(connection):
+    """
+    Rebuild the tables with 16-byte binary ids and copy every row across.
+    Existing UUIDs keep their value; the old 10-digit user ids become UUIDs
+    with the digits in their low bytes, which core.auth still accepts from
+    tokens issued before the migration. Takes a sync connection.
+    """
+    if not needs_id_migration(connection):
+        logger.info("Ids are already stored as binary; nothing to migrate")
+        return
+
+    dialect = connection.dialect.name
+    inspector = inspect(connection)
+    present = [name for name in TABLES if inspector.has_table(name)]
+
+    # The search index reads from the tables being replaced; it is rebuilt at the end
+    drop_search_schema(connection)
+    if dialect == "mysql":
+        connection.exec_driver_sql("SET FOREIGN_KEY_CHECKS = 0")
+
+    for name in present:
+        if dialect == "sqlite":
+            # SQLite index names are per database, so free them for the new tables
+            for index in inspector.get_indexes(name):
+                connection.exec_driver_sql(f'DROP INDEX IF EXISTS "{index["name"]}"')
+        else:
+            # Foreign key names are per schema on MySQL
+            for foreign_key in inspector.get_foreign_keys(name):
+                if foreign_key.get("name"):
+                    connection.exec_driver_sql(f"ALTER TABLE {name} DROP FOREIGN KEY {foreign_key['name']}")
+        connection.exec_driver_sql(f"ALTER TABLE {name} RENAME TO {name}_legacy")
+
+    Base.metadata.create_all(connection)
+
+    legacy_metadata = MetaData()
+    for name in present:
+        legacy = Table(f"{name}_legacy", legacy_metadata, autoload_with=connection)
+        copied = _copy(connection, legacy, Base.metadata.tables[name])
+        logger.info(f"Copied {copied} rows into {name}")
+    for name in reversed(present):
+        connection.exec_driver_sql(f"DROP TABLE {name}_legacy")
+
+    if dialect == "mysql":
+        connection.exec_driver_sql("SET FOREIGN_KEY_CHECKS = 1")
+    create_search_schema(connection)
+
+async def migrate_ids():
+    """
+    Convert string ids to binary ones. Stop the app and back up the database
+    first: on MySQL every DDL statement commits, so a failed run is not rolled back.
+    """
+    async with get_engine().begin() as conn:
+        await conn.run_sync(migrate_ids_sync)
+    logger.info("Id migration finished")
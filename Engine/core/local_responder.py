@@ -0,0 +1,258 @@
+from config.config import (
+    LOCAL_RESPONDER_ENABLED, LOCAL_RESPONDER_RULES, LOCAL_RESPONDER_RELOAD_INTERVAL, LOCAL_RESPONDER_MAX_CHARS,
+)
+from core.metrics import register_collector
+from typing import Dict, List, Optional, Tuple
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+# A rules file holds {"rules": [...]}, tried in order; each rule is
+#   {"patterns": ["thanks", "thank you"], "response": "You're welcome!",
+#    "match": "message" or "phrase", "local": true}
+# "message" rules match the whole message, "phrase" rules a run of whole
+# words anywhere in it. Only "local" rules answer before the upstream is
+# asked; every rule can answer when the upstream is unavailable.
+DEFAULT_RULES = [
+    {"patterns": ["hello", "hey"], "response": "Hello! How can I help you today?", "match": "phrase", "local": False},
+    {"patterns": ["hi"], "response": "Hi there! What can I do for you?", "match": "phrase", "local": False},
+    {"patterns": ["how are you"], "response": "I'm doing well, thank you for asking! How are you?", "match": "phrase", "local": False},
+    {"patterns": ["what is your name", "whats your name"], "response": "I'm TSF Chat, your AI assistant. Nice to meet you!", "match": "phrase", "local": False},
+    {"patterns": ["help"], "response": "I'm here to help! You can ask me questions about various topics, and I'll do my best to assist you.", "match": "phrase", "local": False},
+    {"patterns": ["what can you do"], "response": "I can help with answering questions, providing information, having conversations, and more. What would you like to know?", "match": "phrase", "local": False},
+    {"patterns": ["test"], "response": "This is a test response! The chat system is working correctly.", "match": "phrase", "local": False},
+    {"patterns": ["thanks", "thank you"], "response": "You're welcome! Is there anything else I can help you with?", "match": "phrase", "local": False},
+    {"patterns": ["bye", "goodbye"], "response": "Goodbye! Have a great day!", "match": "phrase", "local": False},
+    # Whole-message greetings and sign-offs, answered without an upstream call
+    {"patterns": ["hi", "hello", "hey", "hi there", "hello there"], "response": "Hello! How can I help you today?", "match": "message", "local": True},
+    {"patterns": ["thanks", "thank you", "thanks a lot", "thank you very much", "ty"], "response": "You're welcome! Is there anything else I can help you with?", "match": "message", "local": True},
+    {"patterns": ["bye", "goodbye", "see you"], "response": "Goodbye! Have a great day!", "match": "message", "local": True},
+]
+
+MATCH_TYPES = ("message", "phrase")
+
+_word = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+
+def tokenize(text: str) -> Tuple[str, ...]:
+    """
+    Split text into casefolded words; punctuation and apostrophes are ignored
+    """
+    return tuple(word.replace("'", "") for word in _word.findall(text.casefold()))
+
+class Matcher:
+    """
+    Rules compiled for lookup: whole-message patterns in a dict, phrase
+    patterns in one Aho-Corasick automaton over words, so a message is
+    scanned once however many phrases there are. The earliest matching
+    rule wins.
+    """
+    def __init__(self, rules: List[Tuple[int, dict]]):
+        self.messages: Dict[Tuple[str, ...], int] = {}
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.best: List[Optional[int]] = [None]  # Earliest rule ending at a state, via its fail chain too
+        for index, rule in rules:
+            for pattern in rule["patterns"]:
+                words = tokenize(pattern)
+                if not words:
+                    continue
+                if rule["match"] == "message":
+                    self.messages.setdefault(words, index)
+                else:
+                    self._add_phrase(words, index)
+        self._link()
+
+    def _add_phrase(self, words: Tuple[str, ...], index: int):
+        state = 0
+        for word in words:
+            following = self.goto[state].get(word)
+            if following is None:
+                following = self.goto[state][word] = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.best.append(None)
+            state = following
+        if self.best[state] is None or index < self.best[state]:
+            self.best[state] = index
+
+    def _link(self):
+        # Breadth first, so a state's fail target is finished before it is used
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for word, following in self.goto[state].items():
+                fallback = self.fail[state]
+                while fallback and word not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[following] = self.goto[fallback].get(word, 0)
+                inherited = self.best[self.fail[following]]
+                if inherited is not None and (self.best[following] is None or inherited < self.best[following]):
+                    self.best[following] = inherited
+                queue.append(following)
+
+    def match(self, words: Tuple[str, ...]) -> Optional[int]:
+        """
+        Index of the earliest rule matching the words, or None
+        """
+        found = self.messages.get(words)
+        if len(self.goto) == 1:
+            return found
+        state = 0
+        for word in words:
+            while state and word not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(word, 0)
+            best = self.best[state]
+            if best is not None and (found is None or best < found):
+                found = best
+                if found == 0:
+                    break
+        return found
+
+def validate_rules(data) -> List[dict]:
+    """
+    Check the contents of a rules file, raising ValueError on the first problem
+    """
+    rules = data.get("rules") if isinstance(data, dict) else None
+    if not isinstance(rules, list):
+        raise ValueError('expected an object with a "rules" list')
+    for number, rule in enumerate(rules, 1):
+        if not isinstance(rule, dict):
+            raise ValueError(f"rule {number} is not an object")
+        patterns = rule.get("patterns")
+        if not isinstance(patterns, list) or not patterns or not all(isinstance(p, str) and tokenize(p) for p in patterns):
+            raise ValueError(f"rule {number} needs a non-empty list of patterns with words in them")
+        if not isinstance(rule.get("response"), str) or not rule["response"].strip():
+            raise ValueError(f"rule {number} needs a response")
+        rule.setdefault("match", "message")
+        if rule["match"] not in MATCH_TYPES:
+            raise ValueError(f"rule {number}: match must be one of {', '.join(MATCH_TYPES)}")
+        rule["local"] = bool(rule.get("local", False))
+    return rules
+
+class LocalResponder:
+    """
+    Canned replies from a rules list, optionally loaded from a JSON file that
+    is re-read when it changes. A file that fails to load is logged and the
+    rules already in use are kept.
+    """
+    def __init__(self, path: str = LOCAL_RESPONDER_RULES, reload_interval: float = LOCAL_RESPONDER_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._signature = None
+        self._next_check = 0.0
+        self.reloads = 0
+        self.reload_errors = 0
+        self.local_hits = 0
+        self.local_misses = 0
+        self.fallback_hits = 0
+        self.fallback_misses = 0
+        self._compile(DEFAULT_RULES)
+        if path:
+            self._maybe_reload()
+
+    def _compile(self, rules: List[dict]):
+        indexed = list(enumerate(rules))
+        # Swapped in as one tuple, so a lookup never sees half of a reload
+        self._compiled = (
+            rules,
+            Matcher([(index, rule) for index, rule in indexed if rule["local"]]),
+            Matcher(indexed),
+        )
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.reload_interval
+            try:
+                stat = os.stat(self.path)
+                signature = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                signature = None
+            if signature == self._signature and self.reloads + self.reload_errors:
+                return
+            # Remembered even when loading fails, so a broken file is reported once per change
+            self._signature = signature
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    rules = validate_rules(json.load(f))
+            except (OSError, ValueError) as e:
+                self.reload_errors += 1
+                logging.error(f"Could not load local responder rules from {self.path}: {str(e)}")
+                return
+            self._compile(rules)
+            self.reloads += 1
+            logging.info(f"Loaded {len(rules)} local responder rules from {self.path}")
+
+    def reply(self, message: str) -> Optional[str]:
+        """
+        The canned reply to a trivial message, from the rules marked local
+        """
+        if len(message) > LOCAL_RESPONDER_MAX_CHARS:
+            self.local_misses += 1
+            return None
+        if self.path:
+            self._maybe_reload()
+        rules, local, _ = self._compiled
+        index = local.match(tokenize(message))
+        if index is None:
+            self.local_misses += 1
+            return None
+        self.local_hits += 1
+        return rules[index]["response"]
+
+    def fallback(self, message: str) -> Optional[str]:
+        """
+        The canned reply to a message the upstream could not answer, from any rule
+        """
+        if self.path:
+            self._maybe_reload()
+        rules, _, every = self._compiled
+        index = every.match(tokenize(message))
+        if index is None:
+            self.fallback_misses += 1
+            return None
+        self.fallback_hits += 1
+        return rules[index]["response"]
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.local_misses
+        return {
+            "rules": len(self._compiled[0]),
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+            "local_hits": self.local_hits,
+            "local_misses": self.local_misses,
+            "local_hit_ratio": self.local_hits / lookups if lookups else 0.0,
+            "fallback_hits": self.fallback_hits,
+            "fallback_misses": self.fallback_misses,
+        }
+
+# Built on first use from the LOCAL_RESPONDER_* settings
+_responder = None
+
+def get_local_responder() -> LocalResponder:
+    """
+    Get the shared local responder, loading its rules on first use
+    """
+    global _responder
+    if _responder is None:
+        _responder = LocalResponder()
+    return _responder
+
+def local_reply(message: str) -> Optional[str]:
+    """
+    Answer a trivial message locally, or None when it should go upstream
+    """
+    if not LOCAL_RESPONDER_ENABLED:
+        return None
+    return get_local_responder().reply(message)
+
+register_collector("local_responder", lambda: _responder.stats() if _responder is not None else None)
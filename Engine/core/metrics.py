@@ -0,0 +1,202 @@
+from bisect import bisect_left
+from config.config import METRICS_ENABLED
+from typing import Callable, Dict, Iterable, Optional
+import threading
+import time
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4"  # The response adds the utf-8 charset
+
+# Seconds; spans a cached DB read up to a long streamed completion
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Iterable[str], values: Iterable) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """
+    Monotonic count per label combination
+    """
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # label values -> count
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in values.items():
+            yield self.name, _format_labels(self.labelnames, key), value
+
+class Histogram:
+    """
+    Observations per label combination, counted into cumulative buckets
+    """
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(counts) for key, counts in self._values.items()}
+        for key, counts in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames + ("le",), key + (_format_value(bound),))
+                yield f"{self.name}_bucket", labels, cumulative
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum", labels, counts[-1]
+            yield f"{self.name}_count", labels, cumulative
+
+_metrics = []
+# component -> function returning its stats() counters, or None while it is not in use
+_collectors: Dict[str, Callable[[], Optional[dict]]] = {}
+
+def counter(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+    metric = Counter(name, documentation, labelnames)
+    _metrics.append(metric)
+    return metric
+
+def histogram(name: str, documentation: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+    metric = Histogram(name, documentation, labelnames, buckets)
+    _metrics.append(metric)
+    return metric
+
+def register_collector(component: str, collect: Callable[[], Optional[dict]]):
+    """
+    Export the numeric values of a component's stats() dict, read at scrape time
+    """
+    _collectors[component] = collect
+
+http_request_duration = histogram(
+    "tsf_http_request_duration_seconds", "Time to serve a request, until its last body chunk",
+    ("method", "route", "status")
+)
+db_query_duration = histogram("tsf_db_query_duration_seconds", "SQL statement execution time", ("statement",))
+db_pool_wait = histogram(
+    "tsf_db_pool_checkout_seconds", "Time to get a pooled connection, including opening a new one"
+)
+upstream_ttfb = histogram("tsf_upstream_ttfb_seconds", "Time from sending a streamed completion to its first delta", ("model",))
+upstream_duration = histogram(
+    "tsf_upstream_duration_seconds", "Upstream completion attempt time, until the last chunk for streams",
+    ("model", "kind", "outcome")
+)
+llm_tokens = counter("tsf_llm_tokens_total", "LLM tokens sent and received", ("direction", "source"))
+
+def render() -> str:
+    """
+    Render every metric and component stat in the Prometheus text format
+    """
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {_format_value(value)}")
+
+    lines.append("# HELP tsf_component_stat Counters and gauges reported by caches, queues and limiters")
+    lines.append("# TYPE tsf_component_stat gauge")
+    for component, collect in list(_collectors.items()):
+        stats = collect()
+        for stat, value in (stats or {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                labels = _format_labels(("component", "stat"), (component, stat))
+                lines.append(f"tsf_component_stat{labels} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+def _statement_kind(statement: str) -> str:
+    kind = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else "other"
+    return kind if kind in ("select", "insert", "update", "delete") else "other"
+
+def instrument_engine(sync_engine):
+    """
+    Time every SQL statement run on an engine
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        db_query_duration.observe(time.perf_counter() - started, statement=_statement_kind(statement))
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency of every HTTP request by route template
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in scope; unmatched paths share one series
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_request_duration.observe(
+                time.perf_counter() - started, method=scope["method"], route=route, status=status
+            )
+
+def add_metrics(app):
+    """
+    Record request latency for an app when METRICS_ENABLED is on
+    """
+    if METRICS_ENABLED:
+        app.add_middleware(MetricsMiddleware)
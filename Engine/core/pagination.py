@@ -0,0 +1,53 @@
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+from datetime import datetime
+import base64
+import json
+
+def encode_cursor(timestamp: datetime, row_id: str) -> str:
+    """
+    Encode a (timestamp, id) keyset position as an opaque cursor
+    """
+    raw = json.dumps([timestamp.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """
+    Decode a cursor produced by encode_cursor into (timestamp, id)
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(timestamp), str(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def before_cursor(timestamp_column, id_column, cursor: str):
+    """
+    Filter for rows that come after the cursor in (timestamp, id) descending order
+    """
+    timestamp, row_id = decode_cursor(cursor)
+    return or_(
+        timestamp_column < timestamp,
+        and_(timestamp_column == timestamp, id_column < row_id)
+    )
+
+def encode_offset_cursor(offset: int) -> str:
+    """
+    Encode a position in a ranked result list, where keyset pagination does not apply
+    """
+    raw = json.dumps({"offset": offset}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_offset_cursor(cursor: str) -> int:
+    """
+    Decode a cursor produced by encode_offset_cursor
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        offset = int(json.loads(base64.urlsafe_b64decode(padded.encode()))["offset"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return offset
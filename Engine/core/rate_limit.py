@@ -0,0 +1,231 @@
+from collections import OrderedDict
+from fastapi import HTTPException
+from config.config import (
+    RATE_LIMIT_ENABLED, RATE_LIMIT_BACKEND, RATE_LIMIT_REDIS_URL, RATE_LIMIT_MODE, RATE_LIMIT_MAX_WAIT,
+    RATE_LIMIT_USER_REQUESTS_PER_MINUTE, RATE_LIMIT_USER_REQUEST_BURST,
+    RATE_LIMIT_USER_TOKENS_PER_MINUTE, RATE_LIMIT_USER_TOKEN_BURST,
+    RATE_LIMIT_GLOBAL_REQUESTS_PER_MINUTE, RATE_LIMIT_GLOBAL_REQUEST_BURST,
+    RATE_LIMIT_GLOBAL_TOKENS_PER_MINUTE, RATE_LIMIT_GLOBAL_TOKEN_BURST,
+    RATE_LIMIT_MAX_KEYS,
+)
+from core.metrics import register_collector
+from typing import List, Optional, Tuple
+import asyncio
+import logging
+import math
+import threading
+import time
+
+KEY_PREFIX = "tsf:ratelimit:"
+
+# (key, capacity, refill per second, amount to take)
+BucketSpec = Tuple[str, float, float, float]
+
+def estimate_tokens(user_message: str, history: Optional[List[dict]], max_tokens: int) -> int:
+    """
+    Estimate the LLM tokens of a completion: the prompt at roughly four
+    characters per token plus the full reply allowance
+    """
+    messages = list(history or []) + [{"content": user_message}]
+    return sum(len(m["content"]) // 4 + 4 for m in messages) + max_tokens
+
+class MemoryBackend:
+    """
+    Buckets of a single worker, LRU-bounded so idle users do not accumulate
+    """
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (level, updated_at)
+        self._lock = threading.Lock()
+
+    async def take(self, specs: List[BucketSpec]) -> float:
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            wait = 0.0
+            for key, capacity, rate, amount in specs:
+                level, updated_at = self._buckets.get(key, (capacity, now))
+                level = min(capacity, level + (now - updated_at) * rate)
+                levels.append(level)
+                if level < amount:
+                    wait = max(wait, (amount - level) / rate)
+            if wait > 0:
+                return wait
+            for (key, _, _, amount), level in zip(specs, levels):
+                self._buckets[key] = (level - amount, now)
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return 0.0
+
+    async def close(self):
+        pass
+
+# Takes from every bucket or none, using the server clock so workers agree.
+# Returns the seconds to wait as a string, "0" when granted.
+TAKE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local levels = {}
+local wait = 0
+for i = 1, #KEYS do
+    local capacity, rate, amount = tonumber(ARGV[3*i-2]), tonumber(ARGV[3*i-1]), tonumber(ARGV[3*i])
+    local state = redis.call('HMGET', KEYS[i], 'level', 'updated_at')
+    local level = tonumber(state[1]) or capacity
+    local updated_at = tonumber(state[2]) or now
+    level = math.min(capacity, level + math.max(0, now - updated_at) * rate)
+    levels[i] = level
+    if level < amount then
+        wait = math.max(wait, (amount - level) / rate)
+    end
+end
+if wait > 0 then
+    return tostring(wait)
+end
+for i = 1, #KEYS do
+    local capacity, rate, amount = tonumber(ARGV[3*i-2]), tonumber(ARGV[3*i-1]), tonumber(ARGV[3*i])
+    redis.call('HSET', KEYS[i], 'level', tostring(levels[i] - amount), 'updated_at', tostring(now))
+    redis.call('PEXPIRE', KEYS[i], math.ceil(capacity / rate * 1000))
+end
+return "0"
+"""
+
+class RedisBackend:
+    """
+    Buckets shared by all workers, updated atomically by a server-side script
+    """
+    def __init__(self, client):
+        self.client = client
+        self._take = client.register_script(TAKE_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url: str):
+        import redis.asyncio as redis  # Optional dependency, only needed for this backend
+        return cls(redis.from_url(url))
+
+    async def take(self, specs: List[BucketSpec]) -> float:
+        args = []
+        for _, capacity, rate, amount in specs:
+            args.extend([capacity, rate, amount])
+        wait = await self._take(keys=[key for key, _, _, _ in specs], args=args)
+        return float(wait)
+
+    async def close(self):
+        close = getattr(self.client, "aclose", None) or getattr(self.client, "close", None)
+        if close is not None:
+            await close()
+
+class RateLimiter:
+    """
+    Token-bucket limits per user and across all users, counted in requests
+    and in estimated LLM tokens. A request takes from all four buckets or none.
+    """
+    def __init__(self, backend, mode: str = RATE_LIMIT_MODE, max_wait: float = RATE_LIMIT_MAX_WAIT):
+        self.backend = backend
+        self.mode = mode
+        self.max_wait = max_wait
+        # (scope, unit, capacity, refill per minute)
+        self.limits = [
+            ("user", "requests", RATE_LIMIT_USER_REQUEST_BURST, RATE_LIMIT_USER_REQUESTS_PER_MINUTE),
+            ("user", "tokens", RATE_LIMIT_USER_TOKEN_BURST, RATE_LIMIT_USER_TOKENS_PER_MINUTE),
+            ("global", "requests", RATE_LIMIT_GLOBAL_REQUEST_BURST, RATE_LIMIT_GLOBAL_REQUESTS_PER_MINUTE),
+            ("global", "tokens", RATE_LIMIT_GLOBAL_TOKEN_BURST, RATE_LIMIT_GLOBAL_TOKENS_PER_MINUTE),
+        ]
+        self.allowed = 0
+        self.queued = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def bucket_specs(self, user_id: str, tokens: int) -> List[BucketSpec]:
+        specs = []
+        for scope, unit, capacity, per_minute in self.limits:
+            if capacity <= 0 or per_minute <= 0:
+                continue
+            owner = f"user:{user_id}" if scope == "user" else "global"
+            # A request larger than the burst can still pass once the bucket is full
+            amount = min(tokens, capacity) if unit == "tokens" else 1
+            specs.append((f"{KEY_PREFIX}{owner}:{unit}", capacity, per_minute / 60, amount))
+        return specs
+
+    async def acquire(self, user_id: str, tokens: int):
+        """
+        Take one request and the estimated tokens for user_id, waiting in
+        queue mode, or raise 429 with Retry-After when over the limit
+        """
+        specs = self.bucket_specs(user_id, tokens)
+        if not specs:
+            return
+        deadline = time.monotonic() + (self.max_wait if self.mode == "queue" else 0)
+        waited = False
+        while True:
+            try:
+                wait = await self.backend.take(specs)
+            except Exception as e:
+                # Fail open: an unreachable limiter must not take chat down with it
+                self.errors += 1
+                logging.warning(f"Rate limiter unavailable: {str(e)}")
+                return
+            if wait <= 0:
+                self.allowed += 1
+                return
+            if time.monotonic() + wait > deadline:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=429,
+                    detail="Too many requests. Please slow down and try again shortly.",
+                    headers={"Retry-After": str(math.ceil(wait))}
+                )
+            if not waited:
+                self.queued += 1
+                waited = True
+            await asyncio.sleep(wait)
+
+    def stats(self) -> dict:
+        return {"allowed": self.allowed, "queued": self.queued, "rejected": self.rejected, "errors": self.errors}
+
+    async def close(self):
+        await self.backend.close()
+
+# Built on first use from the RATE_LIMIT_* settings
+_rate_limiter = None
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """
+    Get the configured rate limiter, or None when rate limiting is disabled
+    """
+    global _rate_limiter
+    if _rate_limiter is None and RATE_LIMIT_ENABLED:
+        if RATE_LIMIT_BACKEND == "redis":
+            backend = RedisBackend.from_url(RATE_LIMIT_REDIS_URL)
+        elif RATE_LIMIT_BACKEND == "memory":
+            backend = MemoryBackend()
+        else:
+            raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {RATE_LIMIT_BACKEND}")
+        _rate_limiter = RateLimiter(backend)
+    return _rate_limiter
+
+def set_rate_limiter(limiter: Optional[RateLimiter]):
+    """
+    Replace the rate limiter, e.g. with one on a different backend
+    """
+    global _rate_limiter
+    _rate_limiter = limiter
+
+async def check_rate_limit(user_id: str, user_message: str, history: Optional[List[dict]], max_tokens: int):
+    """
+    Apply the rate limits to a completion request before it is sent upstream
+    """
+    limiter = get_rate_limiter()
+    if limiter is not None:
+        await limiter.acquire(user_id, estimate_tokens(user_message, history, max_tokens))
+
+async def close_rate_limiter():
+    """
+    Close the rate limiter backend, if one was created
+    """
+    global _rate_limiter
+    if _rate_limiter is not None:
+        await _rate_limiter.close()
+    _rate_limiter = None
+
+register_collector("rate_limiter", lambda: _rate_limiter.stats() if _rate_limiter is not None else None)
@@ -0,0 +1,178 @@
+from config.config import (
+    RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_BACKEND, RESPONSE_CACHE_REDIS_URL,
+    RESPONSE_CACHE_TTL, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_WITH_HISTORY,
+)
+from core.cache import TTLCache
+from core.metrics import register_collector
+from typing import List, Optional
+import hashlib
+import json
+import logging
+import re
+
+KEY_PREFIX = "tsf:completion:"
+
+_whitespace = re.compile(r"\s+")
+
+def normalize_prompt(text: str) -> str:
+    """
+    Normalize a prompt for exact-match lookup: case and runs of whitespace are ignored
+    """
+    return _whitespace.sub(" ", text).strip().casefold()
+
+def context_hash(history: Optional[List[dict]]) -> str:
+    """
+    Hash the prior turns sent with a prompt; empty for a first turn
+    """
+    if not history:
+        return ""
+    raw = json.dumps([[m["role"], m["content"]] for m in history], separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def make_key(user_message: str, history: Optional[List[dict]], model: str, temperature: float, max_tokens: int) -> str:
+    """
+    Build the cache key of a completion request
+    """
+    raw = json.dumps(
+        [normalize_prompt(user_message), context_hash(history), model, temperature, max_tokens],
+        separators=(",", ":"),
+    )
+    return KEY_PREFIX + hashlib.sha256(raw.encode()).hexdigest()
+
+class MemoryBackend:
+    """
+    In-process LRU, bounded by entry count
+    """
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE, ttl: int = RESPONSE_CACHE_TTL):
+        self._cache = TTLCache(maxsize, ttl)
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: str, ttl: int):
+        self._cache.set(key, value, ttl)
+
+    async def close(self):
+        self._cache.clear()
+
+class RedisBackend:
+    """
+    Shared cache on any client with the redis.asyncio get/set(ex=) interface,
+    so a local stand-in can replace a Redis server
+    """
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url: str):
+        import redis.asyncio as redis  # Optional dependency, only needed for this backend
+        return cls(redis.from_url(url))
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self.client.get(key)
+        if isinstance(value, bytes):
+            value = value.decode()
+        return value
+
+    async def set(self, key: str, value: str, ttl: int):
+        await self.client.set(key, value, ex=ttl)
+
+    async def close(self):
+        close = getattr(self.client, "aclose", None) or getattr(self.client, "close", None)
+        if close is not None:
+            await close()
+
+class ResponseCache:
+    """
+    Exact-match completion cache with hit/miss counters.
+    Backend failures count as misses so the cache can never fail a chat.
+    """
+    def __init__(self, backend, ttl: int = RESPONSE_CACHE_TTL, with_history: bool = RESPONSE_CACHE_WITH_HISTORY):
+        self.backend = backend
+        self.ttl = ttl
+        self.with_history = with_history
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.stores = 0
+        self.errors = 0
+
+    def key_for(self, user_message: str, history: Optional[List[dict]], model: str, temperature: float, max_tokens: int) -> Optional[str]:
+        """
+        Get the key of a request, or None when it should bypass the cache
+        """
+        if history and not self.with_history:
+            self.bypasses += 1
+            return None
+        return make_key(user_message, history, model, temperature, max_tokens)
+
+    async def get(self, key: str) -> Optional[str]:
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            self.errors += 1
+            logging.warning(f"Response cache read failed: {str(e)}")
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str):
+        try:
+            await self.backend.set(key, value, self.ttl)
+            self.stores += 1
+        except Exception as e:
+            self.errors += 1
+            logging.warning(f"Response cache write failed: {str(e)}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "stores": self.stores,
+            "errors": self.errors,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    async def close(self):
+        await self.backend.close()
+
+# Built on first use from the RESPONSE_CACHE_* settings
+_response_cache = None
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    Get the configured response cache, or None when caching is disabled
+    """
+    global _response_cache
+    if _response_cache is None and RESPONSE_CACHE_ENABLED:
+        if RESPONSE_CACHE_BACKEND == "redis":
+            backend = RedisBackend.from_url(RESPONSE_CACHE_REDIS_URL)
+        elif RESPONSE_CACHE_BACKEND == "memory":
+            backend = MemoryBackend()
+        else:
+            raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND: {RESPONSE_CACHE_BACKEND}")
+        _response_cache = ResponseCache(backend)
+    return _response_cache
+
+def set_response_cache(cache: Optional[ResponseCache]):
+    """
+    Replace the response cache, e.g. with one on a local stand-in backend
+    """
+    global _response_cache
+    _response_cache = cache
+
+async def close_response_cache():
+    """
+    Close the response cache backend, if one was created
+    """
+    global _response_cache
+    if _response_cache is not None:
+        await _response_cache.close()
+    _response_cache = None
+
+register_collector("response_cache", lambda: _response_cache.stats() if _response_cache is not None else None)
@@ -0,0 +1,235 @@
+from sqlalchemy import DateTime, String, and_, func, select, text
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.compression import CompressedText
+from core.ids import CompactId
+from models.models import Conversation, Message
+from typing import List
+import re
+
+# Terms beyond this are ignored; each one narrows the result further
+MAX_TERMS = 8
+SNIPPET_LENGTH = 160
+
+_term = re.compile(r"\w+", re.UNICODE)
+
+# SQLite keeps a full-text index per table in FTS5 virtual tables that read
+# their text from the base tables ("external content") and are kept current
+# by triggers, so every insert, including batched write-behind inserts, is
+# searchable once committed. The user_id column lets a query intersect a
+# user's postings with the terms' instead of filtering every match afterwards;
+# it is stored as the hex of the binary id so a user is one token rather than
+# a phrase, which BM25 ranking can count far faster. Message content may be
+# stored compressed, so it is read through message_text() (core.compression),
+# which every connection registers.
+SQLITE_SEARCH_OBJECTS = [
+    ("TRIGGER", "messages_fts_insert"), ("TRIGGER", "messages_fts_delete"), ("TRIGGER", "messages_fts_update"),
+    ("TRIGGER", "conversations_messages_fts_delete"), ("TRIGGER", "conversations_fts_insert"),
+    ("TRIGGER", "conversations_fts_delete"), ("TRIGGER", "conversations_fts_update"),
+    ("TABLE", "messages_fts"), ("TABLE", "conversations_fts"),
+    ("VIEW", "messages_search_content"), ("VIEW", "conversations_search_content"),
+]
+
+SQLITE_SEARCH_SCHEMA = [
+    """
+    CREATE VIEW IF NOT EXISTS messages_search_content AS
+    SELECT m.rowid AS message_rowid, hex(c.user_id) AS user_id, message_text(m.content) AS content
+    FROM messages m JOIN conversations c ON c.id = m.conversation_id
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        user_id, content, content='messages_search_content', content_rowid='message_rowid'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, user_id, content)
+        SELECT new.rowid, hex(c.user_id), message_text(new.content) FROM conversations c WHERE c.id = new.conversation_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, user_id, content)
+        SELECT 'delete', old.rowid, hex(c.user_id), message_text(old.content) FROM conversations c WHERE c.id = old.conversation_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, user_id, content)
+        SELECT 'delete', old.rowid, hex(c.user_id), message_text(old.content) FROM conversations c WHERE c.id = old.conversation_id;
+        INSERT INTO messages_fts(rowid, user_id, content)
+        SELECT new.rowid, hex(c.user_id), message_text(new.content) FROM conversations c WHERE c.id = new.conversation_id;
+    END
+    """,
+    # A conversation deleted before its messages (e.g. by a foreign key cascade)
+    # takes its messages' index entries with it while user_id is still known
+    """
+    CREATE TRIGGER IF NOT EXISTS conversations_messages_fts_delete BEFORE DELETE ON conversations BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, user_id, content)
+        SELECT 'delete', m.rowid, hex(old.user_id), message_text(m.content) FROM messages m WHERE m.conversation_id = old.id;
+    END
+    """,
+    """
+    CREATE VIEW IF NOT EXISTS conversations_search_content AS
+    SELECT rowid AS conversation_rowid, hex(user_id) AS user_id, title FROM conversations
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5(
+        user_id, title, content='conversations_search_content', content_rowid='conversation_rowid'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS conversations_fts_insert AFTER INSERT ON conversations BEGIN
+        INSERT INTO conversations_fts(rowid, user_id, title) VALUES (new.rowid, hex(new.user_id), new.title);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS conversations_fts_delete AFTER DELETE ON conversations BEGIN
+        INSERT INTO conversations_fts(conversations_fts, rowid, user_id, title) VALUES ('delete', old.rowid, hex(old.user_id), old.title);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS conversations_fts_update AFTER UPDATE OF title ON conversations BEGIN
+        INSERT INTO conversations_fts(conversations_fts, rowid, user_id, title) VALUES ('delete', old.rowid, hex(old.user_id), old.title);
+        INSERT INTO conversations_fts(rowid, user_id, title) VALUES (new.rowid, hex(new.user_id), new.title);
+    END
+    """,
+]
+
+def create_search_schema(connection):
+    """
+    Create the SQLite full-text tables and triggers, indexing existing rows
+    the first time, or again when they predate message_text(). MySQL
+    FULLTEXT indexes are declared on the models.
+    Takes a sync connection, e.g. through AsyncConnection.run_sync.
+    """
+    if connection.dialect.name != "sqlite":
+        return
+    view = connection.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE name = 'messages_search_content'"
+    ).scalar()
+    if view is not None and "message_text" not in view:
+        # Created before content could be compressed: rebuild on message_text()
+        drop_search_schema(connection)
+    existing = connection.exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE name IN ('messages_fts', 'conversations_fts')"
+    ).scalars().all()
+    for statement in SQLITE_SEARCH_SCHEMA:
+        connection.exec_driver_sql(statement)
+    for table in ("messages_fts", "conversations_fts"):
+        # Rank on the text column only; user_id is there for filtering
+        connection.exec_driver_sql(f"INSERT INTO {table}({table}, rank) VALUES ('rank', 'bm25(0.0, 1.0)')")
+        if table not in existing:
+            connection.exec_driver_sql(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+def drop_search_schema(connection):
+    """
+    Drop the SQLite full-text tables and triggers, e.g. before the tables
+    they read from are rebuilt; create_search_schema reindexes them
+    """
+    if connection.dialect.name != "sqlite":
+        return
+    for kind, name in SQLITE_SEARCH_OBJECTS:
+        connection.exec_driver_sql(f"DROP {kind} IF EXISTS {name}")
+
+def parse_terms(query: str) -> List[str]:
+    """
+    Split a search box query into lowercase word terms, dropping operators and punctuation
+    """
+    terms = []
+    for term in _term.findall(query.lower()):
+        if term not in terms:
+            terms.append(term)
+    return terms[:MAX_TERMS]
+
+def make_snippet(content: str, terms: List[str], length: int = SNIPPET_LENGTH) -> str:
+    """
+    Cut the part of content around the first matched term and wrap every
+    matched term in **
+    """
+    pattern = re.compile(r"\b(" + "|".join(re.escape(term) for term in terms) + r")\b", re.IGNORECASE)
+    first = pattern.search(content)
+    start = 0
+    if first and len(content) > length:
+        start = max(0, min(first.start() - length // 3, len(content) - length))
+    window = content[start:start + length]
+    snippet = pattern.sub(lambda m: f"**{m.group(0)}**", window)
+    if start > 0:
+        snippet = "…" + snippet.lstrip()
+    if start + length < len(content):
+        snippet = snippet.rstrip() + "…"
+    return snippet
+
+def _fts5_query(user_id: str, column: str, terms: List[str]) -> str:
+    # Every term is quoted, so user input can never be read as FTS5 syntax
+    quoted = " AND ".join(f'"{term}"' for term in terms)
+    # The index holds hex(user_id); the tokenizer folds its case
+    return f'user_id:"{user_id.replace("-", "")}" AND {column}:({quoted})'
+
+def _sqlite_search(sql: str):
+    return text(sql).columns(
+        id=CompactId, conversation_id=CompactId, title=String, role=String, content=CompressedText, created_at=DateTime
+    )
+
+SQLITE_MESSAGE_SEARCH = _sqlite_search("""
+    SELECT m.id AS id, m.conversation_id AS conversation_id, c.title AS title,
+           m.role AS role, m.content AS content, m.created_at AS created_at
+    FROM messages_fts f
+    JOIN messages m ON m.rowid = f.rowid
+    JOIN conversations c ON c.id = m.conversation_id
+    WHERE messages_fts MATCH :query
+    ORDER BY f.rank LIMIT :limit OFFSET :offset
+""")
+
+async def search_messages(db: AsyncSession, user_id: str, terms: List[str], limit: int, offset: int) -> list:
+    """
+    The user's messages containing every term, best match first.
+    Rows have id, conversation_id, title, role, content and created_at.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        params = {"query": _fts5_query(user_id, "content", terms), "limit": limit, "offset": offset}
+        return (await db.execute(SQLITE_MESSAGE_SEARCH, params)).all()
+
+    query = select(
+        Message.id, Message.conversation_id, Conversation.title, Message.role, Message.content, Message.created_at
+    ).join(Conversation, Conversation.id == Message.conversation_id).where(Conversation.user_id == user_id)
+    if dialect == "mysql":
+        score = match(Message.content, against=" ".join(f'+"{term}"' for term in terms)).in_boolean_mode()
+        query = query.where(score > 0).order_by(score.desc(), Message.created_at.desc())
+    else:
+        # No full-text index on other databases: scan the user's messages
+        query = query.where(
+            and_(*(func.lower(Message.content).contains(term, autoescape=True) for term in terms))
+        ).order_by(Message.created_at.desc())
+    return (await db.execute(query.limit(limit).offset(offset))).all()
+
+SQLITE_CONVERSATION_SEARCH = _sqlite_search("""
+    SELECT c.id AS id, c.id AS conversation_id, c.title AS title,
+           NULL AS role, NULL AS content, c.updated_at AS created_at
+    FROM conversations_fts f
+    JOIN conversations c ON c.rowid = f.rowid
+    WHERE conversations_fts MATCH :query
+    ORDER BY f.rank LIMIT :limit
+""")
+
+async def search_conversations(db: AsyncSession, user_id: str, terms: List[str], limit: int) -> list:
+    """
+    The user's conversations whose title contains every term, best match first.
+    Rows have id, title and updated_at.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        params = {"query": _fts5_query(user_id, "title", terms), "limit": limit}
+        rows = (await db.execute(SQLITE_CONVERSATION_SEARCH, params)).all()
+        return [(row.id, row.title, row.created_at) for row in rows]
+
+    query = select(Conversation.id, Conversation.title, Conversation.updated_at).where(Conversation.user_id == user_id)
+    if dialect == "mysql":
+        score = match(Conversation.title, against=" ".join(f'+"{term}"' for term in terms)).in_boolean_mode()
+        query = query.where(score > 0).order_by(score.desc(), Conversation.updated_at.desc())
+    else:
+        query = query.where(
+            and_(*(func.lower(Conversation.title).contains(term, autoescape=True) for term in terms))
+        ).order_by(Conversation.updated_at.desc())
+    return (await db.execute(query.limit(limit))).all()
@@ -0,0 +1,109 @@
+from typing import AsyncIterator, Awaitable, Callable
+import asyncio
+
+class SingleFlight:
+    """
+    Share one in-flight call among concurrent callers with the same key.
+    The call runs as its own task, so a caller that goes away does not
+    cancel it for the others.
+    """
+    def __init__(self):
+        self._calls = {}  # key -> asyncio.Task
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._forget(key, task))
+        else:
+            self.followers += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        return {"leaders": self.leaders, "followers": self.followers, "in_flight": len(self._calls)}
+
+class _StreamFlight:
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.task = None
+        self.wakeup = asyncio.Event()
+
+    def publish(self):
+        # Wake current subscribers and give later ones a fresh event
+        wakeup, self.wakeup = self.wakeup, asyncio.Event()
+        wakeup.set()
+
+class StreamSingleFlight:
+    """
+    Share one upstream stream among concurrent subscribers with the same key.
+    Subscribers that join late first receive the chunks already produced.
+    The upstream stream is cancelled once every subscriber has gone away.
+    """
+    def __init__(self):
+        self._flights = {}  # key -> _StreamFlight
+        self.leaders = 0
+        self.followers = 0
+
+    async def subscribe(self, key: str, make_stream: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        flight = self._flights.get(key)
+        if flight is None:
+            self.leaders += 1
+            flight = _StreamFlight()
+            self._flights[key] = flight
+            flight.task = asyncio.ensure_future(self._pump(key, flight, make_stream))
+        else:
+            self.followers += 1
+
+        flight.subscribers += 1
+        try:
+            index = 0
+            while True:
+                if index == len(flight.chunks) and not flight.done:
+                    await flight.wakeup.wait()
+                    continue
+                while index < len(flight.chunks):
+                    chunk = flight.chunks[index]
+                    index += 1
+                    yield chunk
+                if flight.done and index == len(flight.chunks):
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # New subscribers start a fresh flight instead of joining this one
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    async def _pump(self, key: str, flight: _StreamFlight, make_stream: Callable[[], AsyncIterator[str]]):
+        stream = make_stream()
+        try:
+            async for chunk in stream:
+                flight.chunks.append(chunk)
+                flight.publish()
+        except asyncio.CancelledError:
+            flight.error = ConnectionAbortedError("Upstream stream cancelled")
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.publish()
+            await stream.aclose()
+
+    def stats(self) -> dict:
+        return {"leaders": self.leaders, "followers": self.followers, "in_flight": len(self._flights)}
@@ -0,0 +1,305 @@
+from config.config import (
+    OPENROUTER_MODEL, OPENROUTER_FALLBACK_MODELS, OPENROUTER_MAX_CONCURRENCY,
+    UPSTREAM_MAX_RETRIES, UPSTREAM_BACKOFF_BASE, UPSTREAM_BACKOFF_MAX,
+    UPSTREAM_BREAKER_WINDOW, UPSTREAM_BREAKER_MIN_CALLS, UPSTREAM_BREAKER_FAILURE_RATIO,
+    UPSTREAM_BREAKER_RESET, UPSTREAM_HEDGE_AFTER,
+)
+from collections import deque
+from core.metrics import register_collector, upstream_duration, upstream_ttfb
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+import asyncio
+import logging
+import random
+import time
+
+# Caps the number of in-flight upstream completions per worker
+upstream_semaphore = asyncio.Semaphore(OPENROUTER_MAX_CONCURRENCY)
+
+# Statuses worth retrying on the same model
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+# Statuses worth trying the next model for
+FAILOVER_STATUS = RETRYABLE_STATUS | {404}
+
+counters = {"attempts": 0, "retries": 0, "failovers": 0, "hedges": 0, "short_circuits": 0}
+
+class CircuitOpenError(Exception):
+    """Raised when a model's circuit is open and no request is sent"""
+
+def status_of(error: Exception) -> Optional[int]:
+    return getattr(error, "status_code", None)
+
+def is_transient(error: Exception) -> bool:
+    """
+    Whether an upstream error may go away on retry: throttling, server
+    errors, timeouts and dropped connections
+    """
+    status = status_of(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    import openai  # Already loaded by the time an upstream call has failed
+    return isinstance(error, openai.APIConnectionError)
+
+def can_fail_over(error: Exception) -> bool:
+    return isinstance(error, CircuitOpenError) or is_transient(error) or status_of(error) in FAILOVER_STATUS
+
+def backoff_delay(attempt: int, error: Exception) -> float:
+    """
+    Full-jitter exponential backoff, stretched to the server's Retry-After when it sends one
+    """
+    delay = random.uniform(0, min(UPSTREAM_BACKOFF_MAX, UPSTREAM_BACKOFF_BASE * 2 ** attempt))
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        delay = max(delay, float(retry_after))
+    except (TypeError, ValueError):
+        pass
+    return min(delay, UPSTREAM_BACKOFF_MAX)
+
+class CircuitBreaker:
+    """
+    Opens when enough of the recent calls failed, then lets a single trial
+    request through every reset_timeout seconds until one succeeds.
+    Judging a window rather than a consecutive streak keeps fast-failing
+    requests from tripping it during a burst against a merely flaky upstream.
+    """
+    def __init__(self, window: float = UPSTREAM_BREAKER_WINDOW, min_calls: int = UPSTREAM_BREAKER_MIN_CALLS,
+                 failure_ratio: float = UPSTREAM_BREAKER_FAILURE_RATIO, reset_timeout: float = UPSTREAM_BREAKER_RESET):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.reset_timeout = reset_timeout
+        self.outcomes = deque()  # (time, failed)
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started_at = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "open":
+            return False
+        # A trial that never reported back (e.g. cancelled) does not block the next one forever
+        now = time.monotonic()
+        if self.trial_started_at is not None and now - self.trial_started_at < self.reset_timeout:
+            return False
+        self.trial_started_at = now
+        return True
+
+    def _record(self, failed: bool):
+        now = time.monotonic()
+        self.outcomes.append((now, failed))
+        self.failures += failed
+        while self.outcomes and self.outcomes[0][0] < now - self.window:
+            _, old_failed = self.outcomes.popleft()
+            self.failures -= old_failed
+
+    def record_success(self):
+        """The upstream answered, even if it rejected the request"""
+        self._record(False)
+        if self.opened_at is not None:
+            # The trial succeeded; start over with a clean window
+            self.outcomes.clear()
+            self.failures = 0
+        self.opened_at = None
+        self.trial_started_at = None
+
+    def record_failure(self):
+        self._record(True)
+        if self.opened_at is not None:
+            if self.trial_started_at is not None:
+                # The trial failed; stay open for another reset_timeout
+                self.opened_at = time.monotonic()
+                self.trial_started_at = None
+            return
+        if len(self.outcomes) >= self.min_calls and self.failures >= self.failure_ratio * len(self.outcomes):
+            logging.warning("Upstream circuit opened after repeated failures")
+            self.opened_at = time.monotonic()
+
+# model -> CircuitBreaker
+breakers = {}
+
+def get_breaker(model: str) -> CircuitBreaker:
+    breaker = breakers.get(model)
+    if breaker is None:
+        breaker = breakers[model] = CircuitBreaker()
+    return breaker
+
+def candidate_models() -> List[str]:
+    """
+    The primary model followed by the fallback models, in order
+    """
+    models = [OPENROUTER_MODEL]
+    for model in OPENROUTER_FALLBACK_MODELS:
+        if model not in models:
+            models.append(model)
+    return models
+
+async def _call_model(create: Callable[[str], Awaitable], model: str):
+    """
+    Call one model, retrying transient errors with backoff while its circuit allows
+    """
+    breaker = get_breaker(model)
+    for attempt in range(UPSTREAM_MAX_RETRIES + 1):
+        if not breaker.allow():
+            counters["short_circuits"] += 1
+            raise CircuitOpenError(f"Circuit open for {model}")
+        counters["attempts"] += 1
+        try:
+            result = await create(model)
+        except Exception as e:
+            if not is_transient(e):
+                if status_of(e) is not None:
+                    breaker.record_success()
+                raise
+            breaker.record_failure()
+            logging.warning(f"Upstream attempt {attempt + 1} on {model} failed: {str(e)}")
+            if attempt == UPSTREAM_MAX_RETRIES:
+                raise
+            counters["retries"] += 1
+            await asyncio.sleep(backoff_delay(attempt, e))
+        else:
+            breaker.record_success()
+            return result
+
+async def _call_with_failover(create: Callable[[str], Awaitable], models: List[str]):
+    """
+    Try each model in turn until one succeeds or an error no other model would fix
+    """
+    last_error = CircuitOpenError("No upstream model available")
+    for index, model in enumerate(models):
+        if index and not isinstance(last_error, CircuitOpenError):
+            counters["failovers"] += 1
+        try:
+            return await _call_model(create, model)
+        except Exception as e:
+            if not can_fail_over(e):
+                raise
+            last_error = e
+    raise last_error
+
+async def _call_hedged(create: Callable[[str], Awaitable], models: List[str]):
+    """
+    Call the primary model; if it has not answered after UPSTREAM_HEDGE_AFTER
+    seconds, race it against the fallback models and keep the first success
+    """
+    primary = asyncio.ensure_future(_call_model(create, models[0]))
+    done, _ = await asyncio.wait({primary}, timeout=UPSTREAM_HEDGE_AFTER)
+    if done:
+        try:
+            return primary.result()
+        except Exception as e:
+            if not can_fail_over(e):
+                raise
+            return await _call_with_failover(create, models[1:])
+
+    counters["hedges"] += 1
+    secondary = asyncio.ensure_future(_call_with_failover(create, models[1:]))
+    pending = {primary, secondary}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            errors = [task.exception() for task in done]
+            for task, error in zip(done, errors):
+                if error is None:
+                    return task.result()
+        raise errors[0]
+    finally:
+        for task in (primary, secondary):
+            if not task.done():
+                task.cancel()
+
+async def create_completion(client, **params):
+    """
+    Create a chat completion with retries, per-model circuit breakers,
+    failover to OPENROUTER_FALLBACK_MODELS and optional hedging
+    """
+    async def create(model: str):
+        async with upstream_semaphore:
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                completion = await client.chat.completions.create(model=model, **params)
+                outcome = "ok"
+                return completion
+            finally:
+                upstream_duration.observe(time.perf_counter() - started, model=model, kind="complete", outcome=outcome)
+
+    models = candidate_models()
+    if UPSTREAM_HEDGE_AFTER > 0 and len(models) > 1:
+        return await _call_hedged(create, models)
+    return await _call_with_failover(create, models)
+
+def _delta_content(chunk) -> Optional[str]:
+    if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+        return chunk.choices[0].delta.content
+    return None
+
+async def stream_completion(client, **params) -> AsyncIterator[str]:
+    """
+    Stream the content deltas of a chat completion.
+    Failures before the first delta are retried and failed over like
+    create_completion; failures after it are raised to the caller.
+    """
+    async def open_stream(model: str):
+        # Held until the stream is finished, not just while it is opened
+        await upstream_semaphore.acquire()
+        started = time.perf_counter()
+        try:
+            stream = await client.chat.completions.create(model=model, stream=True, **params)
+            try:
+                # Read up to the first delta so early failures can still be retried,
+                # then carry on with the same iterator
+                chunks = stream.__aiter__()
+                first = None
+                async for chunk in chunks:
+                    first = _delta_content(chunk)
+                    if first:
+                        break
+                upstream_ttfb.observe(time.perf_counter() - started, model=model)
+                return model, stream, chunks, first, started
+            except BaseException:
+                await stream.close()
+                raise
+        except BaseException:
+            upstream_semaphore.release()
+            upstream_duration.observe(time.perf_counter() - started, model=model, kind="stream", outcome="error")
+            raise
+
+    model, stream, chunks, first, started = await _call_with_failover(open_stream, candidate_models())
+    outcome = "error"
+    try:
+        if first:
+            yield first
+        async for chunk in chunks:
+            content = _delta_content(chunk)
+            if content:
+                yield content
+        outcome = "ok"
+    except Exception as e:
+        if is_transient(e):
+            get_breaker(model).record_failure()
+        raise
+    finally:
+        # Release the pooled connection even if the consumer went away
+        await stream.close()
+        upstream_semaphore.release()
+        upstream_duration.observe(time.perf_counter() - started, model=model, kind="stream", outcome=outcome)
+
+def get_stats() -> dict:
+    return {**counters, "circuits": {model: breaker.state for model, breaker in breakers.items()}}
+
+register_collector("upstream", lambda: {
+    **counters,
+    "open_circuits": sum(1 for breaker in breakers.values() if breaker.state != "closed"),
+})
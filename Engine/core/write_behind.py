@@ -0,0 +1,261 @@
+from datetime import datetime
+from sqlalchemy import insert, update
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
+from config.config import (
+    MESSAGE_WRITE_BEHIND, WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_FLUSH_INTERVAL,
+    WRITE_BEHIND_MAX_PENDING, WRITE_BEHIND_DRAIN_TIMEOUT,
+)
+from core.database import AsyncSessionLocal
+from core.ids import new_id
+from core.metrics import register_collector
+from models.models import Conversation, Message
+from typing import List, Optional
+import asyncio
+import logging
+
+def message_values(conversation_id: str, role: str, content: str) -> dict:
+    """
+    Column values of a new message. created_at is taken now, at enqueue time,
+    so a conversation's messages keep their order however they are batched.
+    """
+    return {
+        "id": new_id(),
+        "conversation_id": conversation_id,
+        "role": role,
+        "content": content,
+        "created_at": datetime.utcnow(),
+    }
+
+def conversation_values(conversation: Conversation) -> dict:
+    """
+    Column values of a new, not yet added, conversation
+    """
+    return {
+        "id": conversation.id,
+        "user_id": conversation.user_id,
+        "title": conversation.title,
+        "created_at": conversation.created_at,
+        "updated_at": conversation.updated_at,
+    }
+
+def _transient(error: Exception) -> bool:
+    """
+    Whether a failed write may succeed as is once the database is reachable
+    again: a lost or invalidated connection, a lock timeout, an exhausted
+    pool. Anything else (constraint violations, data too long, values that
+    cannot be encoded) fails the same way every time.
+    """
+    if isinstance(error, (OperationalError, InterfaceError, PoolTimeoutError, ConnectionError)):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+class _Write:
+    def __init__(self, conversation_id: str, conversation: Optional[dict], messages: List[dict], updated_at: Optional[datetime]):
+        self.conversation_id = conversation_id
+        self.conversation = conversation
+        self.messages = messages
+        self.updated_at = updated_at
+        self.done = asyncio.get_running_loop().create_future()
+
+class MessageWriter:
+    """
+    In-process queue that persists conversations and messages in batches.
+    A single flusher commits writes in the order they were queued; a batch is
+    flushed once it reaches batch_size or its oldest write is flush_interval old.
+    """
+    def __init__(self, batch_size: int = WRITE_BEHIND_BATCH_SIZE, flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL,
+                 max_pending: int = WRITE_BEHIND_MAX_PENDING, session_factory=AsyncSessionLocal):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.session_factory = session_factory
+        self._buffer = []  # _Write, oldest first
+        self._latest = {}  # conversation_id -> done future of its newest queued write
+        self._wakeup = asyncio.Event()
+        self._flush_now = False
+        self._closing = False
+        self._task = None
+        self.batches = 0
+        self.rows = 0
+        self.errors = 0
+
+    async def submit(self, conversation_id: str, messages: List[dict] = (), conversation: Optional[dict] = None,
+                     updated_at: Optional[datetime] = None):
+        """
+        Queue a new conversation (column values), messages and the conversation's
+        new updated_at. Returns once queued, not once written.
+        """
+        if self._closing:
+            raise RuntimeError("Message writer is shut down")
+        # Backpressure: wait for the oldest writes to land rather than grow without bound.
+        # Only the space matters; if one is dropped, its error is its own caller's.
+        while len(self._buffer) >= self.max_pending:
+            await asyncio.wait([self._buffer[0].done])
+
+        write = _Write(conversation_id, conversation, list(messages), updated_at)
+        self._buffer.append(write)
+        self._latest[conversation_id] = write.done
+        write.done.add_done_callback(lambda _: self._forget(conversation_id, write.done))
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+        if len(self._buffer) == 1 or len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def _forget(self, conversation_id: str, done):
+        if self._latest.get(conversation_id) is done:
+            del self._latest[conversation_id]
+
+    async def wait_for(self, conversation_id: Optional[str] = None):
+        """
+        Wait until the writes queued so far for conversation_id, or for all
+        conversations when None, are committed. Flushes immediately.
+        """
+        if conversation_id is None:
+            pending = [write.done for write in self._buffer] + list(self._latest.values())
+        else:
+            pending = [self._latest[conversation_id]] if conversation_id in self._latest else []
+        pending = [done for done in pending if not done.done()]
+        if not pending:
+            return
+        self._flush_now = True
+        self._wakeup.set()
+        # Failed writes were already logged; readers just see what was stored
+        await asyncio.gather(*(asyncio.shield(done) for done in pending), return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            if not self._buffer:
+                if self._closing:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if len(self._buffer) < self.batch_size and not self._flush_now and not self._closing:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._flush_now = False
+            batch = self._buffer[:self.batch_size]
+            del self._buffer[:len(batch)]
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[_Write]):
+        """
+        Write a batch, retrying transient failures in place so later writes
+        never overtake it. If the database rejects the batch, its writes are
+        retried one by one and only the offending ones are dropped.
+        """
+        delay = 0.1
+        while True:
+            try:
+                await self._write(batch)
+                break
+            except Exception as e:
+                if not _transient(e):
+                    logging.warning(f"Write-behind batch rejected, retrying writes one by one: {str(e)}")
+                    await self._write_each(batch)
+                    return
+                self.errors += 1
+                logging.error(f"Write-behind flush failed, retrying in {delay:.1f}s: {str(e)}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5)
+        for write in batch:
+            write.done.set_result(None)
+
+    async def _write_each(self, batch: List[_Write]):
+        for write in batch:
+            delay = 0.1
+            while True:
+                try:
+                    await self._write([write])
+                    write.done.set_result(None)
+                    break
+                except Exception as e:
+                    if not _transient(e):
+                        # e.g. the conversation was deleted while its messages were queued
+                        self.errors += 1
+                        logging.error(f"Dropped write-behind write for conversation {write.conversation_id}: {str(e)}")
+                        write.done.set_exception(e)
+                        write.done.exception()  # Marks it retrieved; readers do not need it
+                        break
+                    self.errors += 1
+                    logging.error(f"Write-behind flush failed, retrying in {delay:.1f}s: {str(e)}")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 5)
+
+    async def _write(self, batch: List[_Write]):
+        conversations = [write.conversation for write in batch if write.conversation]
+        messages = [message for write in batch for message in write.messages]
+        # Only the newest timestamp per conversation needs writing
+        updated = {}
+        for write in batch:
+            if write.updated_at is not None:
+                updated[write.conversation_id] = write.updated_at
+
+        async with self.session_factory() as db:
+            try:
+                if conversations:
+                    await db.execute(insert(Conversation), conversations)
+                if messages:
+                    await db.execute(insert(Message), messages)
+                if updated:
+                    await db.execute(
+                        update(Conversation),
+                        [{"id": conversation_id, "updated_at": updated_at} for conversation_id, updated_at in updated.items()]
+                    )
+                await db.commit()
+            except BaseException:
+                await db.rollback()
+                raise
+        self.batches += 1
+        self.rows += len(conversations) + len(messages)
+
+    async def close(self, timeout: float = WRITE_BEHIND_DRAIN_TIMEOUT):
+        """
+        Flush everything queued and stop the flusher
+        """
+        self._closing = True
+        self._wakeup.set()
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except asyncio.TimeoutError:
+            logging.error(f"Write-behind drain timed out with {len(self._buffer)} writes still queued")
+            self._task.cancel()
+
+    def stats(self) -> dict:
+        return {"pending": len(self._buffer), "batches": self.batches, "rows": self.rows, "errors": self.errors}
+
+# Built on first use when MESSAGE_WRITE_BEHIND is on
+_writer = None
+
+def get_message_writer() -> Optional[MessageWriter]:
+    """
+    Get the write-behind queue, or None when messages are written inline
+    """
+    global _writer
+    if _writer is None and MESSAGE_WRITE_BEHIND:
+        _writer = MessageWriter()
+    return _writer
+
+async def wait_for_writes(conversation_id: Optional[str] = None):
+    """
+    Read-your-writes barrier: call before reading a conversation (or, with
+    no id, a conversation list) that this worker may still be writing
+    """
+    if _writer is not None:
+        await _writer.wait_for(conversation_id)
+
+async def close_message_writer():
+    """
+    Drain the write-behind queue, if one was created
+    """
+    global _writer
+    if _writer is not None:
+        await _writer.close()
+    _writer = None
+
+register_collector("write_behind", lambda: _writer.stats() if _writer is not None else None)
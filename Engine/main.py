@@ -1,10 +1,19 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from mangum import Mangum
-from routes import user_routes, chat_routes, conversation_routes
-from core.database import Base, engine
+from routes import user_routes, chat_routes, conversation_routes, search_routes, export_routes, metrics_routes, ws_routes
+from core.database import dispose_engine
+from core.chat_service import close_openrouter_client
+from core.response_cache import close_response_cache
+from core.rate_limit import close_rate_limiter
+from core.write_behind import close_message_writer
+from core.compaction import close_compactor
+from core.context import start_loading_encoding
+from core.metrics import add_metrics
 
-app = FastAPI(root_path="/api")
+# Responses still validated against a response_model are serialized with orjson too
+app = FastAPI(root_path="/api", default_response_class=ORJSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
@@ -13,12 +22,36 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],  # Read by the client on 429
 )
 
+# Request latency per route, exposed with the other metrics at /metrics
+add_metrics(app)
+
 # Include routers
 app.include_router(user_routes.router)
 app.include_router(chat_routes.router)
 app.include_router(conversation_routes.router)
+app.include_router(search_routes.router)
+app.include_router(export_routes.router)
+app.include_router(metrics_routes.router)
+app.include_router(ws_routes.router)
+
+@app.on_event("startup")
+async def startup():
+    # The tokenizer loads in the background; prompts are sized by estimate until then
+    start_loading_encoding()
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Background compactions still need the upstream client and the database
+    await close_compactor()
+    # Close pooled upstream and database connections
+    await close_openrouter_client()
+    await close_response_cache()
+    await close_rate_limiter()
+    await close_message_writer()
+    await dispose_engine()
 
 # Create handler for serverless
 handler = Mangum(app)
\ No newline at end of file
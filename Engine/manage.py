@@ -0,0 +1,113 @@
+"""
+Deployment tasks that must not run on every cold start.
+
+    python manage.py init-db       Create missing tables and indexes
+    python manage.py migrate-ids   Convert string ids to binary (stop the app and back up first)
+    python manage.py export-user USER_ID [--output FILE] [--gzip]
+                                   Write a user's conversations as NDJSON, e.g. for a compliance request
+    python manage.py archive-conversations [--older-than DAYS]
+                                   Move conversations idle for DAYS (default ARCHIVE_AFTER_DAYS) into compressed archives
+    python manage.py train-dictionary --output FILE [--samples N] [--size BYTES]
+                                   Build a message compression dictionary from recent assistant replies
+    python manage.py compress-messages
+                                   Rewrite stored messages to match the MESSAGE_COMPRESSION_* settings
+"""
+import argparse
+import asyncio
+import sys
+import models.models  # Registers the tables on Base.metadata
+from core.database import init_db, dispose_engine
+from core.id_migration import migrate_ids
+
+async def run_init_db(args):
+    try:
+        await init_db()
+    finally:
+        await dispose_engine()
+
+async def run_migrate_ids(args):
+    try:
+        await migrate_ids()
+    finally:
+        await dispose_engine()
+
+async def run_export_user(args):
+    from core.export import export_user, gzip_chunks
+    from core.ids import normalize_id
+
+    user_id = normalize_id(args.user_id or "")
+    if user_id is None:
+        sys.exit("export-user needs a valid USER_ID")
+    chunks = export_user(user_id)
+    if args.gzip:
+        chunks = gzip_chunks(chunks)
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        async for chunk in chunks:
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+        await dispose_engine()
+
+async def run_archive_conversations(args):
+    from datetime import datetime, timedelta
+    from config.config import ARCHIVE_AFTER_DAYS
+    from core.archive import archive_stale
+
+    days = args.older_than if args.older_than is not None else ARCHIVE_AFTER_DAYS
+    if days <= 0:
+        sys.exit("archive-conversations needs --older-than DAYS or ARCHIVE_AFTER_DAYS")
+    try:
+        archived = await archive_stale(datetime.utcnow() - timedelta(days=days))
+        print(f"Archived {archived} conversations not updated in {days} days")
+    finally:
+        await dispose_engine()
+
+async def run_train_dictionary(args):
+    from config.config import MESSAGE_COMPRESSION_MIN_BYTES
+    from core.compression import train_dictionary
+    from core.content_migration import sample_messages
+
+    if not args.output:
+        sys.exit("train-dictionary needs --output FILE")
+    try:
+        samples = await sample_messages(args.samples, MESSAGE_COMPRESSION_MIN_BYTES)
+    finally:
+        await dispose_engine()
+    if not samples:
+        sys.exit(f"No assistant messages of {MESSAGE_COMPRESSION_MIN_BYTES} bytes or more to train on")
+    dictionary = train_dictionary(samples, args.size)
+    with open(args.output, "wb") as output:
+        output.write(dictionary)
+    print(f"Wrote a {len(dictionary)} byte dictionary trained on {len(samples)} messages to {args.output}")
+
+async def run_compress_messages(args):
+    from core.content_migration import compress_messages
+
+    try:
+        counts = await compress_messages()
+        print(f"Scanned {counts['scanned']} messages, rewrote {counts['rewritten']}")
+    finally:
+        await dispose_engine()
+
+COMMANDS = {
+    "init-db": run_init_db,
+    "migrate-ids": run_migrate_ids,
+    "export-user": run_export_user,
+    "archive-conversations": run_archive_conversations,
+    "train-dictionary": run_train_dictionary,
+    "compress-messages": run_compress_messages,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TSF Chat management commands")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    parser.add_argument("user_id", nargs="?", help="For export-user")
+    parser.add_argument("--output", help="export-user: file to write instead of stdout; train-dictionary: dictionary file")
+    parser.add_argument("--gzip", action="store_true", help="export-user: gzip the output")
+    parser.add_argument("--older-than", type=int, help="archive-conversations: days since the last update")
+    parser.add_argument("--samples", type=int, default=5000, help="train-dictionary: messages to learn from")
+    parser.add_argument("--size", type=int, default=32 * 1024, help="train-dictionary: dictionary size in bytes")
+    args = parser.parse_args()
+    asyncio.run(COMMANDS[args.command](args))
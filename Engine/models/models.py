@@ -1,12 +1,15 @@
-from sqlalchemy import Column, String, DateTime, Text, ForeignKey
+from sqlalchemy import Column, String, DateTime, Text, Integer, ForeignKey, Index, LargeBinary
+from sqlalchemy.dialects import mysql
 from sqlalchemy.orm import relationship
 from core.database import Base
+from core.compression import CompressedText
+from core.ids import CompactId
 from datetime import datetime
 
 class User(Base):
     __tablename__ = "users"
 
-    id = Column(String(10), primary_key=True, index=True)
+    id = Column(CompactId, primary_key=True, index=True)
     username = Column(String(50), unique=True, index=True)
     email = Column(String(100), unique=True, index=True)
     hashed_password = Column(String(255))
@@ -17,24 +20,72 @@ class User(Base):
 class Conversation(Base):
     __tablename__ = "conversations"
     
-    id = Column(String(36), primary_key=True)
-    user_id = Column(String(10), ForeignKey("users.id"), nullable=False)
+    id = Column(CompactId, primary_key=True)
+    user_id = Column(CompactId, ForeignKey("users.id"), nullable=False)
     title = Column(String(200), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    # Relationships
+    # Relationships; children are removed by the database or by core.deletion, never loaded to be deleted
     user = relationship("User", back_populates="conversations")
-    messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
+    messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan", passive_deletes=True)
+    summary = relationship("ConversationSummary", back_populates="conversation", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+    
+    __table_args__ = (
+        # Serves the keyset-paginated conversation list
+        Index("ix_conversations_user_updated", "user_id", "updated_at"),
+        # Title search on MySQL; SQLite uses the FTS5 tables from core.search
+        Index("ft_conversations_title", "title", mysql_prefix="FULLTEXT").ddl_if(dialect="mysql"),
+    )
 
 class Message(Base):
     __tablename__ = "messages"
     
-    id = Column(String(36), primary_key=True)
-    conversation_id = Column(String(36), ForeignKey("conversations.id"), nullable=False)
+    id = Column(CompactId, primary_key=True)
+    conversation_id = Column(CompactId, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False)
     role = Column(String(10), nullable=False)  # 'user' or 'assistant'
-    content = Column(Text, nullable=False)
+    content = Column(CompressedText, nullable=False)  # Compressed above a size threshold, see core.compression
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
     conversation = relationship("Conversation", back_populates="messages")
+    
+    __table_args__ = (
+        # Serves last-message previews and keyset-paginated message histories
+        Index("ix_messages_conversation_created", "conversation_id", "created_at"),
+        # Message search on MySQL; SQLite uses the FTS5 tables from core.search
+        Index("ft_messages_content", "content", mysql_prefix="FULLTEXT").ddl_if(dialect="mysql"),
+    )
+
+class ConversationSummary(Base):
+    __tablename__ = "conversation_summaries"
+    
+    conversation_id = Column(CompactId, ForeignKey("conversations.id", ondelete="CASCADE"), primary_key=True)
+    content = Column(Text, nullable=False)
+    # Keyset position of the newest message folded into the summary; later messages are sent verbatim
+    through_created_at = Column(DateTime, nullable=False)
+    through_message_id = Column(CompactId, nullable=False)
+    message_count = Column(Integer, nullable=False, default=0)  # Messages folded in so far
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    conversation = relationship("Conversation", back_populates="summary")
+
+class ConversationArchive(Base):
+    __tablename__ = "conversation_archives"
+    
+    # A conversation keeps its id in the archive and when it is restored
+    conversation_id = Column(CompactId, primary_key=True)
+    user_id = Column(CompactId, ForeignKey("users.id"), nullable=False)
+    title = Column(String(200), nullable=False)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    message_count = Column(Integer, nullable=False, default=0)
+    # zlib-compressed NDJSON message records, in the core.export format
+    content = Column(LargeBinary().with_variant(mysql.LONGBLOB(), "mysql"), nullable=False)
+    
+    __table_args__ = (
+        # Serves the keyset-paginated archive list
+        Index("ix_conversation_archives_user_archived", "user_id", "archived_at"),
+    )
@@ -1,21 +1,32 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
-import uuid
+import anyio
+import json
+import logging
+import time
+from typing import Optional
 from schemas.schemas import ChatRequest, ChatResponse
-from core.auth import verify_token
-from core.chat_service import get_openrouter_response
-from core.database import SessionLocal
-from models.models import User, Conversation, Message
+from core.auth import verify_token, user_exists
+from core.chat_service import get_openrouter_response, stream_openrouter_response, COMPLETION_MAX_TOKENS
+from core.context import get_prompt_history, record_turn
+from core.compaction import maybe_compact
+from core.events import log_event
+from core.local_responder import local_reply
+from core.rate_limit import check_rate_limit
+from core.write_behind import get_message_writer, message_values, conversation_values
+from core.ids import new_id
+from core.database import AsyncSessionLocal
+from routes.conversation_routes import get_user_conversation
+from models.models import Conversation, Message
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 def generate_conversation_title(first_message: str) -> str:
     """Generate a conversation title from the first message"""
@@ -29,7 +40,7 @@ def generate_conversation_title(first_message: str) -> str:
 async def chat(
     chat_request: ChatRequest,
     user_id: str = Depends(verify_token),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Chat endpoint that accepts user message and returns Gemini AI response
@@ -40,65 +51,100 @@ async def chat(
         conversation_id = chat_request.conversation_id
         
         # Check if user exists
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
+        if not await user_exists(db, user_id):
             raise HTTPException(status_code=404, detail="User not found")
         
         # If no conversation_id provided, create a new conversation
-        if not conversation_id:
+        new_conversation = not conversation_id
+        if new_conversation:
             conversation_title = generate_conversation_title(user_message)
+            created_at = datetime.utcnow()
             conversation = Conversation(
-                id=str(uuid.uuid4()),
+                id=new_id(),
                 user_id=user_id,
-                title=conversation_title
+                title=conversation_title,
+                created_at=created_at,
+                updated_at=created_at
             )
-            db.add(conversation)
-            db.commit()
-            db.refresh(conversation)
             conversation_id = conversation.id
         else:
             # Verify the conversation belongs to the user
-            conversation = db.query(Conversation).filter(
-                Conversation.id == conversation_id,
-                Conversation.user_id == user_id
-            ).first()
+            conversation = await get_user_conversation(db, conversation_id, user_id)
+        
+        # Trivial prompts like "hi" or "thanks" are answered without the model or its history
+        local_response = local_reply(user_message)
+        if local_response is None:
+            # Load prior turns before the new message is added
+            history = await get_prompt_history(db, conversation, user_message)
             
-            if not conversation:
-                raise HTTPException(status_code=404, detail="Conversation not found")
+            # Reject or queue over-limit requests before anything is stored or sent upstream
+            await check_rate_limit(user_id, user_message, history, COMPLETION_MAX_TOKENS)
+        else:
+            history = []
         
-        # Save user message
-        user_msg = Message(
-            id=str(uuid.uuid4()),
-            conversation_id=conversation_id,
-            role="user",
-            content=user_message
-        )
-        db.add(user_msg)
+        writer = get_message_writer()
+        if writer is not None:
+            # Queued for a batched write; nothing touches the database on the response path
+            await writer.submit(
+                conversation_id,
+                [message_values(conversation_id, "user", user_message)],
+                conversation=conversation_values(conversation) if new_conversation else None
+            )
+        else:
+            if new_conversation:
+                db.add(conversation)
+            
+            # Save user message
+            user_msg = Message(
+                id=new_id(),
+                conversation_id=conversation_id,
+                role="user",
+                content=user_message
+            )
+            db.add(user_msg)
+            
+            # Commit now so no pooled connection is held while waiting on the model
+            await db.commit()
         
         # Get AI response with better error handling
-        print(f"Calling API response for message: {user_message}")  # Debug log
-        
+        started = time.perf_counter()
         try:
-            ai_response = await get_openrouter_response(user_message)
-            print(f"Received API response: {ai_response[:100]}...")  # Debug log
+            if local_response is not None:
+                ai_response = local_response
+            else:
+                ai_response = await get_openrouter_response(user_message, history)
         except Exception as api_error:
-            print(f"API error: {str(api_error)}")  # Debug log
+            log_event("chat.upstream_error", logging.WARNING, conversation_id=conversation_id, error=str(api_error))
             # Provide a fallback response if API fails
             ai_response = "I'm currently experiencing technical difficulties. Please try again in a few moments, or contact support if the issue persists."
         
-        # Save AI response
-        ai_msg = Message(
-            id=str(uuid.uuid4()),
-            conversation_id=conversation_id,
-            role="assistant",
-            content=ai_response
+        # Update conversation's updated_at timestamp along with the AI response
+        updated_at = datetime.utcnow()
+        if writer is not None:
+            await writer.submit(
+                conversation_id,
+                [message_values(conversation_id, "assistant", ai_response)],
+                updated_at=updated_at
+            )
+        else:
+            # Save AI response
+            ai_msg = Message(
+                id=new_id(),
+                conversation_id=conversation_id,
+                role="assistant",
+                content=ai_response
+            )
+            db.add(ai_msg)
+            conversation.updated_at = updated_at
+            
+            await db.commit()
+        record_turn(conversation_id, user_message, ai_response, updated_at)
+        maybe_compact(conversation_id)
+        log_event(
+            "chat.completed", conversation_id=conversation_id, history_messages=len(history),
+            message_chars=len(user_message), response_chars=len(ai_response), local=local_response is not None,
+            upstream_ms=round((time.perf_counter() - started) * 1000, 1)
         )
-        db.add(ai_msg)
-        
-        # Update conversation's updated_at timestamp
-        conversation.updated_at = datetime.utcnow()
-        
-        db.commit()
         
         return ChatResponse(
             response=ai_response,
@@ -111,38 +157,174 @@ async def chat(
         # Re-raise HTTP exceptions as-is
         raise
     except Exception as e:
-        print(f"Chat error: {str(e)}")  # Debug log
+        log_event("chat.error", logging.ERROR, conversation_id=chat_request.conversation_id, error=str(e))
         raise HTTPException(status_code=500, detail=f"Chat service error: {str(e)}")
 
-@router.delete('/conversations/{conversation_id}')
-async def delete_conversation(
-    conversation_id: str,
-    user_id: str = Depends(verify_token),
-    db: Session = Depends(get_db)
-):
+def format_sse(event: str, data: dict) -> str:
+    """Format a single Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def save_assistant_message(conversation_id: str, content: str):
+    """
+    Persist an assistant message outside of the request-scoped session.
+    Returns the conversation's new updated_at, or None if the write failed.
+    """
+    writer = get_message_writer()
+    if writer is not None:
+        try:
+            updated_at = datetime.utcnow()
+            await writer.submit(conversation_id, [message_values(conversation_id, "assistant", content)], updated_at=updated_at)
+            return updated_at
+        except Exception as e:
+            log_event("chat.stream_save_error", logging.ERROR, conversation_id=conversation_id, error=str(e))
+            return None
+    
+    async with AsyncSessionLocal() as db:
+        try:
+            updated_at = datetime.utcnow()
+            db.add(Message(
+                id=new_id(),
+                conversation_id=conversation_id,
+                role="assistant",
+                content=content
+            ))
+            await db.execute(
+                update(Conversation).where(Conversation.id == conversation_id).values(updated_at=updated_at)
+            )
+            await db.commit()
+            return updated_at
+        except Exception as e:
+            await db.rollback()
+            log_event("chat.stream_save_error", logging.ERROR, conversation_id=conversation_id, error=str(e))
+            return None
+
+async def single_chunk(content: str):
+    """Stream a reply that is already complete as one delta"""
+    yield content
+
+async def chat_events(user_message: str, conversation_id: str, history: list, local_response: Optional[str] = None):
     """
-    Delete a conversation and all associated messages
+    Yield the (event, data) pairs of a streamed reply and persist the
+    assembled reply. If the consumer goes away mid-stream the partial reply
+    is still saved. A local reply is sent as a single delta without asking
+    the model.
     """
+    chunks = []
     try:
-        current_user_id = user_id
-        # Check if conversation exists and belongs to user
-        conversation = db.query(Conversation).filter_by(
-            id=conversation_id, 
-            user_id=current_user_id
-        ).first()
-        
-        if not conversation:
-            return {"error": "Conversation not found"}, 404
-            
-        # Delete all messages first
-        db.query(Message).filter_by(conversation_id=conversation_id).delete()
-        
-        # Delete the conversation
-        db.delete(conversation)
-        db.commit()
+        yield "meta", {"conversation_id": conversation_id, "question": user_message}
         
-        return {"message": "Conversation deleted successfully"}, 200
+        if local_response is not None:
+            deltas = single_chunk(local_response)
+        else:
+            deltas = stream_openrouter_response(user_message, history)
+        async for delta in deltas:
+            chunks.append(delta)
+            yield "delta", {"content": delta}
         
+        yield "done", {
+            "conversation_id": conversation_id,
+            "created_at": datetime.utcnow().isoformat()
+        }
     except Exception as e:
-        db.rollback()
-        return {"error": str(e)}, 500
+        log_event("chat.stream_error", logging.WARNING, conversation_id=conversation_id, error=str(e))
+        yield "error", {"detail": "The response was interrupted. Please try again."}
+    finally:
+        # Runs on completion, upstream failure and client disconnect alike
+        if chunks:
+            ai_response = "".join(chunks)
+            # Shielded so the write completes even when the stream was cancelled
+            with anyio.CancelScope(shield=True):
+                updated_at = await save_assistant_message(conversation_id, ai_response)
+            if updated_at:
+                record_turn(conversation_id, user_message, ai_response, updated_at)
+                maybe_compact(conversation_id)
+
+async def stream_chat_events(user_message: str, conversation_id: str, history: list, local_response: Optional[str] = None):
+    """
+    Forward a streamed reply as SSE frames
+    """
+    events = chat_events(user_message, conversation_id, history, local_response)
+    try:
+        async for event, data in events:
+            yield format_sse(event, data)
+    finally:
+        # Close the inner stream now, so a partial reply is saved when the client disconnects
+        await events.aclose()
+
+async def save_user_message(db: AsyncSession, conversation: Conversation, new_conversation: bool, user_message: str):
+    """
+    Store the user's message, and the conversation if it is new, before a
+    reply is streamed, so it is kept even if the client goes away
+    """
+    conversation_id = conversation.id
+    writer = get_message_writer()
+    if writer is not None:
+        await writer.submit(
+            conversation_id,
+            [message_values(conversation_id, "user", user_message)],
+            conversation=conversation_values(conversation) if new_conversation else None,
+            updated_at=datetime.utcnow()
+        )
+    else:
+        # Also attaches a conversation loaded by an earlier session
+        db.add(conversation)
+        db.add(Message(
+            id=new_id(),
+            conversation_id=conversation_id,
+            role="user",
+            content=user_message
+        ))
+        conversation.updated_at = datetime.utcnow()
+        await db.commit()
+
+@router.post("/chat/stream")
+async def chat_stream(
+    chat_request: ChatRequest,
+    user_id: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Streaming variant of the chat endpoint.
+    Returns the AI response as Server-Sent Events while it is being generated.
+    """
+    user_message = chat_request.message
+    conversation_id = chat_request.conversation_id
+    
+    # Check if user exists
+    if not await user_exists(db, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    new_conversation = not conversation_id
+    if new_conversation:
+        created_at = datetime.utcnow()
+        conversation = Conversation(
+            id=new_id(),
+            user_id=user_id,
+            title=generate_conversation_title(user_message),
+            created_at=created_at,
+            updated_at=created_at
+        )
+        conversation_id = conversation.id
+    else:
+        # Verify the conversation belongs to the user
+        conversation = await get_user_conversation(db, conversation_id, user_id)
+    
+    # Trivial prompts like "hi" or "thanks" are answered without the model or its history
+    local_response = local_reply(user_message)
+    if local_response is None:
+        # Load prior turns before the new message is added
+        history = await get_prompt_history(db, conversation, user_message)
+        
+        # Reject or queue over-limit requests before anything is stored or sent upstream
+        await check_rate_limit(user_id, user_message, history, COMPLETION_MAX_TOKENS)
+    else:
+        history = []
+    
+    # Save user message before streaming so it is stored even if the client goes away
+    await save_user_message(db, conversation, new_conversation, user_message)
+    
+    return StreamingResponse(
+        stream_chat_events(user_message, conversation_id, history, local_response),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,85 +1,249 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-import uuid
-from models.models import User, Conversation, Message
-from schemas.schemas import ConversationOut, ConversationListOut, NewConversationRequest
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from models.models import Conversation, ConversationArchive, Message
+from schemas.schemas import (
+    ConversationOut, ConversationPage, MessagePage, NewConversationRequest,
+    BulkDeleteRequest, BulkDeleteResult, ArchivePage,
+)
+from config.config import PAGE_SIZE, MAX_PAGE_SIZE
 from core.auth import verify_token
-from core.database import SessionLocal
+from core.compression import message_text
+from core.pagination import encode_cursor, before_cursor
+from core.archive import archive_conversation, restore_conversation
+from core.deletion import delete_conversations
+from core.events import log_event
+from core.ids import new_id
+from core.write_behind import wait_for_writes
+from core.database import AsyncSessionLocal
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-@router.get("/conversations", response_model=List[ConversationListOut])
-def get_conversations(current_user_id: str = Depends(verify_token), db: Session = Depends(get_db)):
-    """Get all conversations for the current user"""
-    conversations = db.query(Conversation).filter(
+# Preview length shown in the sidebar; one extra character tells us to add "..."
+PREVIEW_LENGTH = 50
+
+@router.get("/conversations", response_model=ConversationPage)
+async def get_conversations(
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user_id: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get a page of conversations for the current user, most recently updated first"""
+    # Read-your-writes when chat messages are persisted in the background
+    await wait_for_writes()
+    
+    # Fetch the start of each conversation's last message in the same query
+    last_message = select(func.substr(message_text(Message.content), 1, PREVIEW_LENGTH + 1)).where(
+        Message.conversation_id == Conversation.id
+    ).order_by(Message.created_at.desc(), Message.id.desc()).limit(1).correlate(Conversation).scalar_subquery()
+    
+    query = select(
+        Conversation.id,
+        Conversation.title,
+        Conversation.created_at,
+        Conversation.updated_at,
+        last_message
+    ).where(
         Conversation.user_id == current_user_id
-    ).order_by(Conversation.updated_at.desc()).all()
-    
-    result = []
-    for conv in conversations:
-        # Get the last message for preview
-        last_message = db.query(Message).filter(
-            Message.conversation_id == conv.id
-        ).order_by(Message.created_at.desc()).first()
+    )
+    if cursor:
+        query = query.where(before_cursor(Conversation.updated_at, Conversation.id, cursor))
+    
+    # One extra row tells us whether another page exists
+    rows = (await db.execute(
+        query.order_by(Conversation.updated_at.desc(), Conversation.id.desc()).limit(limit + 1)
+    )).all()
+    
+    # Plain dicts from trusted rows, returned as a response so FastAPI skips re-validating them
+    items = []
+    for conv_id, title, created_at, updated_at, preview in rows[:limit]:
+        if preview and len(preview) > PREVIEW_LENGTH:
+            preview = preview[:PREVIEW_LENGTH] + "..."
         
-        result.append(ConversationListOut(
-            id=conv.id,
-            title=conv.title,
-            created_at=conv.created_at,
-            updated_at=conv.updated_at,
-            last_message=last_message.content[:50] + "..." if last_message and len(last_message.content) > 50 else last_message.content if last_message else None
-        ))
-    
-    return result
+        items.append({
+            "id": conv_id,
+            "title": title,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "last_message": preview
+        })
+    
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(items[-1]["updated_at"], items[-1]["id"])
+    
+    return ORJSONResponse({"items": items, "next_cursor": next_cursor})
 
-@router.get("/conversations/{conversation_id}", response_model=ConversationOut)
-def get_conversation(conversation_id: str, current_user_id: str = Depends(verify_token), db: Session = Depends(get_db)):
-    """Get a specific conversation with all messages"""
-    conversation = db.query(Conversation).filter(
+async def get_message_page(db: AsyncSession, conversation_id: str, limit: int, cursor: Optional[str] = None):
+    """
+    Get up to limit messages older than cursor as MessageOut-shaped dicts,
+    in chronological order, and the cursor for the page before them.
+    Columns are selected rather than entities, so no ORM objects are built.
+    """
+    query = select(Message.id, Message.role, Message.content, Message.created_at).where(
+        Message.conversation_id == conversation_id
+    )
+    if cursor:
+        query = query.where(before_cursor(Message.created_at, Message.id, cursor))
+    
+    rows = (await db.execute(
+        query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1)
+    )).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id)
+    
+    messages = [
+        {"id": message_id, "role": role, "content": content, "created_at": created_at}
+        for message_id, role, content, created_at in reversed(rows[:limit])
+    ]
+    return messages, next_cursor
+
+async def get_user_conversation(db: AsyncSession, conversation_id: str, user_id: str) -> Conversation:
+    """Get a conversation owned by the user or raise 404"""
+    await wait_for_writes(conversation_id)
+    conversation = (await db.execute(select(Conversation).where(
         Conversation.id == conversation_id,
-        Conversation.user_id == current_user_id
-    ).first()
+        Conversation.user_id == user_id
+    ))).scalars().first()
     
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
     return conversation
 
+@router.get("/conversations/{conversation_id}", response_model=ConversationOut)
+async def get_conversation(
+    conversation_id: str,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user_id: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get a specific conversation with its most recent messages"""
+    conversation = await get_user_conversation(db, conversation_id, current_user_id)
+    messages, next_cursor = await get_message_page(db, conversation_id, limit)
+    
+    return ORJSONResponse({
+        "id": conversation.id,
+        "title": conversation.title,
+        "created_at": conversation.created_at,
+        "updated_at": conversation.updated_at,
+        "messages": messages,
+        "next_cursor": next_cursor
+    })
+
+@router.get("/conversations/{conversation_id}/messages", response_model=MessagePage)
+async def get_older_messages(
+    conversation_id: str,
+    cursor: str,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user_id: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """Load the page of messages that precede cursor"""
+    await get_user_conversation(db, conversation_id, current_user_id)
+    messages, next_cursor = await get_message_page(db, conversation_id, limit, cursor)
+    
+    return ORJSONResponse({"items": messages, "next_cursor": next_cursor})
+
 @router.post("/conversations", response_model=ConversationOut)
-def create_conversation(request: NewConversationRequest, current_user_id: str = Depends(verify_token), db: Session = Depends(get_db)):
+async def create_conversation(request: NewConversationRequest, current_user_id: str = Depends(verify_token), db: AsyncSession = Depends(get_db)):
     """Create a new conversation"""
     conversation = Conversation(
-        id=str(uuid.uuid4()),
+        id=new_id(),
         user_id=current_user_id,
         title=request.title
     )
     
     db.add(conversation)
-    db.commit()
-    db.refresh(conversation)
+    await db.commit()
     
-    return conversation
+    # A new conversation has no messages; avoid a lazy load of the relationship
+    return ConversationOut(
+        id=conversation.id,
+        title=conversation.title,
+        created_at=conversation.created_at,
+        updated_at=conversation.updated_at,
+        messages=[]
+    )
 
 @router.delete("/conversations/{conversation_id}")
-def delete_conversation(conversation_id: str, current_user_id: str = Depends(verify_token), db: Session = Depends(get_db)):
-    """Delete a conversation and all its messages"""
-    conversation = db.query(Conversation).filter(
-        Conversation.id == conversation_id,
-        Conversation.user_id == current_user_id
-    ).first()
+async def delete_conversation(conversation_id: str, current_user_id: str = Depends(verify_token), db: AsyncSession = Depends(get_db)):
+    """Delete a conversation, live or archived, and all its messages"""
+    if not await delete_conversations(db, current_user_id, [conversation_id]):
+        raise HTTPException(status_code=404, detail="Conversation not found")
     
-    if not conversation:
+    return {"message": "Conversation deleted successfully"}
+
+@router.post("/conversations/bulk-delete", response_model=BulkDeleteResult)
+async def bulk_delete_conversations(request: BulkDeleteRequest, current_user_id: str = Depends(verify_token), db: AsyncSession = Depends(get_db)):
+    """Delete several conversations at once; ids that are not the user's are skipped"""
+    deleted = await delete_conversations(db, current_user_id, request.ids)
+    log_event("conversations.bulk_deleted", requested=len(request.ids), deleted=deleted)
+    return BulkDeleteResult(deleted=deleted)
+
+@router.post("/conversations/{conversation_id}/archive")
+async def archive_user_conversation(conversation_id: str, current_user_id: str = Depends(verify_token), db: AsyncSession = Depends(get_db)):
+    """Move a conversation out of the live tables into a compressed archive"""
+    if not await archive_conversation(db, conversation_id, current_user_id):
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    db.delete(conversation)
-    db.commit()
+    return {"message": "Conversation archived successfully"}
+
+@router.get("/archives", response_model=ArchivePage)
+async def get_archives(
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user_id: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get a page of the current user's archived conversations, most recently archived first"""
+    query = select(
+        ConversationArchive.conversation_id,
+        ConversationArchive.title,
+        ConversationArchive.created_at,
+        ConversationArchive.updated_at,
+        ConversationArchive.archived_at,
+        ConversationArchive.message_count
+    ).where(ConversationArchive.user_id == current_user_id)
+    if cursor:
+        query = query.where(before_cursor(ConversationArchive.archived_at, ConversationArchive.conversation_id, cursor))
     
-    return {"message": "Conversation deleted successfully"}
+    # One extra row tells us whether another page exists
+    rows = (await db.execute(
+        query.order_by(ConversationArchive.archived_at.desc(), ConversationArchive.conversation_id.desc()).limit(limit + 1)
+    )).all()
+    
+    items = [
+        {
+            "id": conv_id,
+            "title": title,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "archived_at": archived_at,
+            "message_count": message_count
+        }
+        for conv_id, title, created_at, updated_at, archived_at, message_count in rows[:limit]
+    ]
+    
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(items[-1]["archived_at"], items[-1]["id"])
+    
+    return ORJSONResponse({"items": items, "next_cursor": next_cursor})
+
+@router.post("/archives/{conversation_id}/restore")
+async def restore_archived_conversation(conversation_id: str, current_user_id: str = Depends(verify_token), db: AsyncSession = Depends(get_db)):
+    """Move an archived conversation back into the conversation list"""
+    if not await restore_conversation(db, current_user_id, conversation_id):
+        raise HTTPException(status_code=404, detail="Archived conversation not found")
+    
+    return {"message": "Conversation restored successfully"}
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from schemas.schemas import ImportResult
+from core.auth import verify_token, user_exists
+from core.export import export_user, gzip_chunks, import_user
+from core.events import log_event
+from core.database import AsyncSessionLocal
+
+router = APIRouter()
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+@router.get("/export")
+async def export_conversations(gzip: bool = False, current_user_id: str = Depends(verify_token)):
+    """Download all of the current user's conversations and messages as NDJSON, optionally gzipped"""
+    filename = f"tsf-chat-export-{datetime.utcnow():%Y%m%d}.ndjson"
+    chunks = export_user(current_user_id)
+    media_type = "application/x-ndjson"
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        media_type = "application/gzip"
+        filename += ".gz"
+    log_event("export.started", gzip=gzip)
+    return StreamingResponse(
+        chunks, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.post("/import", response_model=ImportResult)
+async def import_conversations(
+    request: Request,
+    current_user_id: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """Import conversations from an NDJSON export (plain or gzipped) sent as the request body"""
+    if not await user_exists(db, current_user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    counts = await import_user(db, current_user_id, request.stream())
+    log_event("import.completed", **counts)
+    return ImportResult(**counts)
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from config.config import METRICS_ENABLED, METRICS_TOKEN, METRICS_PUBLIC
+from core.metrics import CONTENT_TYPE, render
+import hmac
+
+router = APIRouter()
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Expose request, database and upstream metrics in the Prometheus text format"""
+    # Private unless a scrape token is configured or it is explicitly made public
+    if not METRICS_ENABLED or not (METRICS_TOKEN or METRICS_PUBLIC):
+        raise HTTPException(status_code=404, detail="Not Found")
+    if METRICS_TOKEN:
+        supplied = request.headers.get("authorization", "")
+        if not hmac.compare_digest(supplied.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+            raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(render(), media_type=CONTENT_TYPE)
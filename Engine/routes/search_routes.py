@@ -0,0 +1,65 @@
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from schemas.schemas import SearchPage
+from config.config import MAX_PAGE_SIZE
+from core.auth import verify_token
+from core.pagination import encode_offset_cursor, decode_offset_cursor
+from core.search import parse_terms, make_snippet, search_messages, search_conversations
+from core.write_behind import wait_for_writes
+from core.events import log_event
+from core.database import AsyncSessionLocal
+
+router = APIRouter()
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+SEARCH_PAGE_SIZE = 20
+# Matching conversation titles listed above the message hits
+TITLE_HITS = 5
+
+@router.get("/search", response_model=SearchPage)
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user_id: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """Search the current user's messages and conversation titles, best match first"""
+    terms = parse_terms(q)
+    if not terms:
+        return ORJSONResponse({"query": q, "conversations": [], "items": [], "next_cursor": None})
+
+    offset = decode_offset_cursor(cursor) if cursor else 0
+    # Messages still queued for write-behind are not indexed yet
+    await wait_for_writes()
+
+    conversations = []
+    if offset == 0:
+        conversations = [
+            {"id": conv_id, "title": title, "updated_at": updated_at}
+            for conv_id, title, updated_at in await search_conversations(db, current_user_id, terms, TITLE_HITS)
+        ]
+
+    # One extra row tells us whether another page exists
+    rows = await search_messages(db, current_user_id, terms, limit + 1, offset)
+    items = [
+        {
+            "message_id": row.id,
+            "conversation_id": row.conversation_id,
+            "conversation_title": row.title,
+            "role": row.role,
+            "snippet": make_snippet(row.content, terms),
+            "created_at": row.created_at
+        }
+        for row in rows[:limit]
+    ]
+
+    next_cursor = encode_offset_cursor(offset + limit) if len(rows) > limit else None
+    log_event("search.completed", terms=len(terms), offset=offset, hits=len(items), title_hits=len(conversations))
+    # Built from trusted rows, so returned as a response that FastAPI does not re-validate
+    return ORJSONResponse({"query": q, "conversations": conversations, "items": items, "next_cursor": next_cursor})
@@ -1,59 +1,48 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-import random
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.models import User
 from schemas.schemas import UserCreate, UserLogin, TokenResponse, UserOut
-from core.auth import hash_password, verify_password, create_access_token
-from core.database import SessionLocal
+from core.auth import hash_password, verify_password, password_needs_rehash, create_access_token
+from core.database import AsyncSessionLocal
+from core.ids import new_id
 
 router = APIRouter()
 
-def generate_user_id(db: Session) -> str:
-    """Generate a unique 10-digit random user ID"""
-    while True:
-        # Generate random 10-digit number
-        user_id = str(random.randint(1000000000, 9999999999))
-        # Check if this ID already exists
-        existing_user = db.query(User).filter(User.id == user_id).first()
-        if not existing_user:
-            return user_id
-
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 @router.post("/signup", response_model=UserOut)
-def signup(user: UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(User).filter(User.email == user.email).first()
+async def signup(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    existing_user = (await db.execute(select(User).where(User.email == user.email))).scalars().first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    # Generate unique 10-digit user ID
-    user_id = generate_user_id(db)
-    
-    hashed_pw = hash_password(user.password)
-    new_user = User(id=user_id, username=user.username, email=user.email, hashed_password=hashed_pw)
+    hashed_pw = await hash_password(user.password)
+    new_user = User(id=new_id(), username=user.username, email=user.email, hashed_password=hashed_pw)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
 
     return new_user
 
 @router.post("/login", response_model=TokenResponse)
-def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(user_credentials: UserLogin, db: AsyncSession = Depends(get_db)):
     # Find user by email
-    user = db.query(User).filter(User.email == user_credentials.email).first()
+    user = (await db.execute(select(User).where(User.email == user_credentials.email))).scalars().first()
     
     if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     # Verify password
-    if not verify_password(user_credentials.password, user.hashed_password):
+    if not await verify_password(user_credentials.password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
+    # Upgrade the stored hash when the configured bcrypt cost has changed
+    if password_needs_rehash(user.hashed_password):
+        user.hashed_password = await hash_password(user_credentials.password)
+        await db.commit()
+    
     # Generate JWT token
     token_data = {"sub": str(user.id)}
     access_token = create_access_token(token_data)
@@ -0,0 +1,309 @@
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from sqlalchemy import select
+from datetime import datetime
+from typing import Optional
+import asyncio
+import logging
+import time
+from config.config import (
+    WS_MAX_CONNECTIONS, WS_AUTH_TIMEOUT, WS_HEARTBEAT_INTERVAL, WS_IDLE_TIMEOUT, WS_SEND_TIMEOUT, WS_MAX_PENDING,
+    CHAT_MESSAGE_MAX_CHARS,
+)
+from core.auth import decode_token, token_expiry, user_exists
+from core.chat_service import COMPLETION_MAX_TOKENS
+from core.context import get_prompt_history
+from core.events import log_event
+from core.ids import new_id
+from core.local_responder import local_reply
+from core.metrics import register_collector
+from core.rate_limit import check_rate_limit
+from core.write_behind import wait_for_writes
+from core.database import AsyncSessionLocal
+from routes.chat_routes import chat_events, generate_conversation_title, save_user_message
+from routes.conversation_routes import get_user_conversation
+from models.models import Conversation
+
+router = APIRouter()
+
+# Close codes; 4000-4999 are free for applications
+CLOSE_INTERNAL_ERROR = 1011
+CLOSE_TRY_AGAIN_LATER = 1013
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_NOT_FOUND = 4404
+CLOSE_IDLE = 4408
+
+_stats = {"connections": 0, "rejected": 0, "turns": 0, "idle_closed": 0, "slow_closed": 0}
+register_collector("websocket", lambda: dict(_stats))
+
+class SlowReader(Exception):
+    """A client stopped reading while frames were waiting to be sent"""
+
+class ChatSocket:
+    """
+    One authenticated connection to a conversation. The user and the
+    conversation are checked once, when the socket opens; each turn then
+    only re-reads the conversation's updated_at, so the cached context can
+    tell whether another worker wrote to it. Turns stream one at a time;
+    messages sent meanwhile wait in a short queue.
+    """
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.user_id = None
+        self.expires_at = None
+        self.conversation = None
+        self.last_received = time.monotonic()
+        self.send_lock = asyncio.Lock()
+        self.pending = asyncio.Queue(maxsize=WS_MAX_PENDING)
+        self.turn_task = None
+        self.streaming = False
+
+    async def send(self, frame: dict):
+        # Waits for the transport to drain, so a slow reader holds back the upstream stream
+        async with self.send_lock:
+            try:
+                await asyncio.wait_for(self.websocket.send_json(frame), WS_SEND_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise SlowReader()
+
+    async def receive(self) -> dict:
+        try:
+            frame = await self.websocket.receive_json()
+        except ValueError:
+            frame = None
+        self.last_received = time.monotonic()
+        if not isinstance(frame, dict):
+            return {}
+        return frame
+
+    async def close_slow(self):
+        _stats["slow_closed"] += 1
+        log_event("chat.ws_slow_reader", logging.WARNING, user_id=self.user_id)
+        await self.websocket.close(code=CLOSE_TRY_AGAIN_LATER, reason="Client is not reading")
+
+    def authenticate(self, token) -> bool:
+        """
+        Accept a token for this connection's user; a later token only extends the session
+        """
+        try:
+            user_id = decode_token(str(token or ""))
+        except HTTPException:
+            return False
+        if self.user_id is not None and user_id != self.user_id:
+            return False
+        self.user_id = user_id
+        self.expires_at = token_expiry(token)
+        return True
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.time() >= self.expires_at
+
+    async def open(self, conversation_id: Optional[str]) -> bool:
+        """
+        Authenticate from the first frame and load the conversation, if one was given
+        """
+        try:
+            frame = await asyncio.wait_for(self.receive(), WS_AUTH_TIMEOUT)
+        except asyncio.TimeoutError:
+            frame = {}
+        if frame.get("type") != "auth" or not self.authenticate(frame.get("token")):
+            await self.websocket.close(code=CLOSE_UNAUTHORIZED, reason="Invalid authentication credentials")
+            return False
+
+        async with AsyncSessionLocal() as db:
+            if not await user_exists(db, self.user_id):
+                await self.websocket.close(code=CLOSE_NOT_FOUND, reason="User not found")
+                return False
+            if conversation_id:
+                try:
+                    self.conversation = await get_user_conversation(db, conversation_id, self.user_id)
+                except HTTPException:
+                    await self.websocket.close(code=CLOSE_NOT_FOUND, reason="Conversation not found")
+                    return False
+
+        await self.send({"type": "ready", "conversation_id": self.conversation.id if self.conversation else None})
+        return True
+
+    async def heartbeat(self):
+        """
+        Ping the client every WS_HEARTBEAT_INTERVAL and close the socket once
+        nothing has been received for WS_IDLE_TIMEOUT
+        """
+        try:
+            while True:
+                await asyncio.sleep(WS_HEARTBEAT_INTERVAL)
+                if time.monotonic() - self.last_received > WS_IDLE_TIMEOUT:
+                    _stats["idle_closed"] += 1
+                    await self.websocket.close(code=CLOSE_IDLE, reason="Idle timeout")
+                    return
+                await self.send({"type": "ping"})
+        except SlowReader:
+            await self.close_slow()
+
+    async def run(self):
+        """
+        Dispatch client frames until the socket closes
+        """
+        heartbeat = asyncio.create_task(self.heartbeat())
+        turns = asyncio.create_task(self.take_turns())
+        try:
+            while True:
+                frame = await self.receive()
+                kind = frame.get("type")
+                if kind == "ping":
+                    await self.send({"type": "pong"})
+                elif kind == "pong":
+                    continue
+                elif kind == "auth":
+                    if not self.authenticate(frame.get("token")):
+                        await self.send({"type": "error", "status": 401, "detail": "Invalid authentication credentials"})
+                elif kind == "cancel":
+                    self.stop_turn()
+                elif kind == "message":
+                    content = frame.get("content")
+                    if not isinstance(content, str) or not content.strip():
+                        await self.send({"type": "error", "status": 422, "detail": "content must be a non-empty string"})
+                        continue
+                    if len(content) > CHAT_MESSAGE_MAX_CHARS:
+                        await self.send({"type": "error", "status": 422, "detail": f"content must be at most {CHAT_MESSAGE_MAX_CHARS} characters"})
+                        continue
+                    try:
+                        self.pending.put_nowait(content)
+                    except asyncio.QueueFull:
+                        await self.send({"type": "error", "status": 429, "detail": "Too many messages waiting for a reply"})
+                else:
+                    await self.send({"type": "error", "status": 400, "detail": f"Unknown frame type {kind!r}"})
+        finally:
+            heartbeat.cancel()
+            turns.cancel()
+            if self.turn_task is not None:
+                self.stop_turn()
+                await asyncio.wait([self.turn_task])
+
+    def stop_turn(self):
+        """
+        Cancel the reply being streamed. The partial reply is saved as the
+        stream unwinds; once the reply is complete it is left to be saved,
+        since a second cancellation would interrupt that write. The flag
+        also ends the stream should the cancellation be swallowed by a send
+        that completed at the same moment.
+        """
+        if self.turn_task is not None and self.streaming:
+            self.streaming = False
+            self.turn_task.cancel()
+
+    async def take_turns(self):
+        """
+        Answer queued messages in order; "cancel" stops only the current one
+        """
+        while True:
+            user_message = await self.pending.get()
+            if self.expired():
+                await self.websocket.close(code=CLOSE_UNAUTHORIZED, reason="Token expired")
+                return
+            self.streaming = True
+            self.turn_task = asyncio.create_task(self.turn(user_message))
+            # wait() rather than gather(), so cancelling this loop does not cancel the turn
+            await asyncio.wait([self.turn_task])
+            turn, self.turn_task = self.turn_task, None
+            try:
+                if turn.cancelled() or turn.result() is False:
+                    await self.send({"type": "cancelled"})
+            except WebSocketDisconnect:
+                return
+            except SlowReader:
+                await self.close_slow()
+                return
+            except Exception as e:
+                log_event("chat.ws_turn_error", logging.ERROR, user_id=self.user_id, error=str(e))
+                await self.websocket.close(code=CLOSE_INTERNAL_ERROR, reason="Internal error")
+                return
+
+    async def turn(self, user_message: str):
+        """
+        Store the message and stream the reply, as POST /chat/stream does.
+        Returns False if the reply was stopped part way.
+        """
+        try:
+            async with AsyncSessionLocal() as db:
+                conversation = self.conversation
+                new_conversation = conversation is None
+                if new_conversation:
+                    # Kept on the socket only once stored, so a rejected first turn leaves nothing behind
+                    created_at = datetime.utcnow()
+                    conversation = Conversation(
+                        id=new_id(),
+                        user_id=self.user_id,
+                        title=generate_conversation_title(user_message),
+                        created_at=created_at,
+                        updated_at=created_at
+                    )
+                else:
+                    await wait_for_writes(conversation.id)
+                    updated_at = (await db.execute(
+                        select(Conversation.updated_at).where(Conversation.id == conversation.id)
+                    )).scalar_one_or_none()
+                    if updated_at is None:
+                        await self.websocket.close(code=CLOSE_NOT_FOUND, reason="Conversation not found")
+                        return
+                    conversation.updated_at = updated_at
+
+                local_response = local_reply(user_message)
+                if local_response is None:
+                    history = await get_prompt_history(db, conversation, user_message)
+                    await check_rate_limit(self.user_id, user_message, history, COMPLETION_MAX_TOKENS)
+                else:
+                    history = []
+                await save_user_message(db, conversation, new_conversation, user_message)
+                self.conversation = conversation
+        except HTTPException as e:
+            frame = {"type": "error", "status": e.status_code, "detail": e.detail}
+            if e.headers and "Retry-After" in e.headers:
+                frame["retry_after"] = e.headers["Retry-After"]
+            await self.send(frame)
+            return
+
+        _stats["turns"] += 1
+        events = chat_events(user_message, self.conversation.id, history, local_response)
+        done = None
+        try:
+            async for event, data in events:
+                if event in ("done", "error"):
+                    self.streaming = False
+                if event == "done":
+                    # Held back until the stream has saved the reply, so "done" means it is stored
+                    done = data
+                    continue
+                await self.send({"type": event, **data})
+                if not self.streaming:
+                    return event == "error"
+        finally:
+            await events.aclose()
+        if done is not None:
+            await self.send({"type": "done", **done})
+        return True
+
+@router.websocket("/ws/chat")
+async def chat_socket(websocket: WebSocket, conversation_id: Optional[str] = None):
+    """
+    Chat over one long-lived connection. The client sends
+    {"type": "auth", "token": ...} first, then {"type": "message", "content": ...}
+    per turn and receives the meta, delta, done and error events of
+    POST /chat/stream as {"type": event, ...} frames. The first message
+    without a conversation_id starts a new conversation. {"type": "cancel"}
+    stops the current reply; pings must be answered with {"type": "pong"}.
+    """
+    await websocket.accept()
+    if _stats["connections"] >= WS_MAX_CONNECTIONS:
+        _stats["rejected"] += 1
+        await websocket.close(code=CLOSE_TRY_AGAIN_LATER, reason="Too many connections")
+        return
+
+    _stats["connections"] += 1
+    session = ChatSocket(websocket)
+    try:
+        if await session.open(conversation_id):
+            await session.run()
+    except (WebSocketDisconnect, SlowReader):
+        pass
+    finally:
+        _stats["connections"] -= 1
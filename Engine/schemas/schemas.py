@@ -1,6 +1,7 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
 from typing import List, Optional
+from config.config import BULK_DELETE_MAX_IDS, CHAT_MESSAGE_MAX_CHARS
 
 class UserCreate(BaseModel):
     username: str
@@ -25,7 +26,7 @@ class TokenResponse(BaseModel):
     user: UserOut
 
 class ChatRequest(BaseModel):
-    message: str
+    message: str = Field(..., max_length=CHAT_MESSAGE_MAX_CHARS)
     conversation_id: Optional[str] = None
 
 class ChatResponse(BaseModel):
@@ -49,10 +50,15 @@ class ConversationOut(BaseModel):
     created_at: datetime
     updated_at: datetime
     messages: List[MessageOut] = []
+    next_cursor: Optional[str] = None  # Cursor for the messages before this page
 
     class Config:
         from_attributes = True
 
+class MessagePage(BaseModel):
+    items: List[MessageOut]
+    next_cursor: Optional[str] = None
+
 class ConversationListOut(BaseModel):
     id: str
     title: str
@@ -63,5 +69,50 @@ class ConversationListOut(BaseModel):
     class Config:
         from_attributes = True
 
+class ConversationPage(BaseModel):
+    items: List[ConversationListOut]
+    next_cursor: Optional[str] = None
+
 class NewConversationRequest(BaseModel):
     title: str
+
+class ConversationSearchHit(BaseModel):
+    id: str
+    title: str
+    updated_at: datetime
+
+class MessageSearchHit(BaseModel):
+    message_id: str
+    conversation_id: str
+    conversation_title: str
+    role: str
+    snippet: str  # Matched terms are wrapped in **
+    created_at: datetime
+
+class SearchPage(BaseModel):
+    query: str
+    conversations: List[ConversationSearchHit] = []  # Title matches, first page only
+    items: List[MessageSearchHit]
+    next_cursor: Optional[str] = None
+
+class ImportResult(BaseModel):
+    conversations: int
+    messages: int
+
+class BulkDeleteRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=BULK_DELETE_MAX_IDS)
+
+class BulkDeleteResult(BaseModel):
+    deleted: int
+
+class ArchivedConversationOut(BaseModel):
+    id: str
+    title: str
+    created_at: datetime
+    updated_at: datetime
+    archived_at: datetime
+    message_count: int
+
+class ArchivePage(BaseModel):
+    items: List[ArchivedConversationOut]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,78 @@
+"""
+Shared fixtures: the app against a throwaway SQLite database, with the
+upstream model replaced by a fake that streams "Hel", "lo".
+
+    cd Engine && python -m pytest -q
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import types
+import uuid
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+os.environ.setdefault("JWT_SECRET", "test")
+os.environ.setdefault("OPENROUTER_API_KEY", "test")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("RESPONSE_CACHE_ENABLED", "false")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+def _delta(content):
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=content))])
+
+class FakeStream:
+    def __init__(self, parts):
+        self.parts = parts
+
+    def __aiter__(self):
+        async def chunks():
+            for part in self.parts:
+                yield _delta(part)
+        return chunks()
+
+    async def close(self):
+        pass
+
+async def _create(**params):
+    if params.get("stream"):
+        return FakeStream(["Hel", "lo"])
+    message = types.SimpleNamespace(content="Hello")
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+
+FAKE_CLIENT = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=_create)))
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    import models.models  # Registers the tables on Base.metadata
+    from core.database import init_db, dispose_engine
+
+    async def create():
+        await init_db()
+        await dispose_engine()
+
+    asyncio.run(create())
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    import core.chat_service as chat_service
+    from main import app
+
+    with TestClient(app) as test_client:
+        chat_service.client = FAKE_CLIENT
+        yield test_client
+
+@pytest.fixture
+def token(client):
+    """A bearer token of a new user"""
+    name = uuid.uuid4().hex[:12]
+    client.post("/signup", json={"username": name, "email": f"{name}@example.com", "password": "secret"})
+    return client.post("/login", json={"email": f"{name}@example.com", "password": "secret"}).json()["access_token"]
+
+@pytest.fixture
+def headers(token):
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,23 @@
+import threading
+import types
+import core.context as context
+
+def test_tokens_are_estimated_while_the_tokenizer_loads(monkeypatch):
+    release = threading.Event()
+    encoding = types.SimpleNamespace(encode=lambda text, disallowed_special: text.split())
+
+    def slow_load():
+        release.wait(5)
+        context._encoding = encoding
+
+    monkeypatch.setattr(context, "_encoding", None)
+    monkeypatch.setattr(context, "_encoding_thread", None)
+    monkeypatch.setattr(context, "_load_encoding", slow_load)
+
+    # The caller does not wait for the load it starts
+    assert context.count_tokens("one two three four") == 18 // 4 + 1 + context.MESSAGE_TOKEN_OVERHEAD
+    assert context._encoding_thread.is_alive()
+
+    release.set()
+    context.wait_for_encoding(5)
+    assert context.count_tokens("one two three four") == 4 + context.MESSAGE_TOKEN_OVERHEAD
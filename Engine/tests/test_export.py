@@ -0,0 +1,37 @@
+import json
+import uuid
+import pytest
+
+def ndjson(*records) -> bytes:
+    return b"".join(json.dumps(record).encode() + b"\n" for record in records)
+
+def conversation(conversation_id) -> dict:
+    return {"type": "conversation", "id": conversation_id, "title": "Imported", "created_at": "2024-01-01T00:00:00"}
+
+def message(conversation_id, content: str) -> dict:
+    return {"type": "message", "conversation_id": conversation_id, "role": "user", "content": content,
+            "created_at": "2024-01-01T00:00:01"}
+
+@pytest.mark.parametrize("records, reason", [
+    ([conversation(["not", "hashable"])], "id must be a string"),
+    ([conversation({"id": 1})], "id must be a string"),
+    ([conversation(7)], "id must be a string"),
+    ([conversation("abc")], "id must be a UUID"),
+    ([conversation(str(uuid.uuid4())), message({"id": 1}, "hi")], "conversation_id must be a string"),
+    ([conversation(str(uuid.uuid4())), message("abc", "hi")], "conversation_id must be a UUID"),
+])
+def test_import_rejects_malformed_ids(client, headers, records, reason):
+    response = client.post("/import", headers=headers, content=ndjson(*records))
+    assert response.status_code == 400
+    assert response.json()["detail"] == f"Import line {len(records)}: {reason}"
+    assert client.get("/conversations", headers=headers).json()["items"] == []
+
+def test_import_matches_messages_to_their_conversation(client, headers):
+    source_id = uuid.uuid4()
+    response = client.post("/import", headers=headers, content=ndjson(
+        conversation(str(source_id)), message(source_id.hex, "hi"), message(str(source_id).upper(), "again"),
+    ))
+    assert response.json() == {"conversations": 1, "messages": 2}
+    conversations = client.get("/conversations", headers=headers).json()["items"]
+    messages = client.get(f"/conversations/{conversations[0]['id']}", headers=headers).json()["messages"]
+    assert [m["content"] for m in messages] == ["hi", "again"]
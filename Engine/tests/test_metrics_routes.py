@@ -0,0 +1,18 @@
+import pytest
+import routes.metrics_routes as metrics_routes
+
+@pytest.mark.parametrize("token, public, authorization, status", [
+    ("", False, None, 404),
+    ("", False, "Bearer ", 404),
+    ("", True, None, 200),
+    ("scrape", False, None, 401),
+    ("scrape", False, "Bearer wrong", 401),
+    ("scrape", False, "Bearer scrape", 200),
+    ("scrape", True, None, 401),
+])
+def test_metrics_require_a_token_unless_public(client, monkeypatch, token, public, authorization, status):
+    monkeypatch.setattr(metrics_routes, "METRICS_TOKEN", token)
+    monkeypatch.setattr(metrics_routes, "METRICS_PUBLIC", public)
+    headers = {"Authorization": authorization} if authorization is not None else {}
+    response = client.get("/metrics", headers=headers)
+    assert response.status_code == status
@@ -0,0 +1,89 @@
+import asyncio
+from sqlalchemy import select
+from sqlalchemy.exc import DataError, OperationalError
+from core.database import AsyncSessionLocal, dispose_engine
+from core.ids import new_id
+from core.write_behind import MessageWriter, message_values
+from models.models import Message
+
+class FailingSession:
+    """
+    A real session whose inserts fail while a message's content is in
+    reject: permanently as DataError, or once as OperationalError for
+    the content in drop_connection
+    """
+    def __init__(self, reject=(), drop_connection=()):
+        self.session = AsyncSessionLocal()
+        self.reject = reject
+        self.drop_connection = drop_connection
+
+    async def __aenter__(self):
+        await self.session.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        return await self.session.__aexit__(*exc)
+
+    async def execute(self, statement, params=None):
+        for row in params or []:
+            if row.get("content") in self.reject:
+                raise DataError("INSERT INTO messages", {}, Exception("Data too long for column 'content'"))
+            if row.get("content") in self.drop_connection:
+                self.drop_connection.remove(row["content"])
+                raise OperationalError("INSERT INTO messages", {}, Exception("Lost connection to server"))
+        return await self.session.execute(statement, params)
+
+    async def commit(self):
+        await self.session.commit()
+
+    async def rollback(self):
+        await self.session.rollback()
+
+async def stored_contents(conversation_ids) -> list:
+    async with AsyncSessionLocal() as db:
+        return list((await db.execute(
+            select(Message.content).where(Message.conversation_id.in_(conversation_ids)).order_by(Message.created_at)
+        )).scalars())
+
+def test_permanently_failing_write_is_dropped_alone():
+    async def scenario():
+        drop_connection = ["first"]
+        writer = MessageWriter(batch_size=10, flush_interval=0.01,
+                               session_factory=lambda: FailingSession({"bad"}, drop_connection))
+        conversation_ids = [new_id() for _ in range(3)]
+        for conversation_id, content in zip(conversation_ids, ["first", "bad", "third"]):
+            await writer.submit(conversation_id, [message_values(conversation_id, "user", content)])
+        rejected = writer._latest[conversation_ids[1]]
+
+        await asyncio.wait_for(writer.wait_for(), 5)
+        await writer.close()
+        stored = await stored_contents(conversation_ids)
+        await dispose_engine()
+        return writer, rejected, stored, drop_connection
+
+    writer, rejected, stored, drop_connection = asyncio.run(scenario())
+    # The lost connection was retried, the rejected write dropped, and the rest landed
+    assert drop_connection == []
+    assert isinstance(rejected.exception(), DataError)
+    assert stored == ["first", "third"]
+    assert writer.stats()["pending"] == 0
+
+def test_full_buffer_waits_past_a_dropped_write():
+    async def scenario():
+        writer = MessageWriter(batch_size=1, flush_interval=0.01, max_pending=1,
+                               session_factory=lambda: FailingSession({"bad"}))
+        conversation_ids = [new_id() for _ in range(2)]
+        await writer.submit(conversation_ids[0], [message_values(conversation_ids[0], "user", "bad")])
+        rejected = writer._latest[conversation_ids[0]]
+        # The buffer is full, so this waits, in this task, for the rejected write to leave it
+        await writer.submit(conversation_ids[1], [message_values(conversation_ids[1], "user", "fine")])
+
+        await asyncio.wait_for(writer.wait_for(), 5)
+        await writer.close()
+        stored = await stored_contents(conversation_ids)
+        await dispose_engine()
+        return rejected, stored
+
+    rejected, stored = asyncio.run(scenario())
+    assert isinstance(rejected.exception(), DataError)
+    assert stored == ["fine"]
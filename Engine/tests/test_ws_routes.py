@@ -0,0 +1,53 @@
+from fastapi import HTTPException
+import routes.ws_routes as ws_routes
+
+def receive_turn(ws) -> list:
+    """Frames up to and including the one that ends a turn"""
+    frames = []
+    while True:
+        frame = ws.receive_json()
+        frames.append(frame)
+        if frame["type"] in ("done", "error", "cancelled"):
+            return frames
+
+def test_rejected_first_turn_does_not_keep_conversation(client, token, headers, monkeypatch):
+    calls = []
+
+    async def limited_once(user_id, user_message, history, max_tokens):
+        calls.append(user_message)
+        if len(calls) == 1:
+            raise HTTPException(status_code=429, detail="Rate limit exceeded", headers={"Retry-After": "1"})
+
+    monkeypatch.setattr(ws_routes, "check_rate_limit", limited_once)
+    with client.websocket_connect("/ws/chat") as ws:
+        ws.send_json({"type": "auth", "token": token})
+        assert ws.receive_json() == {"type": "ready", "conversation_id": None}
+
+        ws.send_json({"type": "message", "content": "first"})
+        assert receive_turn(ws) == [
+            {"type": "error", "status": 429, "detail": "Rate limit exceeded", "retry_after": "1"}
+        ]
+
+        ws.send_json({"type": "message", "content": "second"})
+        frames = receive_turn(ws)
+        assert [frame["type"] for frame in frames] == ["meta", "delta", "delta", "done"]
+        conversation_id = frames[0]["conversation_id"]
+
+    conversations = client.get("/conversations", headers=headers).json()["items"]
+    assert [conversation["id"] for conversation in conversations] == [conversation_id]
+    messages = client.get(f"/conversations/{conversation_id}", headers=headers).json()["messages"]
+    assert [(m["role"], m["content"]) for m in messages] == [("user", "second"), ("assistant", "Hello")]
+
+def test_turns_continue_the_same_conversation(client, token, headers):
+    with client.websocket_connect("/ws/chat") as ws:
+        ws.send_json({"type": "auth", "token": token})
+        ws.receive_json()
+        ws.send_json({"type": "message", "content": "one"})
+        first = receive_turn(ws)
+        ws.send_json({"type": "message", "content": "two"})
+        second = receive_turn(ws)
+
+    assert first[-1]["type"] == second[-1]["type"] == "done"
+    assert first[0]["conversation_id"] == second[0]["conversation_id"]
+    messages = client.get(f"/conversations/{first[0]['conversation_id']}", headers=headers).json()["messages"]
+    assert [m["content"] for m in messages] == ["one", "Hello", "two", "Hello"]
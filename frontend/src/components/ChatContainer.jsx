@@ -2,7 +2,7 @@ import ChatHeader from "./ChatHeader"
 import ChatInputContainer from "./ChatInputContainer"
 import ChatLayout from "./ChatLayout"
 
-const ChatContainer = ({ sidebarOpen, setSidebarOpen, slowResponse, formatAIMessage, darkMode, user, setProfileDropdownOpen, profileDropdownOpen, setDarkMode, handleLogout, messages, loading, messagesEndRef, inputMessage, setInputMessage, handleKeyPress, sendMessage }) => {
+const ChatContainer = ({ sidebarOpen, setSidebarOpen, slowResponse, streaming, formatAIMessage, darkMode, user, setProfileDropdownOpen, profileDropdownOpen, setDarkMode, handleLogout, messages, loading, messagesEndRef, inputMessage, setInputMessage, handleKeyPress, sendMessage, hasOlderMessages, loadOlderMessages }) => {
     return (
         <div className={`flex-1 flex flex-col transition-all z-50 duration-300 ${sidebarOpen ? 'lg:ml-64' : 'ml-0'}`}>
             {/* Chat Header */}
@@ -24,7 +24,9 @@ const ChatContainer = ({ sidebarOpen, setSidebarOpen, slowResponse, formatAIMess
                 formatAIMessage={formatAIMessage}
                 messagesEndRef={messagesEndRef}
                 slowResponse={slowResponse}
-                loading={loading} />
+                loading={loading && !streaming}
+                hasOlderMessages={hasOlderMessages}
+                loadOlderMessages={loadOlderMessages} />
 
             {/* Input Area */}
             <ChatInputContainer
@@ -1,7 +1,7 @@
 import FeatureCards from "./FeatureCards"
 import LoadingIndicator from "./LoadingIndicator"
 
-const ChatLayout = ({ darkMode, messages, user, formatAIMessage, messagesEndRef, slowResponse, loading }) => {
+const ChatLayout = ({ darkMode, messages, user, formatAIMessage, messagesEndRef, slowResponse, loading, hasOlderMessages, loadOlderMessages }) => {
     return (
         <div className={`flex flex-col h-[calc(100vh-4rem)] max-h-[calc(100vh-4rem)] overflow-hidden ${darkMode ? 'bg-gray-800' : 'bg-gradient-to-r from-gray-50 via-blue-50 to-purple-50'}`}>
             {/* Welcome Message and Feature Cards - Fixed */}
@@ -24,6 +24,17 @@ const ChatLayout = ({ darkMode, messages, user, formatAIMessage, messagesEndRef,
             }`}>
                 <div className="max-w-4xl mx-auto px-3 sm:px-6 py-3 sm:py-4">
                     <div className="space-y-3 sm:space-y-4">
+                        {hasOlderMessages && (
+                            <div className="flex justify-center">
+                                <button
+                                    onClick={loadOlderMessages}
+                                    className={`text-xs sm:text-sm font-medium px-3 py-1 rounded-full ${darkMode ? 'text-gray-300 hover:bg-gray-700' : 'text-gray-600 hover:bg-white'}`}
+                                >
+                                    Load older messages
+                                </button>
+                            </div>
+                        )}
+
                         {messages.map((message) => (
                             <div
                                 key={message.id}
@@ -10,7 +10,9 @@ const Sidebar = ({
     loadConversation,
     currentConversationId,
     conversations,
-    deleteConversation
+    deleteConversation,
+    hasMoreConversations,
+    loadMoreConversations
 }) => {
     const [searchTerm, setSearchTerm] = useState('');
 
@@ -429,6 +431,15 @@ const Sidebar = ({
                                 </div>
                             )}
 
+                            {hasMoreConversations && (
+                                <button
+                                    onClick={loadMoreConversations}
+                                    className={`w-full text-sm font-medium py-2 rounded-lg ${darkMode ? 'text-gray-300 hover:bg-gray-700' : 'text-gray-600 hover:bg-gray-100'}`}
+                                >
+                                    Load more
+                                </button>
+                            )}
+
                             {conversations.length === 0 && !searchTerm && (
                                 <p className={`text-sm font-semibold text-center py-4 ${darkMode ? 'text-gray-400' : 'text-gray-500'}`}>
                                     No conversations yet. <br /> Start a new chat!
@@ -10,9 +10,12 @@ const Dashboard = () => {
     const [inputMessage, setInputMessage] = useState('');
     const [loading, setLoading] = useState(false);
     const [slowResponse, setSlowResponse] = useState(false);
+    const [streaming, setStreaming] = useState(false);
     const [user, setUser] = useState(null);
     const [sidebarOpen, setSidebarOpen] = useState(window.innerWidth >= 1024);
     const [conversations, setConversations] = useState([]);
+    const [conversationsCursor, setConversationsCursor] = useState(null);
+    const [olderMessagesCursor, setOlderMessagesCursor] = useState(null);
     const [currentConversationId, setCurrentConversationId] = useState(null);
     const [loadingConversations, setLoadingConversations] = useState(true);
     const [profileDropdownOpen, setProfileDropdownOpen] = useState(false);
@@ -21,6 +24,7 @@ const Dashboard = () => {
         return saved ? JSON.parse(saved) : false;
     });
     const messagesEndRef = useRef(null);
+    const streamRef = useRef(null); // AbortController of the reply being streamed
     const navigate = useNavigate();
 
     useEffect(() => {
@@ -35,6 +39,16 @@ const Dashboard = () => {
         return () => window.removeEventListener('resize', handleResize);
     }, []);
 
+    useEffect(() => {
+        // Stop streaming a reply when leaving the page
+        return () => streamRef.current?.abort();
+    }, []);
+
+    const stopStreaming = () => {
+        streamRef.current?.abort();
+        streamRef.current = null;
+    };
+
     useEffect(() => {
         // Save dark mode preference
         localStorage.setItem('darkMode', JSON.stringify(darkMode));
@@ -64,7 +78,8 @@ const Dashboard = () => {
         try {
             setLoadingConversations(true);
             const response = await conversationAPI.getConversations();
-            setConversations(response.data);
+            setConversations(response.data.items);
+            setConversationsCursor(response.data.next_cursor);
         } catch (error) {
             console.error('Error loading conversations:', error);
         } finally {
@@ -72,28 +87,54 @@ const Dashboard = () => {
         }
     };
 
+    const loadMoreConversations = async () => {
+        if (!conversationsCursor) return;
+        try {
+            const response = await conversationAPI.getConversations(conversationsCursor);
+            setConversations(prev => [...prev, ...response.data.items]);
+            setConversationsCursor(response.data.next_cursor);
+        } catch (error) {
+            console.error('Error loading more conversations:', error);
+        }
+    };
+
+    const formatMessage = (msg) => ({
+        id: msg.id,
+        type: msg.role === 'user' ? 'user' : 'ai',
+        content: msg.content,
+        timestamp: new Date(msg.created_at).toLocaleTimeString()
+    });
+
     const loadConversation = async (conversationId) => {
+        stopStreaming();
         try {
             const response = await conversationAPI.getConversation(conversationId);
             const conversation = response.data;
 
-            // Convert messages to the format expected by the UI
-            const formattedMessages = conversation.messages.map(msg => ({
-                id: msg.id,
-                type: msg.role === 'user' ? 'user' : 'ai',
-                content: msg.content,
-                timestamp: new Date(msg.created_at).toLocaleTimeString()
-            }));
-
-            setMessages(formattedMessages);
+            // Only the most recent page is loaded; older messages are fetched on demand
+            setMessages(conversation.messages.map(formatMessage));
+            setOlderMessagesCursor(conversation.next_cursor);
             setCurrentConversationId(conversationId);
         } catch (error) {
             console.error('Error loading conversation:', error);
         }
     };
 
+    const loadOlderMessages = async () => {
+        if (!currentConversationId || !olderMessagesCursor) return;
+        try {
+            const response = await conversationAPI.getOlderMessages(currentConversationId, olderMessagesCursor);
+            setMessages(prev => [...response.data.items.map(formatMessage), ...prev]);
+            setOlderMessagesCursor(response.data.next_cursor);
+        } catch (error) {
+            console.error('Error loading older messages:', error);
+        }
+    };
+
     const createNewConversation = async () => {
+        stopStreaming();
         setMessages([]);
+        setOlderMessagesCursor(null);
         setCurrentConversationId(null);
     };
 
@@ -139,66 +180,104 @@ const Dashboard = () => {
         setInputMessage('');
         setLoading(true);
 
-        try {
-            // Add a timeout for the API call (30 seconds)
-            const timeoutPromise = new Promise((_, reject) =>
-                setTimeout(() => reject(new Error('Request timeout')), 30000)
-            );
-
-            // Show slow response indicator after 5 seconds
-            const slowResponseTimer = setTimeout(() => {
-                setSlowResponse(true);
-            }, 5000);
-
-            const apiPromise = chatAPI.sendMessage({
-                message: messageToSend,
-                conversation_id: currentConversationId
-            });
-
-            const response = await Promise.race([apiPromise, timeoutPromise]);
-
-            // Clear the slow response timer
+        const controller = new AbortController();
+        streamRef.current = controller;
+        const aiMessageId = Date.now() + 1;
+        let replyStarted = false;
+        let finished = false;
+        let streamErrorDetail = null;
+        let timedOut = false;
+
+        // Give up if the reply has not started within 30 seconds
+        const timeoutTimer = setTimeout(() => {
+            timedOut = true;
+            controller.abort();
+        }, 30000);
+
+        // Show slow response indicator after 5 seconds
+        const slowResponseTimer = setTimeout(() => {
+            setSlowResponse(true);
+        }, 5000);
+
+        const startReply = () => {
+            replyStarted = true;
+            clearTimeout(timeoutTimer);
             clearTimeout(slowResponseTimer);
             setSlowResponse(false);
+            setStreaming(true);
+            setMessages(prev => [...prev, { id: aiMessageId, type: 'ai', content: '' }]);
+        };
 
-            const aiMessage = {
-                id: Date.now() + 1,
-                type: 'ai',
-                content: response.data.response,
-            };
-
-            setMessages(prev => [...prev, aiMessage]);
+        try {
+            await chatAPI.streamMessage({
+                message: messageToSend,
+                conversation_id: currentConversationId
+            }, (event, data) => {
+                if (event === 'meta') {
+                    // If this was a new conversation, continue it with the next message
+                    if (!currentConversationId) {
+                        setCurrentConversationId(data.conversation_id);
+                    }
+                } else if (event === 'delta') {
+                    if (!replyStarted) startReply();
+                    // Add each piece to the reply as it arrives
+                    setMessages(prev => prev.map(message =>
+                        message.id === aiMessageId ? { ...message, content: message.content + data.content } : message
+                    ));
+                } else if (event === 'done') {
+                    finished = true;
+                } else if (event === 'error') {
+                    finished = true;
+                    streamErrorDetail = data.detail;
+                }
+            }, controller.signal);
+
+            if (!finished || streamErrorDetail) {
+                // The stream failed or ended early after the request was accepted
+                const detail = streamErrorDetail || 'The response was interrupted. Please try again.';
+                throw Object.assign(new Error(detail), { streamDetail: detail });
+            }
 
-            // If this was a new conversation, update the current conversation ID and reload conversations
             if (!currentConversationId) {
-                setCurrentConversationId(response.data.conversation_id);
                 loadConversations(); // Refresh the sidebar with the new conversation
             }
         } catch (error) {
+            // Switched conversations or left the page; nothing to report
+            if (controller.signal.aborted && !timedOut) return;
+
             console.error('Error sending message:', error);
 
             let errorMessage = 'Sorry, I encountered an error. Please try again.';
 
             // Handle specific error types
-            if (error.message === 'Request timeout') {
+            if (timedOut) {
                 errorMessage = 'The request is taking longer than usual. Please try again with a shorter message or check your internet connection.';
             } else if (error.response?.status === 429) {
-                errorMessage = 'I\'m currently at my daily usage limit. Please try again tomorrow.';
+                const retryAfter = error.response.headers?.['retry-after'];
+                errorMessage = retryAfter
+                    ? `You're sending messages too quickly. Please wait ${retryAfter} seconds and try again.`
+                    : 'You\'re sending messages too quickly. Please wait a moment and try again.';
             } else if (error.response?.status >= 500) {
                 errorMessage = 'The service is temporarily unavailable. Please try again in a few minutes.';
-            } else if (error.response?.data?.detail) {
+            } else if (typeof error.response?.data?.detail === 'string') {
                 errorMessage = error.response.data.detail;
+            } else if (error.streamDetail) {
+                errorMessage = error.streamDetail;
             }
 
             const errorMessageObj = {
-                id: Date.now() + 1,
+                id: Date.now() + 2,
                 type: 'ai',
                 content: errorMessage,
             };
             setMessages(prev => [...prev, errorMessageObj]);
         } finally {
+            clearTimeout(timeoutTimer);
+            clearTimeout(slowResponseTimer);
+            if (streamRef.current === controller) streamRef.current = null;
             setLoading(false);
             setSlowResponse(false);
+            setStreaming(false);
         }
     };
 
@@ -278,6 +357,7 @@ const Dashboard = () => {
             
             // If the deleted conversation was the current one, clear messages
             if (currentConversationId === conversationId) {
+                stopStreaming();
                 setMessages([]);
                 setCurrentConversationId(null);
             }
@@ -304,11 +384,14 @@ const Dashboard = () => {
                 currentConversationId={currentConversationId}
                 conversations={conversations}
                 deleteConversation={deleteConversation}
+                hasMoreConversations={!!conversationsCursor}
+                loadMoreConversations={loadMoreConversations}
             />
 
             {/* Main Chat Area */}
             <ChatContainer
                 slowResponse={slowResponse}
+                streaming={streaming}
                 setSidebarOpen={setSidebarOpen}
                 formatAIMessage={formatAIMessage}
                 sidebarOpen={sidebarOpen}
@@ -325,6 +408,8 @@ const Dashboard = () => {
                 setInputMessage={setInputMessage}
                 handleKeyPress={handleKeyPress}
                 sendMessage={sendMessage}
+                hasOlderMessages={!!olderMessagesCursor}
+                loadOlderMessages={loadOlderMessages}
             />
 
             {/* Sidebar overlay for mobile */}
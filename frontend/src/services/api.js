@@ -8,13 +8,16 @@ const API = axios.create({
   },
 });
 
+// Bearer header of the signed-in user, for axios calls and the fetch-based stream alike
+const authHeaders = () => {
+  const token = sessionStorage.getItem('token');
+  return token ? { Authorization: `Bearer ${token}` } : {};
+};
+
 // Request interceptor to add auth token
 API.interceptors.request.use(
   (config) => {
-    const token = sessionStorage.getItem('token');
-    if (token) {
-      config.headers.Authorization = `Bearer ${token}`;
-    }
+    Object.assign(config.headers, authHeaders());
     return config;
   },
   (error) => {
@@ -28,15 +31,74 @@ export const authAPI = {
   login: (credentials) => API.post('/login', credentials),
 };
 
+// Shaped like an axios error, so callers handle both the same way
+const streamError = async (response) => {
+  const error = new Error(`Request failed with status code ${response.status}`);
+  let data = null;
+  try {
+    data = await response.json();
+  } catch {
+    // Not a JSON error body
+  }
+  error.response = {
+    status: response.status,
+    headers: { 'retry-after': response.headers.get('Retry-After') },
+    data,
+  };
+  return error;
+};
+
+const dispatchFrame = (frame, onEvent) => {
+  const event = frame.match(/^event: (.*)$/m)?.[1] || 'message';
+  const data = frame.match(/^data: (.*)$/m)?.[1];
+  if (!data) return;
+  let payload;
+  try {
+    payload = JSON.parse(data);
+  } catch {
+    console.error('Skipping malformed stream frame:', data);
+    return;
+  }
+  onEvent(event, payload);
+};
+
 // Chat API calls
 export const chatAPI = {
   sendMessage: (messageData) => API.post('/chat', messageData),
+  // Stream the reply as Server-Sent Events; onEvent receives (event, data) per frame.
+  // Failed requests reject with an axios-style error (error.response.status, headers, data).
+  streamMessage: async (messageData, onEvent, signal) => {
+    const response = await fetch(`${API.defaults.baseURL}/chat/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', ...authHeaders() },
+      body: JSON.stringify(messageData),
+      signal,
+    });
+    if (!response.ok) {
+      throw await streamError(response);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { done, value } = await reader.read();
+      buffer += decoder.decode(value, { stream: !done });
+      const frames = buffer.split('\n\n');
+      // The last piece is an incomplete frame until the stream ends
+      buffer = done ? '' : frames.pop();
+      frames.forEach((frame) => dispatchFrame(frame, onEvent));
+      if (done) break;
+    }
+  },
 };
 
 // Conversation API calls
 export const conversationAPI = {
-  getConversations: () => API.get('/conversations'),
+  // Pages are keyset-paginated; pass the previous page's next_cursor to continue
+  getConversations: (cursor) => API.get('/conversations', { params: cursor ? { cursor } : {} }),
   getConversation: (conversationId) => API.get(`/conversations/${conversationId}`),
+  getOlderMessages: (conversationId, cursor) => API.get(`/conversations/${conversationId}/messages`, { params: { cursor } }),
   createConversation: (title) => API.post('/conversations', { title }),
   deleteConversation: (conversationId) => API.delete(`/conversations/${conversationId}`),
 };